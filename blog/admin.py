@@ -1,6 +1,9 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from .models import BlogPost
+from .signals import BLOG_FRAGMENTS
+from core.fragments import bump_fragment_versions
+from core.page_cache import instance_tag, list_tag, purge_tags
 from products.csv_export import blog_export_csv
 
 
@@ -74,11 +77,18 @@ class BlogPostAdmin(admin.ModelAdmin):
 
     def publish_posts(self, request, queryset):
         from django.utils import timezone
-        updated = queryset.update(is_published=True, published_at=timezone.now())
+        post_ids = list(queryset.values_list('pk', flat=True))
+        updated = queryset.update(is_published=True, published_at=timezone.now(), updated_at=timezone.now())
+        bump_fragment_versions(*BLOG_FRAGMENTS)
+        purge_tags(list_tag(BlogPost), *(instance_tag(BlogPost, pk) for pk in post_ids))
         self.message_user(request, f'{updated} posts published.')
     publish_posts.short_description = "Publish selected posts"
 
     def unpublish_posts(self, request, queryset):
-        updated = queryset.update(is_published=False)
+        from django.utils import timezone
+        post_ids = list(queryset.values_list('pk', flat=True))
+        updated = queryset.update(is_published=False, updated_at=timezone.now())
+        bump_fragment_versions(*BLOG_FRAGMENTS)
+        purge_tags(list_tag(BlogPost), *(instance_tag(BlogPost, pk) for pk in post_ids))
         self.message_user(request, f'{updated} posts unpublished.')
     unpublish_posts.short_description = "Unpublish selected posts"
@@ -0,0 +1,30 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.fragments import bump_fragment_versions
+from core.page_cache import list_tag, purge_tags, tag_for
+
+from .models import BlogPost
+
+# Home page fragments (see core.fragments) that render blog posts
+BLOG_FRAGMENTS = ('home_latest_blogs',)
+
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+def blog_fragments_changed(sender, raw=False, **kwargs):
+    """Re-render the home page sections that list blog posts."""
+    if raw:
+        return
+    transaction.on_commit(lambda: bump_fragment_versions(*BLOG_FRAGMENTS))
+
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+def purge_blog_pages(sender, instance, raw=False, **kwargs):
+    """Purge the post's cached page and every page listing posts."""
+    if raw:
+        return
+    tags = [tag_for(instance), list_tag(BlogPost)]
+    transaction.on_commit(lambda: purge_tags(*tags))
@@ -1,29 +1,49 @@
 from django.shortcuts import render, get_object_or_404
 from django.views.generic import ListView, DetailView
-from django.core.paginator import Paginator
+from django.db.models import Count, Max
+from core.conditional import conditional_page
+from core.counters import count_view
+from core.page_cache import list_tag, tag_for, tag_page
+from core.pagination import CursorPaginator, page_query_string
 from .models import BlogPost
 
 
+def _blog_page_state(request, slug=None):
+    """Newest change to any published post; lists and related posts span them all."""
+    state = BlogPost.objects.filter(is_published=True).aggregate(
+        updated=Max('updated_at'), post_count=Count('id'),
+    )
+    if state['updated'] is None:
+        return None
+    return state['updated'], state['post_count']
+
+
+@conditional_page(_blog_page_state)
 def blog_list(request):
     """Blog posts list view."""
-    posts = BlogPost.objects.filter(is_published=True).order_by('-published_at')
+    posts = BlogPost.objects.filter(is_published=True)
     
-    # Pagination
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    posts = paginator.get_page(page_number)
+    # Keyset pagination on (published_at, id)
+    posts = CursorPaginator(posts, '-published_at', 10, count=True).get_page(request.GET.get('cursor'))
 
-    context = {'posts': posts}
+    context = {'posts': posts, 'query_string': page_query_string(request)}
+    tag_page(request, list_tag(BlogPost))
     return render(request, 'blog/blog_list.html', context)
 
 
+def _blog_views(request, slug):
+    """The view a 304 answer still has to count."""
+    post_ids = BlogPost.objects.filter(slug=slug, is_published=True).values_list('pk', flat=True)
+    return [(BlogPost._meta.label_lower, post_id) for post_id in post_ids]
+
+
+@conditional_page(_blog_page_state, views=_blog_views)
 def blog_detail(request, slug):
     """Blog post detail view."""
     post = get_object_or_404(BlogPost, slug=slug, is_published=True)
     
-    # Increment views
-    post.views_count += 1
-    post.save(update_fields=['views_count'])
+    # Increment views (coalesced and flushed in the background)
+    count_view(post)
     
     # Get related posts
     related_posts = BlogPost.objects.filter(
@@ -34,4 +54,5 @@ def blog_detail(request, slug):
         'post': post,
         'related_posts': related_posts,
     }
+    tag_page(request, tag_for(post), list_tag(BlogPost))
     return render(request, 'blog/blog_detail.html', context)
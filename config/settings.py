@@ -46,6 +46,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Static files in production
+    'core.page_cache.PageCacheMiddleware',  # Anonymous full-page cache
+    'core.proxy_cache.ProxyCacheMiddleware',  # Cache-Control/Surrogate-Key for the proxy
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -163,11 +165,134 @@ CORS_ALLOWED_ORIGINS = os.getenv('CORS_ALLOWED_ORIGINS', 'http://localhost:3000'
 # Affiliate settings
 AFFILIATE_BASE_URL = os.getenv('AFFILIATE_BASE_URL', 'https://www.awin1.com/cclick.php?p=')
 
-# Cache (optional - can be configured for Redis in production)
+# Click ingestion: affiliate clicks are buffered per worker and written in batches
+CLICK_BUFFER_ENABLED = os.getenv('CLICK_BUFFER_ENABLED', 'True') == 'True'
+CLICK_BATCH_SIZE = int(os.getenv('CLICK_BATCH_SIZE', 500))
+CLICK_FLUSH_INTERVAL = float(os.getenv('CLICK_FLUSH_INTERVAL', 5.0))
+CLICK_SPILL_DIR = os.getenv('CLICK_SPILL_DIR', str(BASE_DIR / 'var' / 'clicks'))
+# Incremental click jobs (rollups, enrichment, trending) only process click
+# ids that existed this many seconds ago, so clicks committed late by a slow
+# flusher are not skipped
+CLICK_COMMIT_MARGIN = int(os.getenv('CLICK_COMMIT_MARGIN', 60))
+
+# Bot clicks and repeat clicks on the same product from the same IP within
+# the window are redirected but not recorded
+CLICK_DEDUP_ENABLED = os.getenv('CLICK_DEDUP_ENABLED', 'True') == 'True'
+CLICK_DEDUP_WINDOW = int(os.getenv('CLICK_DEDUP_WINDOW', 30))
+CLICK_DEDUP_CAPACITY = int(os.getenv('CLICK_DEDUP_CAPACITY', 100000))
+
+# Click retention: archive_clicks moves older rows to gzip CSV files
+CLICK_RETENTION_DAYS = int(os.getenv('CLICK_RETENTION_DAYS', 90))
+CLICK_ARCHIVE_DIR = os.getenv('CLICK_ARCHIVE_DIR', str(BASE_DIR / 'var' / 'click-archive'))
+
+# GeoIP: enrich_clicks reads GEOIP_PATH/GEOIP_CITY (MaxMind .mmdb format)
+GEOIP_PATH = os.getenv('GEOIP_PATH', str(BASE_DIR / 'geoip'))
+GEOIP_CITY = os.getenv('GEOIP_CITY', 'GeoLite2-City.mmdb')
+GEOIP_CACHE_SIZE = int(os.getenv('GEOIP_CACHE_SIZE', 100000))
+
+# Affiliate redirect targets are served from a memory-mapped file shared by
+# all workers on the host
+REDIRECT_CACHE_ENABLED = os.getenv('REDIRECT_CACHE_ENABLED', 'True') == 'True'
+REDIRECT_CACHE_PATH = os.getenv('REDIRECT_CACHE_PATH', str(BASE_DIR / 'var' / 'redirects.map'))
+
+# Product search: 'auto' picks PostgreSQL full-text or SQLite FTS5 from the
+# database engine; otherwise a dotted path to a products.search backend
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'auto')
+SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', 1000))
+# Seconds to cache ranked ids per normalized query; 0 disables the cache
+SEARCH_CACHE_TIMEOUT = int(os.getenv('SEARCH_CACHE_TIMEOUT', 300))
+# Used by products.search.inverted.InvertedIndexBackend only; the journal
+# cache must be shared between workers, and rebuild_search_index should run
+# more often than SEARCH_JOURNAL_TTL seconds
+SEARCH_INDEX_PATH = os.getenv('SEARCH_INDEX_PATH', str(BASE_DIR / 'var' / 'search.idx'))
+SEARCH_INDEX_CACHE = os.getenv('SEARCH_INDEX_CACHE', 'default')
+SEARCH_JOURNAL_TTL = int(os.getenv('SEARCH_JOURNAL_TTL', 7 * 24 * 60 * 60))
+
+# Search-as-you-type suggestions (/search/suggest/)
+SUGGEST_LIMIT = int(os.getenv('SUGGEST_LIMIT', 8))
+SUGGEST_MAX_AGE = int(os.getenv('SUGGEST_MAX_AGE', 900))
+SUGGEST_CACHE_SIZE = int(os.getenv('SUGGEST_CACHE_SIZE', 10000))
+SUGGEST_CACHE_SECONDS = int(os.getenv('SUGGEST_CACHE_SECONDS', 300))
+
+# Home page section fragments; invalidated by model signals, so the timeout
+# only bounds how stale click and view counts on the cards can get
+HOME_CACHE_TIMEOUT = int(os.getenv('HOME_CACHE_TIMEOUT', 600))
+
+# Cached product card HTML (products.cards). With PRODUCT_CARD_COUNTERS off
+# cards leave out click/view counts, so traffic does not re-render them
+PRODUCT_CARD_CACHE = os.getenv('PRODUCT_CARD_CACHE', 'default')
+PRODUCT_CARD_CACHE_TIMEOUT = int(os.getenv('PRODUCT_CARD_CACHE_TIMEOUT', 86400))
+PRODUCT_CARD_COUNTERS = os.getenv('PRODUCT_CARD_COUNTERS', 'True') == 'True'
+
+# Category page facets. The change journal lets workers update their bitmaps
+# in place; if this cache is not shared they rebuild after every change
+FACET_CACHE = os.getenv('FACET_CACHE', 'default')
+
+# Trending products (update_trending command): clicks lose half their weight
+# every TRENDING_HALF_LIFE_HOURS (run update_trending --rebuild after changing
+# it); products below TRENDING_MIN_SCORE decayed clicks are not listed
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 24))
+TRENDING_MIN_SCORE = float(os.getenv('TRENDING_MIN_SCORE', 0.5))
+TRENDING_REBUILD_DAYS = int(os.getenv('TRENDING_REBUILD_DAYS', 14))
+
+# Related products (compute_related_products command)
+RELATED_PRODUCTS_COUNT = int(os.getenv('RELATED_PRODUCTS_COUNT', 8))
+RELATED_CLICK_DAYS = int(os.getenv('RELATED_CLICK_DAYS', 30))
+RELATED_SESSION_WINDOW = int(os.getenv('RELATED_SESSION_WINDOW', 1800))
+
+# Anonymous full-page cache (core.page_cache). Pages are fresh for
+# PAGE_CACHE_TIMEOUT seconds, then served stale for up to PAGE_CACHE_STALE
+# more while one request regenerates them. Tag purges from model signals
+# only reach every worker when PAGE_CACHE_ALIAS is a shared cache.
+PAGE_CACHE_ENABLED = os.getenv('PAGE_CACHE_ENABLED', 'True') == 'True'
+PAGE_CACHE_ALIAS = os.getenv('PAGE_CACHE_ALIAS', 'default')
+PAGE_CACHE_TIMEOUT = int(os.getenv('PAGE_CACHE_TIMEOUT', 300))
+PAGE_CACHE_STALE = int(os.getenv('PAGE_CACHE_STALE', 600))
+PAGE_CACHE_LOCK_TIMEOUT = int(os.getenv('PAGE_CACHE_LOCK_TIMEOUT', 30))
+PAGE_CACHE_QUERY_PARAMS = os.getenv('PAGE_CACHE_QUERY_PARAMS', 'sort,page,cursor,min_rating,q,price,rating,discount').split(',')
+
+# Reverse-proxy caching (core.proxy_cache). Tagged anonymous pages may be
+# kept by the proxy for PROXY_CACHE_SECONDS; PROXY_CACHE_PURGER forwards tag
+# purges to it (NullPurger, SurrogateKeyPurger, NginxPurger or LocalPurger).
+# NginxPurger keeps its URL index in PROXY_CACHE_ALIAS, which must be shared
+PROXY_CACHE_SECONDS = int(os.getenv('PROXY_CACHE_SECONDS', 10))
+PROXY_CACHE_PURGER = os.getenv('PROXY_CACHE_PURGER', 'core.proxy_cache.NullPurger')
+PROXY_CACHE_ALIAS = os.getenv('PROXY_CACHE_ALIAS', 'default')
+PROXY_CACHE_PURGE_URL = os.getenv('PROXY_CACHE_PURGE_URL', 'http://127.0.0.1:8081/purge')
+PROXY_CACHE_PURGE_TIMEOUT = float(os.getenv('PROXY_CACHE_PURGE_TIMEOUT', 2))
+
+# Static pre-rendering (prerender_site command). PRERENDER_ENABLED journals
+# page cache purges so incremental runs only re-render affected pages (this
+# needs a shared PAGE_CACHE_ALIAS, otherwise every run is full);
+# PRERENDER_HOST is the host name pages are rendered for;
+# PRERENDER_LISTING_PAGES is how many pages of each listing are rendered
+PRERENDER_ENABLED = os.getenv('PRERENDER_ENABLED', 'False') == 'True'
+PRERENDER_ROOT = Path(os.getenv('PRERENDER_ROOT', BASE_DIR / 'var' / 'prerender'))
+PRERENDER_HOST = os.getenv('PRERENDER_HOST', ALLOWED_HOSTS[0])
+PRERENDER_LISTING_PAGES = int(os.getenv('PRERENDER_LISTING_PAGES', 10))
+
+# Sitemaps: an index of shards covering SITEMAP_SHARD_SIZE primary keys each, cached in
+# SITEMAP_CACHE. write_sitemaps writes gzipped copies to SITEMAP_ROOT;
+# SITEMAP_BASE_URL (scheme and host) defaults to the requested host
+SITEMAP_SHARD_SIZE = int(os.getenv('SITEMAP_SHARD_SIZE', 50000))
+SITEMAP_CACHE = os.getenv('SITEMAP_CACHE', 'default')
+SITEMAP_MAX_AGE = int(os.getenv('SITEMAP_MAX_AGE', 3600))
+SITEMAP_ROOT = Path(os.getenv('SITEMAP_ROOT', BASE_DIR / 'var' / 'sitemaps'))
+SITEMAP_BASE_URL = os.getenv('SITEMAP_BASE_URL', '')
+
+# View counters: 'memory' (per worker), 'cache' (merged across workers via
+# VIEW_COUNT_CACHE, which must be a shared backend) or 'sync' (no buffering)
+VIEW_COUNT_BACKEND = os.getenv('VIEW_COUNT_BACKEND', 'memory')
+VIEW_COUNT_FLUSH_INTERVAL = float(os.getenv('VIEW_COUNT_FLUSH_INTERVAL', 10.0))
+VIEW_COUNT_CACHE = os.getenv('VIEW_COUNT_CACHE', 'default')
+
+# Cache (optional - can be configured for Redis in production). Journals,
+# purges and the proxy URL index only reach every worker with a shared
+# backend, e.g. CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'techdealshub-cache',
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'techdealshub-cache'),
     }
 }
 
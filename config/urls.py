@@ -2,12 +2,10 @@
 URL configuration for techdealshub project.
 """
 from django.contrib import admin
-from django.contrib.sitemaps.views import sitemap
 from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import path, include
-from core.sitemaps import sitemaps
-from core.views import RobotsView
+from core.views import RobotsView, sitemap_index, sitemap_section
 
 urlpatterns = [
     # Admin
@@ -19,7 +17,8 @@ urlpatterns = [
     path('', include('core.urls')),
 
     # SEO
-    path('sitemap.xml', sitemap, {'sitemaps': sitemaps}, name='sitemap'),
+    path('sitemap.xml', sitemap_index, name='sitemap'),
+    path('sitemap-<slug:section>-<int:number>.xml', sitemap_section, name='sitemap_section'),
     path('robots.txt', RobotsView.as_view(), name='robots'),
 ]
 
@@ -2,6 +2,7 @@
 WSGI config for techdealshub project.
 """
 
+import logging
 import os
 
 from django.core.wsgi import get_wsgi_application
@@ -9,3 +10,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Warm the shared redirect-target map so the first /go/ hit is query-free
+try:
+    from products.redirects import warm
+    warm()
+except Exception:
+    logging.getLogger(__name__).exception('Could not warm redirect cache')
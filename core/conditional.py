@@ -0,0 +1,62 @@
+"""
+Conditional GET support for detail and listing views.
+
+``conditional_page(state_func)`` wraps Django's ``condition`` decorator.
+``state_func(request, *args, **kwargs)`` runs one cheap query and returns
+``(last_modified, token)``: the newest ``updated_at`` the page depends on
+and anything else that changes when the page does but would not move that
+maximum (such as a row count, which drops on delete). The ETag is derived
+from both, and a matching ``If-None-Match`` gets a 304 before the view
+renders anything.
+
+No ``Last-Modified`` header is sent: deleting, moving or unpublishing a row
+changes the token but can leave the newest ``updated_at`` where it was (or
+move it back), so a client revalidating by date alone would be told stale
+content is current.
+
+Detail views that count views pass ``views(request, *args, **kwargs)``,
+returning the ``(model_label, pk)`` pairs to count when the answer is a 304,
+since the view itself does not run then.
+
+View and click counters are written without touching ``updated_at``, so
+they do not change the validators.
+"""
+import hashlib
+from functools import wraps
+
+from django.views.decorators.http import condition
+
+from .counters import count_views
+
+STATE_ATTR = '_conditional_state'
+
+
+def conditional_page(state_func, views=None):
+    def state(request, *args, **kwargs):
+        if not hasattr(request, STATE_ATTR):
+            setattr(request, STATE_ATTR, state_func(request, *args, **kwargs))
+        return getattr(request, STATE_ATTR)
+
+    def etag(request, *args, **kwargs):
+        result = state(request, *args, **kwargs)
+        if result is None or result[0] is None:
+            return None
+        last_modified, token = result
+        raw = f'{request.get_full_path()}|{last_modified.isoformat()}|{token}'
+        return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag)(view)
+        if views is None:
+            return conditional_view
+
+        @wraps(view)
+        def counting_view(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if response.status_code == 304:
+                count_views(views(request, *args, **kwargs))
+            return response
+
+        return counting_view
+
+    return decorator
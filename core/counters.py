@@ -0,0 +1,258 @@
+"""
+Coalesced view counters.
+
+Detail views call ``count_view(obj)`` instead of saving ``views_count`` on
+every hit. Deltas are accumulated per process and flushed periodically as
+one ``UPDATE ... SET views_count = views_count + CASE ...`` statement per
+model.
+
+``VIEW_COUNT_BACKEND`` selects where deltas go between hits and the DB:
+
+* ``'memory'`` - each worker flushes its own deltas straight to the DB.
+* ``'cache'`` - workers merge their deltas into a shared cache
+  (``VIEW_COUNT_CACHE``, which must be Redis or Memcached to be shared) and
+  whichever worker holds the flush lock writes the merged totals.
+* ``'sync'`` - no buffering; each hit issues its own atomic update.
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections
+from django.db.models import Case, F, IntegerField, Value, When
+
+logger = logging.getLogger(__name__)
+
+FIELD = 'views_count'
+UPDATE_CHUNK_SIZE = 500
+
+CACHE_PREFIX = 'viewcount'
+FLUSH_LOCK_KEY = f'{CACHE_PREFIX}:flush-lock'
+SEQUENCE_KEY = f'{CACHE_PREFIX}:seq'
+FLUSHED_SEQUENCE_KEY = f'{CACHE_PREFIX}:flushed-seq'
+MISSING_SLOT_KEY = f'{CACHE_PREFIX}:missing-slot'
+
+# Views counted while core.page_cache renders a page, so cached copies of
+# the page can replay them on every hit.
+_collected_views = ContextVar('collected_views', default=None)
+# Off while core.prerender renders pages, which are not real visits.
+_counting_views = ContextVar('counting_views', default=True)
+
+
+def apply_deltas(deltas):
+    """
+    Add ``{(model_label, pk): delta}`` to ``views_count`` in the database.
+
+    Issues one UPDATE per model (per chunk of primary keys) and returns the
+    number of statements executed.
+    """
+    by_model = defaultdict(dict)
+    for (label, pk), delta in deltas.items():
+        if delta:
+            by_model[label][pk] = delta
+
+    statements = 0
+    for label, pk_deltas in by_model.items():
+        model = apps.get_model(label)
+        pks = list(pk_deltas)
+        for start in range(0, len(pks), UPDATE_CHUNK_SIZE):
+            chunk = pks[start:start + UPDATE_CHUNK_SIZE]
+            increment = Case(
+                *[When(pk=pk, then=Value(pk_deltas[pk])) for pk in chunk],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+            model.objects.filter(pk__in=chunk).update(**{FIELD: F(FIELD) + increment})
+            statements += 1
+    return statements
+
+
+class ViewCounter:
+    """Per-process accumulator of view deltas with a background flusher."""
+
+    def __init__(self, backend=None, flush_interval=None, cache_alias=None):
+        self.backend = backend or getattr(settings, 'VIEW_COUNT_BACKEND', 'memory')
+        self.flush_interval = flush_interval or getattr(settings, 'VIEW_COUNT_FLUSH_INTERVAL', 10.0)
+        self.cache_alias = cache_alias or getattr(settings, 'VIEW_COUNT_CACHE', 'default')
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._deltas = Counter()
+        self._thread = None
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _start(self):
+        self._thread = threading.Thread(
+            target=self._run, name='view-counter-flusher', daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def increment(self, label, pk, amount=1):
+        with self._lock:
+            if self._thread is None:
+                self._start()
+            self._deltas[(label, pk)] += amount
+
+    def _run(self):
+        stop = threading.Event()
+        while not stop.wait(self.flush_interval):
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush view counts')
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Push local deltas to the DB, or to the shared cache and then the DB."""
+        with self._lock:
+            deltas, self._deltas = self._deltas, Counter()
+        if self.backend == 'cache':
+            if deltas:
+                self._merge_into_cache(deltas)
+            self._flush_cache()
+        elif deltas:
+            try:
+                apply_deltas(deltas)
+            except Exception:
+                # Put the deltas back so the next flush retries them.
+                with self._lock:
+                    self._deltas.update(deltas)
+                raise
+
+    def _merge_into_cache(self, deltas):
+        """
+        Add local deltas to the shared per-object totals.
+
+        The total is incremented before its dirty marker is added, so a
+        concurrent ``_flush_cache`` either sees the increment or the object
+        gets re-registered for the next flush. Dirty markers expire, so an
+        object whose slot was lost is registered again on a later view.
+        """
+        cache = self.cache
+        dirty_timeout = max(600, self.flush_interval * 60)
+        for (label, pk), delta in deltas.items():
+            key = f'{CACHE_PREFIX}:{label}:{pk}'
+            cache.add(key, 0, timeout=None)
+            cache.incr(key, delta)
+            if cache.add(f'{key}:dirty', 1, timeout=dirty_timeout):
+                cache.add(SEQUENCE_KEY, 0, timeout=None)
+                slot = cache.incr(SEQUENCE_KEY)
+                cache.set(f'{CACHE_PREFIX}:slot:{slot}', (label, pk), timeout=None)
+
+    def _flush_cache(self):
+        """Write merged totals to the DB if no other worker is doing so."""
+        cache = self.cache
+        if not cache.add(FLUSH_LOCK_KEY, self.pid, timeout=max(60, self.flush_interval * 6)):
+            return
+        try:
+            last = cache.get(SEQUENCE_KEY, 0)
+            first = cache.get(FLUSHED_SEQUENCE_KEY, 0) + 1
+            if first > last:
+                return
+            slots = cache.get_many([f'{CACHE_PREFIX}:slot:{slot}' for slot in range(first, last + 1)])
+            # A missing slot is either still being written (its number was
+            # taken but the set has not landed) or was evicted. Stop before
+            # it, and only skip it if it is still missing on the next flush.
+            for slot in range(first, last + 1):
+                if f'{CACHE_PREFIX}:slot:{slot}' in slots:
+                    continue
+                if cache.get(MISSING_SLOT_KEY) == slot:
+                    continue
+                cache.set(MISSING_SLOT_KEY, slot, timeout=None)
+                last = slot - 1
+                break
+            if first > last:
+                return
+            slot_keys = [f'{CACHE_PREFIX}:slot:{slot}' for slot in range(first, last + 1)]
+            objects = {slots[key] for key in slot_keys if key in slots}
+
+            totals = {}
+            for label, pk in objects:
+                key = f'{CACHE_PREFIX}:{label}:{pk}'
+                cache.delete(f'{key}:dirty')
+                total = cache.get(key, 0)
+                if total:
+                    cache.decr(key, total)
+                    totals[(label, pk)] = total
+            try:
+                apply_deltas(totals)
+            except Exception:
+                for (label, pk), total in totals.items():
+                    self.increment(label, pk, total)
+                raise
+            cache.set(FLUSHED_SEQUENCE_KEY, last, timeout=None)
+            cache.delete_many(slot_keys)
+        finally:
+            cache.delete(FLUSH_LOCK_KEY)
+
+
+_counter = None
+_counter_lock = threading.Lock()
+
+
+def get_counter():
+    """Return this process's view counter, recreating it after a fork."""
+    global _counter
+    with _counter_lock:
+        if _counter is None or _counter.pid != os.getpid():
+            _counter = ViewCounter()
+        return _counter
+
+
+def count_view(obj):
+    """
+    Record one view of ``obj``.
+
+    The in-memory ``views_count`` is bumped too so the page being rendered
+    shows the hit; the database catches up on the next flush.
+    """
+    count_views([(obj._meta.label_lower, obj.pk)])
+    setattr(obj, FIELD, getattr(obj, FIELD) + 1)
+
+
+def count_views(views):
+    """Record one view of each ``(model_label, pk)`` in ``views``."""
+    if not _counting_views.get():
+        return
+    collected = _collected_views.get()
+    if collected is not None:
+        collected.extend(views)
+    if getattr(settings, 'VIEW_COUNT_BACKEND', 'memory') == 'sync':
+        apply_deltas(Counter(views))
+    else:
+        counter = get_counter()
+        for label, pk in views:
+            counter.increment(label, pk)
+
+
+@contextmanager
+def collecting_views():
+    """Collect the ``(model_label, pk)`` of every view counted in the block."""
+    views = []
+    token = _collected_views.set(views)
+    try:
+        yield views
+    finally:
+        _collected_views.reset(token)
+
+
+@contextmanager
+def not_counting_views():
+    """Ignore every view counted in the block."""
+    token = _counting_views.set(False)
+    try:
+        yield
+    finally:
+        _counting_views.reset(token)
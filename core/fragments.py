@@ -0,0 +1,36 @@
+"""
+Versioned template fragment caching.
+
+Each cached page section has an integer version in the default cache. The
+template passes the version to ``{% cache %}`` as a vary-on argument, so a
+bump makes every old copy of that section unreachable at once and the next
+request renders (and queries) it afresh. Sections are bumped from model
+signals; see ``products.signals`` and ``blog.signals``.
+"""
+from django.core.cache import cache
+
+VERSION_KEY_PREFIX = 'fragment:version:'
+
+
+def get_fragment_versions(*sections):
+    """Current version of each section, fetched in one cache round trip."""
+    keys = {section: VERSION_KEY_PREFIX + section for section in sections}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for section, key in keys.items():
+        if key not in found:
+            cache.add(key, 1, timeout=None)
+            found[key] = cache.get(key, 1)
+        versions[section] = found[key]
+    return versions
+
+
+def bump_fragment_versions(*sections):
+    for section in sections:
+        key = VERSION_KEY_PREFIX + section
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Key missing (first run or evicted); any fresh value invalidates.
+            cache.add(key, 1, timeout=None)
+            cache.incr(key)
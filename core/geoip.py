@@ -0,0 +1,52 @@
+"""
+Offline IP geolocation.
+
+Looks IPs up in a local MaxMind-format City database opened in mmap mode,
+with a bounded LRU cache in front of it. ``geoip2`` is imported only when a
+locator is created, so nothing that imports this module (and no web worker)
+depends on it. Not meant for the request path; see ``enrich_clicks``.
+"""
+import os
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+def get_database_path():
+    path = getattr(settings, 'GEOIP_PATH', settings.BASE_DIR / 'geoip')
+    return os.path.join(str(path), getattr(settings, 'GEOIP_CITY', 'GeoLite2-City.mmdb'))
+
+
+class GeoLocator:
+    """Cached ``ip -> (country_code, city)`` lookups against a City database."""
+
+    def __init__(self, path=None, cache_size=None):
+        try:
+            import geoip2.database
+            import geoip2.errors
+            from maxminddb import MODE_MMAP
+        except ImportError as e:
+            raise ImproperlyConfigured('GeoIP enrichment requires the geoip2 package.') from e
+
+        path = path or get_database_path()
+        if not os.path.exists(path):
+            raise ImproperlyConfigured(f'GeoIP database not found at {path}.')
+        self._reader = geoip2.database.Reader(path, mode=MODE_MMAP)
+        self._not_found = (geoip2.errors.AddressNotFoundError, ValueError)
+        self.lookup = lru_cache(
+            maxsize=cache_size or getattr(settings, 'GEOIP_CACHE_SIZE', 100000)
+        )(self._lookup)
+
+    def _lookup(self, ip_address):
+        try:
+            response = self._reader.city(ip_address)
+        except self._not_found:
+            return None, None
+        return response.country.iso_code, (response.city.name or '')[:100] or None
+
+    def cache_info(self):
+        return self.lookup.cache_info()
+
+    def close(self):
+        self._reader.close()
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from core.prerender import can_run_incrementally, get_root, prerender_site
+
+
+class Command(BaseCommand):
+    help = 'Render cacheable pages to static files for nginx (only changed pages unless --full)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Re-render every page instead of only those affected by changes',
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=None,
+            help='Worker processes (default: one per CPU)',
+        )
+        parser.add_argument(
+            '--watch',
+            type=float,
+            default=None,
+            metavar='SECONDS',
+            help='Keep running, re-rendering changed pages every SECONDS',
+        )
+
+    def handle(self, *args, **options):
+        if not can_run_incrementally():
+            if options['watch']:
+                raise CommandError(
+                    '--watch needs PRERENDER_ENABLED and a shared PAGE_CACHE_ALIAS '
+                    'to see the purges made by the web workers'
+                )
+            if not options['full']:
+                self.stdout.write(self.style.WARNING(
+                    'PRERENDER_ENABLED is off or PAGE_CACHE_ALIAS is process-local, so '
+                    'purges made by the web workers are not visible here; rendering every page'
+                ))
+        self.run(options['full'], options['processes'])
+        while options['watch']:
+            time.sleep(options['watch'])
+            close_old_connections()
+            self.run(False, options['processes'], quiet=True)
+
+    def run(self, full, processes, quiet=False):
+        rendered, removed = prerender_site(full=full, processes=processes)
+        if not quiet or rendered or removed:
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ Rendered {rendered} pages and removed {removed} into {get_root()}'
+            ))
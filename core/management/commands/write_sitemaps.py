@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from core.sitemaps import write_sitemaps
+
+
+class Command(BaseCommand):
+    help = 'Write the sitemap index and gzipped sitemap shards to SITEMAP_ROOT for nginx'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--root',
+            default=None,
+            help='Directory to write to (default: SITEMAP_ROOT)',
+        )
+        parser.add_argument(
+            '--base-url',
+            default=None,
+            help='Scheme and host URLs are written with (default: SITEMAP_BASE_URL)',
+        )
+
+    def handle(self, *args, **options):
+        shards = write_sitemaps(root=options['root'], base_url=options['base_url'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Wrote sitemap index and {shards} shards'))
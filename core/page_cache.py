@@ -0,0 +1,233 @@
+"""
+Full-page cache for anonymous GET requests.
+
+Views opt in by tagging the request with the objects they render::
+
+    tag_page(request, tag_for(product), tag_for(product.category))
+
+Untagged responses are never cached. Entries are keyed on host, path and
+the whitelisted ``PAGE_CACHE_QUERY_PARAMS``, and remember the version of
+each of their tags; ``purge_tags`` bumps tag versions, so every entry
+carrying a purged tag stops matching without being looked up. Model
+signals purge the tags of whatever they change.
+
+An entry is fresh for ``PAGE_CACHE_TIMEOUT`` seconds and may then be served
+stale for ``PAGE_CACHE_STALE`` more: the first request to find it expired
+takes a short lock and renders a new copy, while concurrent requests keep
+getting the stale one instead of all hitting the database at once.
+A render during which one of its tags is purged is returned but not
+stored, so HTML read before the purge is never cached under its versions.
+
+Requests with a session cookie (logged-in users, admin) bypass the cache.
+Purges are also forwarded to the reverse proxy (see ``core.proxy_cache``).
+Views counted via ``core.counters`` while a page renders are stored with it
+and replayed on every hit. Purges only reach other workers when
+``PAGE_CACHE_ALIAS`` is a shared cache (Redis, Memcached).
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from django.utils.cache import cc_delim_re, get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from .counters import collecting_views, count_views
+
+KEY_PREFIX = 'pagecache'
+PURGE_COUNT_KEY = f'{KEY_PREFIX}:purges'
+EXCLUDED_HEADERS = {'set-cookie', 'content-length'}
+
+
+def get_cache():
+    return caches[getattr(settings, 'PAGE_CACHE_ALIAS', 'default')]
+
+
+def is_shared(cache):
+    """Whether ``cache`` is seen by every process (not LocMem or dummy)."""
+    return not isinstance(cache, (LocMemCache, DummyCache))
+
+
+def tag_for(obj):
+    """Tag for one model instance, e.g. ``product:42``."""
+    return instance_tag(type(obj), obj.pk)
+
+
+def instance_tag(model, pk):
+    return f'{model._meta.model_name}:{pk}'
+
+
+def list_tag(model):
+    """Tag for pages listing instances of ``model``, e.g. ``product:list``."""
+    return f'{model._meta.model_name}:list'
+
+
+def tag_page(request, *tags):
+    """Mark the response to ``request`` as cacheable under ``tags``."""
+    if not hasattr(request, 'page_cache_tags'):
+        request.page_cache_tags = set()
+    request.page_cache_tags.update(tags)
+
+
+def is_cacheable_response(response):
+    """A 200 without cookies that ``Cache-Control`` allows shared caches to keep."""
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return False
+    directives = {
+        directive.split('=', 1)[0].strip().lower()
+        for directive in cc_delim_re.split(response.get('Cache-Control', ''))
+    }
+    return not directives & {'private', 'no-store', 'no-cache'}
+
+
+def _tag_key(tag):
+    return f'{KEY_PREFIX}:tag:{tag}'
+
+
+def get_tag_versions(tags):
+    """Current version of each tag, creating missing ones."""
+    cache = get_cache()
+    keys = {tag: _tag_key(tag) for tag in tags}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for tag, key in keys.items():
+        if key not in found:
+            # Seed from the clock so a tag whose version was evicted can
+            # never come back with the value an old entry recorded.
+            cache.add(key, time.time_ns() // 1000, timeout=None)
+            found[key] = cache.get(key)
+        versions[tag] = found[key]
+    return versions
+
+
+def purge_tags(*tags):
+    """Invalidate every cached page carrying any of ``tags``."""
+    cache = get_cache()
+    for tag in tags:
+        key = _tag_key(tag)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns() // 1000, timeout=None)
+    if not tags:
+        return
+    cache.add(PURGE_COUNT_KEY, 0, timeout=None)
+    cache.incr(PURGE_COUNT_KEY)
+    if getattr(settings, 'PRERENDER_ENABLED', False):
+        from .prerender import record_purge
+
+        record_purge(tags)
+    from .proxy_cache import get_purger
+
+    get_purger().purge(tags)
+
+
+class PageCacheMiddleware:
+    """Serve and store tagged anonymous pages; see the module docstring."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'PAGE_CACHE_ENABLED', True)
+        self.timeout = getattr(settings, 'PAGE_CACHE_TIMEOUT', 300)
+        self.stale = getattr(settings, 'PAGE_CACHE_STALE', 600)
+        self.lock_timeout = getattr(settings, 'PAGE_CACHE_LOCK_TIMEOUT', 30)
+        self.query_params = set(getattr(settings, 'PAGE_CACHE_QUERY_PARAMS', [
+            'sort', 'page', 'cursor', 'min_rating', 'q', 'price', 'rating', 'discount',
+        ]))
+
+    def __call__(self, request):
+        if not self.enabled or not self._is_cacheable_request(request):
+            return self.get_response(request)
+
+        cache = get_cache()
+        key = self._cache_key(request)
+        entry = cache.get(key)
+        versions = get_tag_versions(entry['tags']) if entry is not None else {}
+        if entry is not None and versions == entry['tags']:
+            if time.time() < entry['expires']:
+                return self._replay(request, entry, 'HIT')
+            if not cache.add(f'{key}:lock', 1, timeout=self.lock_timeout):
+                # Another worker is regenerating this page.
+                return self._replay(request, entry, 'STALE')
+            try:
+                return self._render(request, key, 'EXPIRED', versions)
+            finally:
+                cache.delete(f'{key}:lock')
+        return self._render(request, key, 'MISS', versions)
+
+    def _is_cacheable_request(self, request):
+        return (
+            request.method in ('GET', 'HEAD')
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+            # CORS headers depend on the requesting origin
+            and 'HTTP_ORIGIN' not in request.META
+        )
+
+    def _cache_key(self, request):
+        params = sorted(
+            (name, value)
+            for name, values in request.GET.lists() if name in self.query_params
+            for value in values
+        )
+        raw = f'{request.get_host()}{request.path}?{params}'
+        return f'{KEY_PREFIX}:page:' + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _render(self, request, key, status, before):
+        """
+        Render the page and store it unless a purge landed mid-render.
+        ``before`` holds the tag versions snapshotted before the view ran
+        (those of the page's previous entry); tags it lacks are checked
+        against the global purge count instead.
+        """
+        cache = get_cache()
+        purges = cache.get(PURGE_COUNT_KEY, 0)
+        with collecting_views() as views:
+            response = self.get_response(request)
+        tags = getattr(request, 'page_cache_tags', None)
+        if tags and request.method == 'GET' and is_cacheable_response(response):
+            versions = get_tag_versions(tags)
+            if tags <= before.keys():
+                purged = any(versions[tag] != before[tag] for tag in tags)
+            else:
+                purged = cache.get(PURGE_COUNT_KEY, 0) != purges
+            if purged:
+                # The HTML may predate the purge; let the next request render it
+                return response
+            entry = {
+                'content': response.content,
+                'status': response.status_code,
+                'headers': [
+                    (name, value) for name, value in response.items()
+                    if name.lower() not in EXCLUDED_HEADERS
+                ],
+                'tags': versions,
+                'views': views,
+                'expires': time.time() + self.timeout,
+            }
+            cache.set(key, entry, self.timeout + self.stale)
+            response['X-Page-Cache'] = status
+        return response
+
+    def _replay(self, request, entry, status):
+        if entry['views']:
+            count_views(entry['views'])
+        response = HttpResponse(entry['content'], status=entry['status'])
+        for name, value in entry['headers']:
+            response[name] = value
+        if response.has_header('Surrogate-Key'):
+            # The proxy keeps this copy too, so it must stay purgeable
+            from .proxy_cache import get_purger
+
+            get_purger().page_cached(request, entry['tags'])
+        response['X-Page-Cache'] = status
+        # Honour the validators stored with the page (see core.conditional)
+        last_modified = response.get('Last-Modified')
+        return get_conditional_response(
+            request,
+            etag=response.get('ETag'),
+            last_modified=last_modified and parse_http_date_safe(last_modified),
+            response=response,
+        )
@@ -0,0 +1,217 @@
+"""
+Keyset (cursor) pagination.
+
+``CursorPaginator`` pages through a queryset ordered by one field plus
+``id`` as the tie-breaker. Instead of an OFFSET it remembers the last row
+of the page in a signed, opaque cursor token and asks for rows strictly
+after (or before) it, so page 500 costs the same as page 1 and no
+``COUNT(*)`` is needed. ``SequencePaginator`` gives precomputed id lists
+(e.g. ranked search results) the same page interface.
+
+Listings that show a result total opt in with ``count=True``; the page then
+carries ``approximate_count`` (the planner's estimate on PostgreSQL, a
+cached exact count elsewhere).
+
+Tampered, stale or foreign tokens fall back to the first page, the same
+way ``Paginator.get_page`` treats bad page numbers.
+"""
+import hashlib
+
+from django.core import signing
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Q
+
+SALT = 'core.pagination.cursor'
+COUNT_CACHE_TIMEOUT = 600
+
+
+class CursorPage:
+    """One page of results plus the tokens for its neighbours."""
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.approximate_count = paginator.approximate_count() if paginator.count else None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def _encode(payload):
+    return signing.dumps(payload, salt=SALT, compress=True)
+
+
+def _decode(token):
+    if not token:
+        return None
+    try:
+        return signing.loads(token, salt=SALT)
+    except signing.BadSignature:
+        return None
+
+
+class CursorPaginator:
+    """
+    Keyset paginator over ``queryset`` ordered by ``ordering``.
+
+    ``ordering`` is a single field name, optionally prefixed with ``-``; rows
+    with equal values are ordered by ``id`` in the same direction. NULLs
+    sort last. With ``count``, pages carry ``approximate_count``.
+    """
+
+    def __init__(self, queryset, ordering, per_page, count=False):
+        self.queryset = queryset
+        self.ordering = ordering
+        self.per_page = per_page
+        self.count = count
+        self.descending = ordering.startswith('-')
+        self.field_name = ordering.lstrip('-')
+        self.field = queryset.model._meta.get_field(self.field_name)
+
+    def _order_by(self, reverse):
+        descending = self.descending != reverse
+        return ['-' + self.field_name if descending else self.field_name, '-id' if descending else 'id']
+
+    def _id_beyond(self, pk, forward):
+        smaller = self.descending == forward
+        return Q(id__lt=pk) if smaller else Q(id__gt=pk)
+
+    def _beyond(self, value, pk, forward):
+        """Rows after (``forward``) or before the non-NULL position ``(value, pk)``."""
+        smaller = self.descending == forward
+        strict, inclusive = ('lt', 'lte') if smaller else ('gt', 'gte')
+        return Q(**{f'{self.field_name}__{inclusive}': value}) & (
+            Q(**{f'{self.field_name}__{strict}': value}) | self._id_beyond(pk, forward)
+        )
+
+    def _segments(self, position, forward):
+        """
+        Querysets to read in turn for the rows after (or before) ``position``.
+
+        NULLs sort last. On nullable fields the NULL block is read with its
+        own query instead of a ``NULLS LAST`` ordering and an ``IS NULL``
+        branch, which would keep the database from walking the
+        ``(field, id)`` index.
+        """
+        queryset = self.queryset
+        order = self._order_by(reverse=not forward)
+        if not self.field.null:
+            if position is not None:
+                queryset = queryset.filter(self._beyond(*position, forward))
+            return [queryset.order_by(*order)]
+
+        values = queryset.filter(**{f'{self.field_name}__isnull': False}).order_by(*order)
+        nulls = queryset.filter(**{f'{self.field_name}__isnull': True}).order_by(order[1])
+        if position is None:
+            return [values, nulls]
+        value, pk = position
+        if value is None:
+            nulls = nulls.filter(self._id_beyond(pk, forward))
+            return [nulls] if forward else [nulls, values]
+        values = values.filter(self._beyond(value, pk, forward))
+        return [values, nulls] if forward else [values]
+
+    def _position(self, obj):
+        value = getattr(obj, self.field.attname)
+        return [None if value is None else self.field.value_to_string(obj), obj.pk]
+
+    def _cursor(self, obj, direction):
+        return _encode({'o': self.ordering, 'd': direction, 'p': self._position(obj)})
+
+    def get_page(self, token):
+        payload = _decode(token)
+        if not payload or payload.get('o') != self.ordering:
+            payload = None
+
+        forward = payload is None or payload['d'] == 'n'
+        position = None
+        if payload is not None:
+            raw_value, pk = payload['p']
+            position = (None if raw_value is None else self.field.to_python(raw_value), pk)
+        rows = []
+        for segment in self._segments(position, forward):
+            rows.extend(segment[:self.per_page + 1 - len(rows)])
+            if len(rows) > self.per_page:
+                break
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+        if not rows:
+            return CursorPage([], self)
+
+        if forward:
+            next_cursor = self._cursor(rows[-1], 'n') if more else None
+            previous_cursor = self._cursor(rows[0], 'p') if payload is not None else None
+        else:
+            next_cursor = self._cursor(rows[-1], 'n')
+            previous_cursor = self._cursor(rows[0], 'p') if more else None
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+    def approximate_count(self):
+        """
+        Cheap total for display: the planner's row estimate on PostgreSQL,
+        otherwise an exact count cached for ``COUNT_CACHE_TIMEOUT`` seconds.
+        """
+        queryset = self.queryset.order_by()
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            sql, params = queryset.values('pk').query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+            return int(plan[0]['Plan']['Plan Rows'])
+        sql, params = queryset.query.sql_with_params()
+        key = 'pagination:count:' + hashlib.sha1(f'{sql}{params}'.encode('utf-8')).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, COUNT_CACHE_TIMEOUT)
+        return count
+
+
+class SequencePaginator:
+    """Cursor-style pages over an in-memory sequence (offset kept in the token)."""
+
+    def __init__(self, sequence, per_page, count=False):
+        self.sequence = sequence
+        self.per_page = per_page
+        self.count = count
+
+    def get_page(self, token):
+        payload = _decode(token)
+        offset = payload.get('s', 0) if isinstance(payload, dict) else 0
+        offset = min(max(offset, 0), max(len(self.sequence) - 1, 0))
+        end = offset + self.per_page
+        next_cursor = _encode({'s': end}) if end < len(self.sequence) else None
+        previous_cursor = _encode({'s': max(offset - self.per_page, 0)}) if offset > 0 else None
+        return CursorPage(self.sequence[offset:end], self, next_cursor, previous_cursor)
+
+    def approximate_count(self):
+        return len(self.sequence)
+
+
+def page_query_string(request):
+    """The request's query string minus pagination params, for page links."""
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    params.pop('page', None)
+    return params.urlencode()
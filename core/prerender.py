@@ -0,0 +1,270 @@
+"""
+Static pre-rendering of cacheable pages.
+
+``prerender_site`` renders every product, category and blog page plus the
+home page and the listings to ``PRERENDER_ROOT/<path>/index.html`` with
+``.gz`` and, when the optional ``brotli`` package is installed, ``.br``
+siblings. Paginated listings are followed through their "Next" links for
+up to ``PRERENDER_LISTING_PAGES`` pages; page ``?cursor=<token>`` goes to
+``<path>/_cursor/<token>.html``. nginx serves those files directly and
+only passes the rest (search, ``/go/`` redirects, sorted or filtered
+listings, deeper pages and anything not rendered) to Django; see
+``nginx.conf``.
+
+Pages are rendered by calling their views directly, bypassing middleware.
+Only pages that the page cache would also keep are written: those that
+tagged themselves with ``core.page_cache.tag_page`` and returned a
+cookie-free, shareable 200. The tags each page recorded are kept in
+``manifest.json`` and serve as the dependency map from objects to URLs.
+With ``PRERENDER_ENABLED`` on, ``purge_tags`` journals every purge in the
+page cache. An incremental run then re-renders only the pages whose tags
+were purged, renders new URLs and deletes the files of URLs that no longer
+exist. If journal entries are missing (evicted or flushed), the run falls
+back to a full rebuild. The journal is written by the web workers and read
+by the command, so it needs a shared ``PAGE_CACHE_ALIAS``; with a
+process-local one (LocMem, dummy), or with ``PRERENDER_ENABLED`` off, every
+run is a full rebuild. ``prerender_site --watch`` (the
+``techdealshub-prerender`` program in ``supervisor.conf``) repeats the
+incremental run every few seconds, which bounds how long nginx serves a
+page after it changed.
+
+A listing's later pages are reached through tokens printed on the page
+before them, so they are only ever re-rendered together with their first
+page; the files of the tokens that page no longer links to are removed.
+
+Full rebuilds are spread over a process pool. Views are not counted while
+rendering, and visits served from the files are not counted at all.
+"""
+import gzip
+import json
+import multiprocessing
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from .counters import not_counting_views
+from .page_cache import get_cache, is_cacheable_response, is_shared
+
+JOURNAL_PREFIX = 'prerender'
+JOURNAL_SEQ_KEY = f'{JOURNAL_PREFIX}:seq'
+JOURNAL_TTL = 7 * 24 * 60 * 60
+MANIFEST_NAME = 'manifest.json'
+CURSOR_DIR = '_cursor'
+# The "Next" link of includes/cursor_pagination.html on an unfiltered listing
+NEXT_LINK_RE = re.compile(r'<a href="\?cursor=([-\w.%]+)"[^>]*>Next</a>')
+
+
+def get_root():
+    return Path(getattr(settings, 'PRERENDER_ROOT', settings.BASE_DIR / 'var' / 'prerender'))
+
+
+def can_run_incrementally():
+    """Whether this process sees the purges journaled by the web workers."""
+    return getattr(settings, 'PRERENDER_ENABLED', False) and is_shared(get_cache())
+
+
+def record_purge(tags):
+    """Journal purged page tags for the next incremental run."""
+    cache = get_cache()
+    cache.add(JOURNAL_SEQ_KEY, 0, timeout=None)
+    sequence = cache.incr(JOURNAL_SEQ_KEY)
+    cache.set(f'{JOURNAL_PREFIX}:change:{sequence}', list(tags), timeout=JOURNAL_TTL)
+
+
+def purged_tags(since):
+    """``(sequence, tags)`` journaled after ``since``; tags is None on a gap."""
+    cache = get_cache()
+    latest = cache.get(JOURNAL_SEQ_KEY, 0)
+    if latest < since:
+        return latest, None
+    keys = [f'{JOURNAL_PREFIX}:change:{n}' for n in range(since + 1, latest + 1)]
+    changes = cache.get_many(keys)
+    if len(changes) < len(keys):
+        return latest, None
+    return latest, {tag for tags in changes.values() for tag in tags}
+
+
+def site_urls():
+    """Every URL pre-rendering covers, streamed from slug-only queries."""
+    from blog.models import BlogPost
+    from products.models import Category, Product
+
+    yield reverse('products:home')
+    yield reverse('products:category_list')
+    yield reverse('products:deals')
+    yield reverse('products:trending')
+    yield reverse('blog:blog_list')
+    for slug in Category.objects.values_list('slug', flat=True).iterator():
+        yield reverse('products:category_detail', args=[slug])
+    for slug in Product.objects.values_list('slug', flat=True).iterator(chunk_size=5000):
+        yield reverse('products:product_detail', args=[slug])
+    published = BlogPost.objects.filter(is_published=True)
+    for slug in published.values_list('slug', flat=True).iterator(chunk_size=5000):
+        yield reverse('blog:blog_detail', args=[slug])
+
+
+def base_url(url):
+    """``url`` without its cursor: the listing a later page belongs to."""
+    return url.split('?', 1)[0]
+
+
+def page_path(root, url):
+    path, _, query = url.partition('?')
+    if query:
+        # Only ``cursor=<token>`` URLs are rendered; see NEXT_LINK_RE
+        return Path(root, path.strip('/'), CURSOR_DIR, query.split('=', 1)[1] + '.html')
+    return Path(root, path.strip('/'), 'index.html')
+
+
+def _write_atomic(path, data):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+
+def write_page(root, url, content):
+    """Write ``content`` and its precompressed siblings for ``url``."""
+    path = page_path(root, url)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _write_atomic(path, content)
+    _write_atomic(path.with_name(path.name + '.gz'), gzip.compress(content, 9, mtime=0))
+    try:
+        import brotli
+    except ImportError:
+        return
+    _write_atomic(path.with_name(path.name + '.br'), brotli.compress(content))
+
+
+def remove_page(root, url):
+    path = page_path(root, url)
+    for name in (path.name, path.name + '.gz', path.name + '.br'):
+        path.with_name(name).unlink(missing_ok=True)
+
+
+def render_page(url):
+    """``(content, tags)`` for ``url``, or None if the page is not cacheable."""
+    factory = RequestFactory(HTTP_HOST=getattr(settings, 'PRERENDER_HOST', settings.ALLOWED_HOSTS[0]))
+    request = factory.get(url, secure=getattr(settings, 'SECURE_SSL_REDIRECT', False))
+    match = resolve(request.path_info)
+    with not_counting_views():
+        response = match.func(request, *match.args, **match.kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    tags = getattr(request, 'page_cache_tags', None)
+    # A CSRF token rendered into the page would be shared by every visitor
+    if not tags or request.META.get('CSRF_COOKIE_NEEDS_UPDATE') or not is_cacheable_response(response):
+        return None
+    return response.content, sorted(tags)
+
+
+def _publish(url, root):
+    """
+    Render ``url`` and the later pages it links to into ``root``; returns
+    ``[(url, tags or None), ...]``.
+
+    Later pages are written before the page linking to them, so nginx never
+    serves a link to a file that does not exist yet.
+    """
+    pages = []
+    max_pages = getattr(settings, 'PRERENDER_LISTING_PAGES', 10)
+    while url is not None and len(pages) < max_pages:
+        page = render_page(url)
+        if page is None:
+            if not pages:
+                remove_page(root, url)
+                return [(url, None)]
+            break
+        content, tags = page
+        pages.append((url, content, tags))
+        match = NEXT_LINK_RE.search(content.decode('utf-8'))
+        url = match and f'{base_url(url)}?cursor={match.group(1)}'
+    for url, content, _ in reversed(pages):
+        write_page(root, url, content)
+    return [(url, tags) for url, _, tags in pages]
+
+
+def _publish_all(urls, root):
+    return [result for url in urls for result in _publish(url, root)]
+
+
+def publish(urls, root, processes=None):
+    """Render ``urls`` and their later pages into ``root``; returns ``{url: tags or None}``."""
+    urls = list(urls)
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(urls) < 2 or 'fork' not in multiprocessing.get_all_start_methods():
+        return dict(_publish_all(urls, root))
+
+    # Forked workers must not share the parent's database connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('fork')) as pool:
+        results = pool.map(_publish, urls, [root] * len(urls), chunksize=16)
+        return dict(result for pages in results for result in pages)
+
+
+def load_manifest(root):
+    try:
+        with open(Path(root, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def save_manifest(root, manifest):
+    Path(root).mkdir(parents=True, exist_ok=True)
+    _write_atomic(Path(root, MANIFEST_NAME), json.dumps(manifest).encode('utf-8'))
+
+
+def prerender_site(full=False, processes=None, root=None):
+    """
+    Bring the pre-rendered files up to date; returns ``(rendered, removed)``.
+
+    Renders everything when ``full`` is set, there is no manifest yet, the
+    purge journal has gaps or is not shared with the web workers; otherwise
+    only pages affected since the last run, and nothing at all when nothing
+    was purged.
+    """
+    root = Path(root or get_root())
+    manifest = load_manifest(root)
+    # Read the journal before rendering so purges during the run are
+    # replayed next time
+    if manifest is None or full or not can_run_incrementally():
+        sequence, tags = get_cache().get(JOURNAL_SEQ_KEY, 0), None
+    else:
+        sequence, tags = purged_tags(manifest['sequence'])
+    if tags is not None and not tags:
+        # Every change purges a tag, new and deleted objects included
+        return 0, 0
+    pages = manifest['pages'] if manifest else {}
+
+    current = set(site_urls())
+    if tags is None:
+        targets = current
+    else:
+        targets = {base_url(url) for url, page_tags in pages.items() if tags.intersection(page_tags)}
+        targets = (targets & current) | (current - {base_url(url) for url in pages})
+
+    results = publish(sorted(targets), root, processes)
+    # Files of deleted objects, and later pages their first page no longer links to
+    removed = {
+        url for url in pages
+        if url not in results and (base_url(url) in targets or base_url(url) not in current)
+    }
+    for url in removed:
+        remove_page(root, url)
+    pages = {url: page_tags for url, page_tags in pages.items() if url not in removed}
+    for url, page_tags in results.items():
+        if page_tags is None:
+            pages.pop(url, None)
+        else:
+            pages[url] = page_tags
+    save_manifest(root, {'sequence': sequence, 'pages': pages})
+    return sum(1 for page_tags in results.values() if page_tags is not None), len(removed)
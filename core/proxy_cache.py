@@ -0,0 +1,227 @@
+"""
+Reverse-proxy (nginx, Varnish, CDN) caching of anonymous pages.
+
+``ProxyCacheMiddleware`` marks every page a view tagged with
+``core.page_cache.tag_page`` as shareable for ``PROXY_CACHE_SECONDS``:
+
+* ``Cache-Control: public, max-age=0, must-revalidate`` - browsers revalidate
+  (cheap with ``core.conditional``);
+* ``Surrogate-Control`` / ``X-Accel-Expires`` - how long CDNs and nginx
+  may keep it;
+* ``Surrogate-Key`` - the page's tags, for proxies that purge by key.
+
+Untagged HTML and anything served to a session holder is ``private``.
+
+``purge_tags`` hands every purge to the ``PROXY_CACHE_PURGER`` (a dotted
+path), so cached copies at the proxy go too:
+
+* ``NullPurger`` - no proxy, or one that only relies on its short TTL;
+* ``SurrogateKeyPurger`` - one ``PURGE`` request carrying the keys
+  (Varnish xkey, Fastly-style APIs);
+* ``NginxPurger`` - nginx has no keys, so the URLs served under each tag
+  are remembered in ``PROXY_CACHE_ALIAS`` (which must be shared by every
+  worker) and purged through an ``ngx_cache_purge`` location. Purges are
+  queued for a background thread, which merges whatever piled up and
+  sends the ``PURGE`` requests over one keep-alive connection, so a save
+  never waits on the proxy;
+* ``LocalPurger`` - records purged URLs in memory, synchronously; the
+  stand-in for tests and development.
+
+Pages replayed from the page cache register their URLs again (see
+``core.page_cache``), since the proxy caches those copies too.
+
+Purges are best effort: a failed request is logged, and the proxy's short
+TTL bounds how long a stale copy can survive.
+"""
+import atexit
+import http.client
+import logging
+import os
+import threading
+import urllib.parse
+import urllib.request
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.cache import patch_cache_control
+from django.utils.module_loading import import_string
+
+from .page_cache import is_cacheable_response, is_shared
+
+logger = logging.getLogger(__name__)
+
+URL_INDEX_PREFIX = 'proxycache:urls'
+MAX_URLS_PER_TAG = 1000
+
+
+class ProxyCacheMiddleware:
+    """Add proxy caching headers; place after (inside) ``PageCacheMiddleware``."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.seconds = getattr(settings, 'PROXY_CACHE_SECONDS', 10)
+        self.purger = get_purger()
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        tags = getattr(request, 'page_cache_tags', None)
+        if (
+            tags
+            and request.method in ('GET', 'HEAD')
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+            and is_cacheable_response(response)
+        ):
+            patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+            response['Surrogate-Control'] = f'max-age={self.seconds}'
+            response['X-Accel-Expires'] = str(self.seconds)
+            response['Surrogate-Key'] = ' '.join(sorted(tags))
+            self.purger.page_cached(request, tags)
+        elif response.get('Content-Type', '').startswith('text/html'):
+            patch_cache_control(response, private=True)
+        return response
+
+
+class NullPurger:
+    """Purges nothing."""
+
+    def page_cached(self, request, tags):
+        """Called for every response the proxy may cache."""
+
+    def purge(self, tags):
+        """Drop every page carrying any of ``tags`` from the proxy."""
+
+
+class SurrogateKeyPurger(NullPurger):
+    """``PURGE`` ``PROXY_CACHE_PURGE_URL`` with the tags in ``Surrogate-Key``."""
+
+    def __init__(self):
+        self.url = settings.PROXY_CACHE_PURGE_URL
+        self.timeout = getattr(settings, 'PROXY_CACHE_PURGE_TIMEOUT', 2)
+
+    def purge(self, tags):
+        request = urllib.request.Request(
+            self.url, method='PURGE', headers={'Surrogate-Key': ' '.join(tags)}
+        )
+        try:
+            urllib.request.urlopen(request, timeout=self.timeout).close()
+        except OSError:
+            logger.exception('Failed to purge surrogate keys %s', tags)
+
+
+class NginxPurger(NullPurger):
+    """
+    Purge URLs through an ``ngx_cache_purge`` location: ``PURGE`` requests
+    for ``PROXY_CACHE_PURGE_URL + path`` with the page's ``Host`` header,
+    sent from a background thread.
+    """
+
+    background = True
+
+    def __init__(self):
+        self.url = getattr(settings, 'PROXY_CACHE_PURGE_URL', '').rstrip('/')
+        self.timeout = getattr(settings, 'PROXY_CACHE_PURGE_TIMEOUT', 2)
+        self.cache = caches[getattr(settings, 'PROXY_CACHE_ALIAS', 'default')]
+        if self.background and not is_shared(self.cache):
+            raise ImproperlyConfigured(
+                'NginxPurger keeps its URL index in PROXY_CACHE_ALIAS, which must be a '
+                'cache shared by every worker (Redis, Memcached).'
+            )
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._tags = set()
+        self._pid = None
+
+    def _key(self, tag):
+        return f'{URL_INDEX_PREFIX}:{tag}'
+
+    def page_cached(self, request, tags):
+        # The index only needs to outlive the proxy's copy of the page
+        url = (request.get_host(), request.get_full_path())
+        keys = [self._key(tag) for tag in tags]
+        indexed = self.cache.get_many(keys)
+        changed = {}
+        for key in keys:
+            urls = indexed.get(key, [])
+            if url not in urls:
+                changed[key] = (urls + [url])[-MAX_URLS_PER_TAG:]
+        if changed:
+            self.cache.set_many(changed, getattr(settings, 'PROXY_CACHE_SECONDS', 10) * 2 + 60)
+
+    def urls_for(self, tags):
+        """``{(host, path)}`` served under any of ``tags``; forgets them."""
+        keys = [self._key(tag) for tag in tags]
+        urls = {tuple(url) for found in self.cache.get_many(keys).values() for url in found}
+        self.cache.delete_many(keys)
+        return urls
+
+    def purge(self, tags):
+        if not self.background:
+            self.purge_urls(self.urls_for(tags))
+            return
+        with self._lock:
+            self._tags.update(tags)
+            if self._pid != os.getpid():
+                # First purge in this (possibly forked) process
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name='proxy-cache-purger', daemon=True).start()
+                atexit.register(self.flush)
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Proxy cache purge failed')
+
+    def flush(self):
+        """Purge every queued tag now."""
+        with self._lock:
+            tags, self._tags = self._tags, set()
+        if tags:
+            self.purge_urls(self.urls_for(tags))
+
+    def purge_urls(self, urls):
+        """``PURGE`` every ``(host, path)`` over one keep-alive connection."""
+        if not urls:
+            return
+        parts = urllib.parse.urlsplit(self.url)
+        if parts.scheme == 'https':
+            connection = http.client.HTTPSConnection(parts.netloc, timeout=self.timeout)
+        else:
+            connection = http.client.HTTPConnection(parts.netloc, timeout=self.timeout)
+        try:
+            for host, path in urls:
+                try:
+                    connection.request('PURGE', parts.path + path, headers={'Host': host})
+                    connection.getresponse().read()
+                except (OSError, http.client.HTTPException):
+                    logger.exception('Failed to purge %s%s', host, path)
+                    # Reconnects on the next request
+                    connection.close()
+        finally:
+            connection.close()
+
+
+class LocalPurger(NginxPurger):
+    """``NginxPurger`` that records ``(host, path)`` purges instead of sending them."""
+
+    background = False
+    purged = []
+
+    def purge_urls(self, urls):
+        self.purged.extend(urls)
+
+
+_purger = None
+
+
+def get_purger():
+    """Return the configured ``PROXY_CACHE_PURGER`` instance."""
+    global _purger
+    if _purger is None:
+        _purger = import_string(getattr(settings, 'PROXY_CACHE_PURGER', 'core.proxy_cache.NullPurger'))()
+    return _purger
@@ -1,40 +1,246 @@
-from django.contrib.sitemaps import Sitemap
-from products.models import Product, Category
-from blog.models import BlogPost
+"""
+Sharded sitemaps for large catalogs.
 
+``/sitemap.xml`` is a sitemap index pointing at
+``/sitemap-<section>-<n>.xml`` shards of at most ``SITEMAP_SHARD_SIZE``
+(the protocol's 50,000) URLs each. Shard ``n`` is the fixed primary key
+range ``(n - 1) * size + 1`` to ``n * size``: finding it takes no query,
+reading it is a bounded index range scan, and adding or deleting rows
+never moves another shard's boundaries. Ranges emptied by deletions are
+left out of the index. Shard rows are streamed with
+``values_list('slug', 'updated_at').iterator()`` and written out as they
+arrive, so memory stays flat however large the catalog gets.
 
-class ProductSitemap(Sitemap):
-    changefreq = 'weekly'
-    priority = 0.9
+A shard's body is kept in ``SITEMAP_CACHE`` under its pk range, row count
+and newest ``updated_at``. Any edit, addition or deletion inside the shard
+changes that key, and untouched shards keep being served from the cache.
+The index is cached under the catalog version and the blog fragment
+version (see ``products.catalog`` and ``blog.signals``), so its grouped
+query over every table only runs again after a change. Entries also expire
+after ``SITEMAP_MAX_AGE`` seconds, which bounds staleness when those
+versions live in a process-local cache.
 
-    def items(self):
-        return Product.objects.all()
+``write_sitemaps`` (the ``write_sitemaps`` command, run from cron) writes
+the same documents as ``.xml.gz`` files into ``SITEMAP_ROOT``; nginx serves
+them with ``gzip_static`` and falls back to these views when they are
+missing. See ``nginx.conf``.
+"""
+import gzip
+import os
+import tempfile
+from pathlib import Path
+from xml.sax.saxutils import escape
 
-    def lastmod(self, item):
-        return item.updated_at
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, F, Max
+from django.urls import reverse
 
+from .fragments import get_fragment_versions
 
-class CategorySitemap(Sitemap):
-    changefreq = 'weekly'
-    priority = 0.8
+CACHE_PREFIX = 'sitemap'
+CACHE_TIMEOUT = 24 * 60 * 60
+CHUNK_SIZE = 2000
+SLUG_PLACEHOLDER = 'sitemap-slug'
 
-    def items(self):
-        return Category.objects.all()
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+URLSET_OPEN = '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+URLSET_CLOSE = '</urlset>\n'
+INDEX_OPEN = '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+INDEX_CLOSE = '</sitemapindex>\n'
 
 
-class BlogSitemap(Sitemap):
-    changefreq = 'weekly'
-    priority = 0.7
+class SitemapSection:
+    """One kind of page listed in the sitemap."""
 
-    def items(self):
-        return BlogPost.objects.filter(is_published=True)
+    def __init__(self, name, url_name, changefreq, priority, queryset):
+        self.name = name
+        self.url_name = url_name
+        self.changefreq = changefreq
+        self.priority = priority
+        self._queryset = queryset
 
-    def lastmod(self, item):
-        return item.updated_at
+    def queryset(self):
+        return self._queryset().order_by('pk')
 
+    def url_pattern(self):
+        """``(prefix, suffix)`` around the slug, from a single ``reverse()``."""
+        path = reverse(self.url_name, args=[SLUG_PLACEHOLDER])
+        prefix, suffix = path.split(SLUG_PLACEHOLDER)
+        return prefix, suffix
 
-sitemaps = {
-    'products': ProductSitemap,
-    'categories': CategorySitemap,
-    'blogs': BlogSitemap,
+
+def _products():
+    from products.models import Product
+
+    return Product.objects.all()
+
+
+def _categories():
+    from products.models import Category
+
+    return Category.objects.all()
+
+
+def _blogs():
+    from blog.models import BlogPost
+
+    return BlogPost.objects.filter(is_published=True)
+
+
+SECTIONS = {
+    section.name: section
+    for section in [
+        SitemapSection('products', 'products:product_detail', 'weekly', '0.9', _products),
+        SitemapSection('categories', 'products:category_detail', 'weekly', '0.8', _categories),
+        SitemapSection('blogs', 'blog:blog_detail', 'weekly', '0.7', _blogs),
+    ]
 }
+
+
+def get_cache():
+    return caches[getattr(settings, 'SITEMAP_CACHE', 'default')]
+
+
+def shard_size():
+    return getattr(settings, 'SITEMAP_SHARD_SIZE', 50000)
+
+
+def shard_queryset(section, number):
+    """Rows of 1-based shard ``number``."""
+    size = shard_size()
+    return section.queryset().filter(pk__gt=(number - 1) * size, pk__lte=number * size)
+
+
+def shard_state(queryset):
+    """``(newest updated_at, row count)`` of a shard in one aggregate query."""
+    state = queryset.order_by().aggregate(lastmod=Max('updated_at'), total=Count('pk'))
+    return state['lastmod'], state['total']
+
+
+def shard_states(section):
+    """
+    ``{number: (newest updated_at, row count)}`` for every non-empty shard
+    of ``section``, from one grouped query.
+    """
+    rows = (
+        section.queryset().order_by()
+        .annotate(shard=(F('pk') - 1) / shard_size() + 1)
+        .values('shard')
+        .annotate(lastmod=Max('updated_at'), total=Count('pk'))
+        .order_by('shard')
+    )
+    return {row['shard']: (row['lastmod'], row['total']) for row in rows}
+
+
+def iter_urlset(section, queryset, base_url):
+    """Yield a ``<urlset>`` document for ``queryset`` a chunk at a time."""
+    prefix, suffix = section.url_pattern()
+    prefix = escape(base_url + prefix)
+    tail = (
+        f'</lastmod><changefreq>{section.changefreq}</changefreq>'
+        f'<priority>{section.priority}</priority></url>\n'
+    )
+    yield XML_HEADER + URLSET_OPEN
+    lines = []
+    rows = queryset.values_list('slug', 'updated_at').iterator(chunk_size=CHUNK_SIZE)
+    for slug, updated_at in rows:
+        lines.append(f'<url><loc>{prefix}{escape(slug)}{suffix}</loc><lastmod>{updated_at:%Y-%m-%d}{tail}')
+        if len(lines) == CHUNK_SIZE:
+            yield ''.join(lines)
+            lines = []
+    yield ''.join(lines) + URLSET_CLOSE
+
+
+def cached_urlset(section, number, base_url):
+    """
+    Shard ``number`` of ``section`` as an iterable of strings (served from
+    the cache when the shard is unchanged), or None if it is empty.
+    """
+    if number < 1:
+        return None
+    queryset = shard_queryset(section, number)
+    lastmod, total = shard_state(queryset)
+    if not total:
+        return None
+    key = '{}:{}:{}:{}:{}:{}:{}'.format(
+        CACHE_PREFIX, section.name, shard_size(), number, total, lastmod.timestamp(), base_url,
+    )
+    cache = get_cache()
+    body = cache.get(key)
+    if body is not None:
+        return [body]
+
+    def stream():
+        parts = []
+        for part in iter_urlset(section, queryset, base_url):
+            parts.append(part)
+            yield part
+        cache.set(key, ''.join(parts), CACHE_TIMEOUT)
+
+    return stream()
+
+
+def iter_index(base_url):
+    """Yield the ``<sitemapindex>`` listing every shard of every section."""
+    yield XML_HEADER + INDEX_OPEN
+    for section in SECTIONS.values():
+        for number, (lastmod, _) in shard_states(section).items():
+            loc = escape(f'{base_url}/sitemap-{section.name}-{number}.xml')
+            entry = f'<sitemap><loc>{loc}</loc>'
+            if lastmod:
+                entry += f'<lastmod>{lastmod:%Y-%m-%d}</lastmod>'
+            yield entry + '</sitemap>\n'
+    yield INDEX_CLOSE
+
+
+def cached_index(base_url):
+    """The ``<sitemapindex>`` body, rebuilt only after the catalog or blog changes."""
+    from blog.signals import BLOG_FRAGMENTS
+    from products.catalog import get_catalog_version
+
+    blog_version = ':'.join(str(version) for version in get_fragment_versions(*BLOG_FRAGMENTS).values())
+    key = '{}:index:{}:{}:{}:{}'.format(
+        CACHE_PREFIX, shard_size(), get_catalog_version(), blog_version, base_url,
+    )
+    cache = get_cache()
+    body = cache.get(key)
+    if body is None:
+        body = ''.join(iter_index(base_url))
+        cache.set(key, body, getattr(settings, 'SITEMAP_MAX_AGE', 3600))
+    return body
+
+
+def _write_gzip(path, parts):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+        for part in parts:
+            f.write(part.encode('utf-8'))
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+
+def write_sitemaps(root=None, base_url=None):
+    """
+    Write ``sitemap.xml.gz`` and every ``sitemap-<section>-<n>.xml.gz``
+    shard into ``root``, streaming each file; returns the shard count.
+    Shards left over from a larger catalog are deleted.
+    """
+    root = Path(root or getattr(settings, 'SITEMAP_ROOT', settings.BASE_DIR / 'var' / 'sitemaps'))
+    base_url = (base_url or getattr(settings, 'SITEMAP_BASE_URL', '')).rstrip('/')
+    if not base_url:
+        base_url = f'https://{getattr(settings, "PRERENDER_HOST", settings.ALLOWED_HOSTS[0])}'
+    root.mkdir(parents=True, exist_ok=True)
+
+    written = set()
+    for section in SECTIONS.values():
+        for number in shard_states(section):
+            path = root / f'sitemap-{section.name}-{number}.xml.gz'
+            queryset = shard_queryset(section, number)
+            _write_gzip(path, iter_urlset(section, queryset, base_url))
+            written.add(path.name)
+    _write_gzip(root / 'sitemap.xml.gz', iter_index(base_url))
+    for path in root.glob('sitemap-*.xml.gz'):
+        if path.name not in written:
+            path.unlink()
+    return len(written)
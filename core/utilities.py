@@ -1,6 +1,14 @@
-from django.contrib.gis.geoip2 import GeoIP2
+import re
 import socket
 
+# Crawlers, link previewers, monitors and HTTP libraries; matched anywhere in the UA.
+BOT_USER_AGENT_RE = re.compile(
+    r'bot|crawl|spider|slurp|scrape|preview|fetch|monitor|headless|phantom'
+    r'|lighthouse|facebookexternalhit|embedly|whatsapp|curl|wget|python-'
+    r'|go-http-client|java/|okhttp|axios|node-fetch|libwww|httpclient',
+    re.IGNORECASE,
+)
+
 
 def get_client_ip(request):
     """Get client IP address from request."""
@@ -17,6 +25,16 @@ def get_user_agent(request):
     return request.META.get('HTTP_USER_AGENT', '')
 
 
+def is_bot_user_agent(user_agent):
+    """Return True for empty or known automated user agents."""
+    return not user_agent or BOT_USER_AGENT_RE.search(user_agent) is not None
+
+
+def is_bot(request):
+    """Check if the request comes from a crawler or other automated client."""
+    return is_bot_user_agent(get_user_agent(request))
+
+
 def get_referrer(request):
     """Get referrer from request."""
     return request.META.get('HTTP_REFERER', None)
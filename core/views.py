@@ -1,8 +1,12 @@
 from django.views.generic import TemplateView
 from django.views.decorators.http import require_http_methods
-from django.http import HttpResponse
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
 from products.models import Category
 
+from .sitemaps import SECTIONS, cached_index, cached_urlset
+
 
 class RobotsView(TemplateView):
     """Robots.txt view."""
@@ -10,9 +14,36 @@ class RobotsView(TemplateView):
     content_type = 'text/plain'
 
 
+def _sitemap_base_url(request):
+    return getattr(settings, 'SITEMAP_BASE_URL', '').rstrip('/') or request.build_absolute_uri('/')[:-1]
+
+
+def _sitemap_response(response):
+    patch_cache_control(response, public=True, max_age=getattr(settings, 'SITEMAP_MAX_AGE', 3600))
+    return response
+
+
+@require_http_methods(["GET", "HEAD"])
 def sitemap_index(request):
-    """Sitemap index view."""
-    return render(request, 'sitemap_index.xml', content_type='application/xml')
+    """Sitemap index listing every sitemap shard."""
+    return _sitemap_response(HttpResponse(
+        cached_index(_sitemap_base_url(request)), content_type='application/xml'
+    ))
+
+
+@require_http_methods(["GET", "HEAD"])
+def sitemap_section(request, section, number):
+    """One shard of up to SITEMAP_SHARD_SIZE URLs, streamed on a cache miss."""
+    if section not in SECTIONS:
+        raise Http404('No such sitemap')
+    body = cached_urlset(SECTIONS[section], number, _sitemap_base_url(request))
+    if body is None:
+        raise Http404('No such sitemap')
+    if isinstance(body, list):
+        response = HttpResponse(body, content_type='application/xml')
+    else:
+        response = StreamingHttpResponse(body, content_type='application/xml')
+    return _sitemap_response(response)
 
 
 @require_http_methods(["GET"])
@@ -1,21 +1,21 @@
 from django.contrib import admin
+from django.db import transaction
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import Category, Product, Click
+from .models import Category, Product, Click, ClickRollup
 from .forms import ProductForm, CategoryForm
 from .csv_export import clicks_export_csv, products_export_csv
+from .catalog import products_changed
+from .category_counts import recount_categories
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     form = CategoryForm
-    list_display = ['name', 'product_count', 'created_at']
+    list_display = ['name', 'product_count', 'featured_count', 'created_at']
     list_filter = ['created_at']
     search_fields = ['name', 'description']
-    readonly_fields = ['created_at', 'updated_at']
-
-    def product_count(self, obj):
-        return obj.products.count()
-    product_count.short_description = 'Products Count'
+    readonly_fields = ['product_count', 'featured_count', 'created_at', 'updated_at']
 
 
 @admin.register(Product)
@@ -79,13 +79,28 @@ class ProductAdmin(admin.ModelAdmin):
 
     actions = ['mark_as_featured', 'remove_from_featured', products_export_csv]
 
+    def _ids(self, queryset):
+        """Product and category ids, read before an update changes the selection."""
+        rows = list(queryset.values_list('pk', 'category_id'))
+        return [pk for pk, _ in rows], {category_id for _, category_id in rows}
+
     def mark_as_featured(self, request, queryset):
-        updated = queryset.update(is_featured=True)
+        product_ids, category_ids = self._ids(queryset)
+        with transaction.atomic():
+            updated = queryset.update(is_featured=True, updated_at=timezone.now())
+            # update() skips the signals that maintain category counts
+            recount_categories(category_ids)
+        products_changed(product_ids)
         self.message_user(request, f'{updated} products marked as featured.')
     mark_as_featured.short_description = "Mark selected as featured"
 
     def remove_from_featured(self, request, queryset):
-        updated = queryset.update(is_featured=False)
+        product_ids, category_ids = self._ids(queryset)
+        with transaction.atomic():
+            updated = queryset.update(is_featured=False, updated_at=timezone.now())
+            # update() skips the signals that maintain category counts
+            recount_categories(category_ids)
+        products_changed(product_ids)
         self.message_user(request, f'{updated} products removed from featured.')
     remove_from_featured.short_description = "Remove from featured"
 
@@ -110,3 +125,20 @@ class ClickAdmin(admin.ModelAdmin):
 
     def has_delete_permission(self, request, obj=None):
         return request.user.is_superuser
+
+
+@admin.register(ClickRollup)
+class ClickRollupAdmin(admin.ModelAdmin):
+    list_display = ['product', 'granularity', 'bucket', 'clicks', 'unique_ips']
+    list_filter = ['granularity']
+    search_fields = ['product__name']
+    list_select_related = ['product']
+    readonly_fields = ['product', 'granularity', 'bucket', 'clicks', 'unique_ips']
+    exclude = ['ip_sketch']
+    date_hierarchy = 'bucket'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,158 @@
+"""
+Click log retention and archival.
+
+``archive_clicks()`` moves Click rows older than the retention window into
+append-only, gzip-compressed CSV files, one per UTC day
+(``clicks-YYYY-MM-DD.csv.gz``). Rows are read in primary-key order with
+keyset batching; each batch is appended as a new gzip member, fsynced, read
+back to verify the row count, and only then deleted in bounded chunks.
+
+Every member starts with a header row naming its columns, which are all of
+Click's concrete fields, so files written before a column was added still
+read back. A batch interrupted between the append and the delete is
+archived again on the next run; ``iter_archived_clicks`` skips the
+duplicate ids.
+"""
+import csv
+import gzip
+import io
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Click, RollupCursor
+from .rollups import CURSOR_NAME
+
+FIELDS = [field.attname for field in Click._meta.concrete_fields]
+CREATED_AT = FIELDS.index('created_at')
+# Columns that store NULL as an empty CSV value
+NULLABLE = [field.attname for field in Click._meta.concrete_fields if field.null]
+DELETE_CHUNK_SIZE = 1000
+
+
+def get_archive_dir():
+    archive_dir = str(getattr(settings, 'CLICK_ARCHIVE_DIR', settings.BASE_DIR / 'var' / 'click-archive'))
+    os.makedirs(archive_dir, exist_ok=True)
+    return archive_dir
+
+
+def archive_path(day, archive_dir=None):
+    return os.path.join(archive_dir or get_archive_dir(), f'clicks-{day:%Y-%m-%d}.csv.gz')
+
+
+class ArchiveVerificationError(Exception):
+    """Raised when an appended archive member does not read back intact."""
+
+
+def _append_member(path, rows):
+    """Append ``rows`` as one gzip member, fsync, and verify the row count."""
+    with open(path, 'ab') as raw:
+        offset = raw.tell()
+        text = io.StringIO()
+        writer = csv.writer(text)
+        writer.writerow(FIELDS)
+        writer.writerows(rows)
+        with gzip.GzipFile(fileobj=raw, mode='wb') as member:
+            member.write(text.getvalue().encode('utf-8'))
+        raw.flush()
+        os.fsync(raw.fileno())
+
+    with open(path, 'rb') as raw:
+        raw.seek(offset)
+        with gzip.GzipFile(fileobj=raw, mode='rb') as member:
+            reader = csv.reader(io.TextIOWrapper(member, encoding='utf-8', newline=''))
+            written = sum(1 for row in reader if row[:1] != ['id'])
+    if written != len(rows):
+        raise ArchiveVerificationError(
+            f'{path}: expected {len(rows)} archived rows, read back {written}'
+        )
+
+
+def archive_clicks(retention_days=None, batch_size=5000, require_rollup=True, dry_run=False):
+    """
+    Archive and delete clicks older than ``retention_days``.
+
+    With ``require_rollup`` only clicks already folded into ClickRollup are
+    touched, so archival never loses analytics. Returns
+    ``(archived, cutoff)``.
+    """
+    if retention_days is None:
+        retention_days = getattr(settings, 'CLICK_RETENTION_DAYS', 90)
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    clicks = Click.objects.filter(created_at__lt=cutoff)
+    if require_rollup:
+        cursor = RollupCursor.objects.filter(name=CURSOR_NAME).first()
+        clicks = clicks.filter(id__lte=cursor.last_click_id if cursor else 0)
+
+    if dry_run:
+        return clicks.count(), cutoff
+
+    archive_dir = get_archive_dir()
+    archived = 0
+    last_id = 0
+    while True:
+        batch = (
+            clicks.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list(*FIELDS)[:batch_size]
+        )
+        by_day = defaultdict(list)
+        ids = []
+        for row in batch.iterator(chunk_size=batch_size):
+            row = list(row)
+            created_at = row[CREATED_AT].astimezone(dt_timezone.utc)
+            row[CREATED_AT] = created_at.isoformat()
+            by_day[created_at.date()].append(row)
+            ids.append(row[0])
+        if not ids:
+            break
+
+        for day, rows in sorted(by_day.items()):
+            _append_member(archive_path(day, archive_dir), rows)
+        for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+            Click.objects.filter(id__in=ids[start:start + DELETE_CHUNK_SIZE]).delete()
+
+        archived += len(ids)
+        last_id = ids[-1]
+    return archived, cutoff
+
+
+def iter_archived_clicks(start, end, product_id=None, archive_dir=None):
+    """
+    Yield archived clicks as dicts for UTC dates ``start``..``end`` inclusive.
+    """
+    archive_dir = archive_dir or get_archive_dir()
+    day = start
+    while day <= end:
+        path = archive_path(day, archive_dir)
+        day += timedelta(days=1)
+        if not os.path.exists(path):
+            continue
+        seen = set()
+        columns = FIELDS
+        with gzip.open(path, 'rt', encoding='utf-8', newline='') as f:
+            for row in csv.reader(f):
+                if row[:1] == ['id']:
+                    columns = row
+                    continue
+                record = dict.fromkeys(FIELDS)
+                record.update(zip(columns, row))
+                click_id = int(record['id'])
+                if click_id in seen:
+                    continue
+                seen.add(click_id)
+                record['id'] = click_id
+                record['product_id'] = int(record['product_id'])
+                if product_id is not None and record['product_id'] != product_id:
+                    continue
+                record['created_at'] = datetime.fromisoformat(record['created_at'])
+                for name in NULLABLE:
+                    record[name] = record[name] or None
+                yield record
+
+
+def count_archived_clicks(start, end, product_id=None, archive_dir=None):
+    return sum(1 for _ in iter_archived_clicks(start, end, product_id, archive_dir))
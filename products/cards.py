@@ -0,0 +1,55 @@
+"""
+Cached product card HTML.
+
+Listing pages show many products as ``includes/product_card.html``; each
+card is cached on its own, keyed on the product id and ``updated_at`` plus
+the category's ``updated_at`` (the card shows the category name) and, when
+``PRODUCT_CARD_COUNTERS`` is on, the click and view counts. An edit makes
+the old copies unreachable; no explicit invalidation is needed. A listing
+fetches all of its cards with one ``get_many`` and renders only the misses.
+
+With ``PRODUCT_CARD_COUNTERS`` off the cards leave out the live counters,
+so click and view traffic no longer changes the keys.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+
+KEY_PREFIX = 'card'
+TEMPLATE_NAME = 'includes/product_card.html'
+
+
+def _show_counters():
+    return getattr(settings, 'PRODUCT_CARD_COUNTERS', True)
+
+
+def card_key(product, show_counters):
+    """Cache key for ``product``'s card; changes whenever the card would."""
+    key = (
+        f'{KEY_PREFIX}:{product.pk}:{product.updated_at.timestamp()}'
+        f':{product.category_id}:{product.category.updated_at.timestamp()}'
+    )
+    if show_counters:
+        key += f':{product.click_count}:{product.views_count}'
+    return key
+
+
+def render_cards(products):
+    """``[(product, html)]`` for ``products``, rendering only uncached cards."""
+    products = list(products)
+    if not products:
+        return []
+    cache = caches[getattr(settings, 'PRODUCT_CARD_CACHE', 'default')]
+    show_counters = _show_counters()
+    keys = [card_key(product, show_counters) for product in products]
+    cards = cache.get_many(keys)
+
+    missing = {}
+    for product, key in zip(products, keys):
+        if key not in cards:
+            cards[key] = missing[key] = render_to_string(
+                TEMPLATE_NAME, {'product': product, 'show_counters': show_counters}
+            )
+    if missing:
+        cache.set_many(missing, getattr(settings, 'PRODUCT_CARD_CACHE_TIMEOUT', 86400))
+    return [(product, cards[key]) for product, key in zip(products, keys)]
@@ -0,0 +1,47 @@
+"""
+Catalog version stamp.
+
+A single integer in the default cache that is bumped whenever a Product or
+Category changes (see ``products.signals``). Caches derived from the
+catalog include it in their keys or compare against it, so one increment
+invalidates all of them without tracking individual entries.
+"""
+from django.core.cache import cache
+
+from core.fragments import bump_fragment_versions
+from core.page_cache import instance_tag, list_tag, purge_tags
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+# Home page fragments (see core.fragments) that render products or categories
+PRODUCT_FRAGMENTS = ('home_featured', 'home_top_rated', 'home_trending')
+CATEGORY_FRAGMENTS = PRODUCT_FRAGMENTS + ('home_categories',)
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version():
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        # Key missing (first run or evicted); any fresh value invalidates.
+        cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+        return cache.incr(CATALOG_VERSION_KEY)
+
+
+def products_changed(product_ids=()):
+    """
+    Invalidate the catalog version, the fragments showing products and the
+    cached pages of ``product_ids``; for bulk updates that skip signals.
+    """
+    from .models import Product
+
+    bump_catalog_version()
+    bump_fragment_versions(*PRODUCT_FRAGMENTS)
+    purge_tags(list_tag(Product), *(instance_tag(Product, pk) for pk in product_ids))
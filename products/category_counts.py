@@ -0,0 +1,69 @@
+"""
+Denormalized ``Category.product_count`` and ``Category.featured_count``.
+
+Product saves and deletes adjust the counts in the same transaction (see
+``products.signals``). Bulk ``QuerySet.update()`` calls skip signals, so
+callers that change ``category`` or ``is_featured`` in bulk recount the
+affected categories afterwards; ``recount_categories`` with no arguments
+repairs any drift (e.g. after ``loaddata``) across the whole table.
+"""
+from collections import defaultdict
+
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+STATE_ATTR = '_category_count_state'
+
+
+def count_state(product):
+    """The ``(category_id, is_featured)`` pair the counts currently include."""
+    return product.category_id, bool(product.is_featured)
+
+
+def apply_count_deltas(deltas):
+    """Add ``{category_id: (products, featured)}`` to the stored counts."""
+    from .models import Category
+
+    for category_id, (products, featured) in deltas.items():
+        if not products and not featured:
+            continue
+        Category.objects.filter(pk=category_id).update(
+            product_count=Greatest(F('product_count') + products, Value(0)),
+            featured_count=Greatest(F('featured_count') + featured, Value(0)),
+        )
+
+
+def count_deltas(old_state, new_state):
+    """Per-category deltas for a product moving from ``old_state`` to ``new_state``."""
+    deltas = defaultdict(lambda: (0, 0))
+    if old_state is not None:
+        category_id, featured = old_state
+        products_delta, featured_delta = deltas[category_id]
+        deltas[category_id] = (products_delta - 1, featured_delta - featured)
+    if new_state is not None:
+        category_id, featured = new_state
+        products_delta, featured_delta = deltas[category_id]
+        deltas[category_id] = (products_delta + 1, featured_delta + featured)
+    return deltas
+
+
+def recount_categories(category_ids=None):
+    """
+    Recompute the stored counts from the products table in one UPDATE.
+
+    Pass ``category_ids`` to limit the recount; returns the rows updated.
+    """
+    from .models import Category, Product
+
+    def product_total(condition=Q()):
+        counts = Product.objects.filter(condition, category=OuterRef('pk')).order_by()
+        counts = counts.values('category').annotate(total=Count('pk')).values('total')
+        return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+    categories = Category.objects.all()
+    if category_ids is not None:
+        categories = categories.filter(pk__in=category_ids)
+    return categories.update(
+        product_count=product_total(),
+        featured_count=product_total(Q(is_featured=True)),
+    )
@@ -0,0 +1,142 @@
+"""
+Duplicate and bot click suppression.
+
+Clicks from automated user agents, and repeat clicks on the same product
+from the same IP within ``CLICK_DEDUP_WINDOW`` seconds, are dropped before
+they reach the click buffer. Recent (ip, product) pairs live in a rotating
+pair of Bloom filters, so memory stays fixed however many clicks arrive.
+A false positive drops a genuine click at roughly
+``CLICK_DEDUP_ERROR_RATE``; it never records a duplicate.
+
+Suppression is per worker: the same pair hitting two workers can still be
+counted twice.
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+from core.utilities import is_bot_user_agent
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over byte strings."""
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        """Add ``key``; return True if it was (probably) already present."""
+        present = True
+        for position in self._positions(key):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                present = False
+                self.bits[byte] |= 1 << bit
+        return present
+
+    def __contains__(self, key):
+        return all(
+            self.bits[position // 8] & (1 << (position % 8))
+            for position in self._positions(key)
+        )
+
+
+class RotatingBloomFilter:
+    """
+    Two Bloom filter generations covering a sliding time window.
+
+    The current generation is retired once it is ``window`` seconds old, so
+    a key is remembered for at least ``window`` and at most twice that.
+    """
+
+    def __init__(self, window, capacity, error_rate):
+        self.window = window
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.current = BloomFilter(capacity, error_rate)
+        self.previous = BloomFilter(capacity, error_rate)
+        self.started = time.monotonic()
+
+    def seen(self, key, now=None):
+        """Record ``key`` and return True if it was seen within the window."""
+        now = time.monotonic() if now is None else now
+        if now - self.started >= self.window:
+            self.previous = self.current if now - self.started < 2 * self.window \
+                else BloomFilter(self.capacity, self.error_rate)
+            self.current = BloomFilter(self.capacity, self.error_rate)
+            self.started = now
+        in_current = self.current.add(key)
+        return in_current or key in self.previous
+
+
+class ClickFilter:
+    """Decides whether a click should be recorded and counts what it drops."""
+
+    def __init__(self, window=None, capacity=None, error_rate=None):
+        self.recent = RotatingBloomFilter(
+            window or getattr(settings, 'CLICK_DEDUP_WINDOW', 30),
+            capacity or getattr(settings, 'CLICK_DEDUP_CAPACITY', 100000),
+            error_rate or getattr(settings, 'CLICK_DEDUP_ERROR_RATE', 0.001),
+        )
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    def accept(self, product_id, ip_address, user_agent):
+        if is_bot_user_agent(user_agent):
+            reason = 'bots'
+        else:
+            key = f'{ip_address}|{product_id}'.encode('utf-8')
+            with self._lock:
+                duplicate = self.recent.seen(key)
+            reason = 'duplicates' if duplicate else 'accepted'
+        with self._lock:
+            self.stats[reason] += 1
+        return reason == 'accepted'
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'accepted': self.stats['accepted'],
+                'duplicates': self.stats['duplicates'],
+                'bots': self.stats['bots'],
+            }
+
+
+_filter = None
+_filter_lock = threading.Lock()
+
+
+def get_filter():
+    global _filter
+    with _filter_lock:
+        if _filter is None:
+            _filter = ClickFilter()
+        return _filter
+
+
+def should_record(product_id, ip_address, user_agent):
+    """Return False for bot or duplicate clicks, True when enabled otherwise."""
+    if not getattr(settings, 'CLICK_DEDUP_ENABLED', True):
+        return True
+    return get_filter().accept(product_id, ip_address, user_agent)
+
+
+def suppression_stats():
+    """
+    Counts of accepted, duplicate and bot clicks seen by this worker.
+
+    Also logged by the click flusher each time it writes a batch.
+    """
+    return get_filter().get_stats()
@@ -0,0 +1,255 @@
+"""
+Buffered click ingestion for the affiliate redirect.
+
+The redirect only enqueues a compact click record; a background flusher
+writes the records in batches with ``bulk_create`` and applies one
+``F('click_count') + n`` update per product. Every record is also appended
+to a per-worker spill file so a crashed worker does not lose clicks; the
+``drain_clicks`` management command replays whatever was left behind.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+
+from .click_filter import should_record, suppression_stats
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_SUFFIX = '.active'
+PENDING_SUFFIX = '.pending'
+REFERRER_MAX_LENGTH = 200
+
+
+def get_spill_dir():
+    """Return the spill directory, creating it if needed."""
+    spill_dir = str(getattr(settings, 'CLICK_SPILL_DIR', settings.BASE_DIR / 'var' / 'clicks'))
+    os.makedirs(spill_dir, exist_ok=True)
+    return spill_dir
+
+
+def make_record(product_id, ip_address, user_agent, referrer, timestamp=None):
+    """Build the compact click record stored in memory and in spill files."""
+    if referrer:
+        referrer = referrer[:REFERRER_MAX_LENGTH]
+    return [
+        product_id,
+        timestamp if timestamp is not None else time.time(),
+        ip_address,
+        user_agent or '',
+        referrer,
+    ]
+
+
+def write_clicks(records, batch_size=None):
+    """
+    Persist click records to the database.
+
+    Clicks for products that no longer exist are dropped. Returns the number
+    of Click rows written.
+    """
+    from .models import Click, Product
+
+    if not records:
+        return 0
+    batch_size = batch_size or getattr(settings, 'CLICK_BATCH_SIZE', 500)
+
+    product_ids = {record[0] for record in records}
+    existing = set(
+        Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True)
+    )
+
+    clicks = []
+    counts = Counter()
+    for product_id, timestamp, ip_address, user_agent, referrer in records:
+        if product_id not in existing:
+            continue
+        clicks.append(Click(
+            product_id=product_id,
+            ip_address=ip_address,
+            user_agent=user_agent,
+            referrer=referrer,
+            created_at=datetime.fromtimestamp(timestamp, tz=dt_timezone.utc),
+        ))
+        counts[product_id] += 1
+
+    with transaction.atomic():
+        Click.objects.bulk_create(clicks, batch_size=batch_size)
+        for product_id, count in counts.items():
+            Product.objects.filter(pk=product_id).update(
+                click_count=F('click_count') + count
+            )
+    return len(clicks)
+
+
+def read_spill_file(fileobj):
+    """Yield click records from a spill file, skipping torn lines."""
+    for line in fileobj:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            logger.warning('Skipping unreadable click spill line: %r', line[:100])
+            continue
+        if isinstance(record, list) and len(record) == 5:
+            yield record
+
+
+class ClickBuffer:
+    """Per-process click queue with a periodic background flusher."""
+
+    def __init__(self, batch_size=None, flush_interval=None, spill_dir=None):
+        self.batch_size = batch_size or getattr(settings, 'CLICK_BATCH_SIZE', 500)
+        self.flush_interval = flush_interval or getattr(settings, 'CLICK_FLUSH_INTERVAL', 5.0)
+        self.spill_dir = spill_dir or get_spill_dir()
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._records = []
+        self._sequence = 0
+        self._spill = None
+        self._thread = None
+
+    def _spill_prefix(self):
+        return os.path.join(self.spill_dir, f'{socket.gethostname()}-{self.pid}')
+
+    def _open_spill(self):
+        """Open and lock a fresh active spill file."""
+        path = self._spill_prefix() + ACTIVE_SUFFIX
+        spill = open(path, 'a', encoding='utf-8')
+        fcntl.flock(spill.fileno(), fcntl.LOCK_EX)
+        return spill
+
+    def _start(self):
+        stale = self._spill_prefix() + ACTIVE_SUFFIX
+        if os.path.exists(stale):
+            # Left behind by a crashed process that had the same pid.
+            os.rename(stale, f'{self._spill_prefix()}-orphan-{int(time.time())}{PENDING_SUFFIX}')
+        self._spill = self._open_spill()
+        self._thread = threading.Thread(
+            target=self._run, name='click-buffer-flusher', daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def enqueue(self, record):
+        """Queue a click record and append it to the spill file."""
+        with self._lock:
+            if self._thread is None:
+                self._start()
+            self._spill.write(json.dumps(record, separators=(',', ':')) + '\n')
+            self._spill.flush()
+            self._records.append(record)
+            full = len(self._records) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """
+        Write all queued clicks to the database.
+
+        The active spill file is rotated to a pending file before the write
+        and removed afterwards. If the write fails the pending file is left
+        in place for ``drain_clicks`` instead of being retried in memory.
+        """
+        with self._lock:
+            if not self._records:
+                return 0
+            records, self._records = self._records, []
+            spill = self._spill
+            self._sequence += 1
+            pending_path = f'{self._spill_prefix()}-{self._sequence}{PENDING_SUFFIX}'
+            os.rename(spill.name, pending_path)
+            self._spill = self._open_spill()
+
+        try:
+            written = write_clicks(records, self.batch_size)
+        except Exception:
+            logger.exception(
+                'Failed to flush %d clicks; left in %s', len(records), pending_path
+            )
+            spill.close()
+            return 0
+        os.unlink(pending_path)
+        spill.close()
+        logger.info(
+            'Flushed %d clicks (suppressed so far: %s)', written, suppression_stats()
+        )
+        return written
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """Return this process's click buffer, recreating it after a fork."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None or _buffer.pid != os.getpid():
+            _buffer = ClickBuffer()
+        return _buffer
+
+
+def record_click(product_id, ip_address, user_agent, referrer):
+    """
+    Record an affiliate click, buffered unless CLICK_BUFFER_ENABLED is off.
+
+    Bot and duplicate clicks are dropped; returns whether the click was kept.
+    """
+    if not should_record(product_id, ip_address, user_agent):
+        return False
+    record = make_record(product_id, ip_address, user_agent, referrer)
+    if not getattr(settings, 'CLICK_BUFFER_ENABLED', True):
+        write_clicks([record])
+        return True
+    get_buffer().enqueue(record)
+    return True
+
+
+def claim_spill_files(spill_dir=None):
+    """
+    Yield ``(path, fileobj)`` for spill files no live worker owns.
+
+    Files are locked while yielded; active files of running workers and
+    pending files being flushed are skipped because their lock is held.
+    """
+    spill_dir = spill_dir or get_spill_dir()
+    paths = sorted(
+        glob.glob(os.path.join(spill_dir, '*' + PENDING_SUFFIX))
+        + glob.glob(os.path.join(spill_dir, '*' + ACTIVE_SUFFIX))
+    )
+    for path in paths:
+        try:
+            fileobj = open(path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            continue
+        with fileobj:
+            try:
+                fcntl.flock(fileobj.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            if os.fstat(fileobj.fileno()).st_nlink == 0:
+                # Flushed and unlinked between listing and locking.
+                continue
+            yield path, fileobj
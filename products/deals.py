@@ -0,0 +1,85 @@
+"""
+Stored ``Product.discount``.
+
+The percentage off ``original_price`` is kept in an indexed column so deal
+listings and discount facets can filter and sort on it in SQL. ``Product.save``
+recomputes it with ``compute_discount``; bulk ``QuerySet.update()`` calls
+and imports that change ``price`` or ``original_price`` skip ``save``, so
+callers run ``refresh_discounts`` over the same rows afterwards, or the
+``refresh_discounts`` management command over the whole table.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, FloatField, Value, When
+from django.db.models.functions import Round
+from django.utils import timezone
+
+DISCOUNT_PLACES = Decimal('0.01')
+BATCH_SIZE = 5000
+
+
+def compute_discount(price, original_price):
+    """Percentage off, to two places; 0 without a higher original price."""
+    if original_price and price is not None and price < original_price:
+        discount = (original_price - price) / original_price * 100
+        return Decimal(discount).quantize(DISCOUNT_PLACES, rounding=ROUND_HALF_UP)
+    return Decimal('0.00')
+
+
+def discount_expression():
+    """SQL equivalent of ``compute_discount`` for ``QuerySet.update()``."""
+    output_field = DecimalField(max_digits=5, decimal_places=2)
+    return Case(
+        When(
+            original_price__gt=F('price'),
+            then=Round(ExpressionWrapper(
+                (F('original_price') - F('price')) * Value(100.0) / F('original_price'),
+                output_field=FloatField(),
+            ), 2),
+        ),
+        default=Value(Decimal('0.00')),
+        output_field=output_field,
+    )
+
+
+def refresh_discounts(queryset=None, batch_size=BATCH_SIZE):
+    """
+    Recompute ``discount`` in primary-key batches; returns the rows changed.
+
+    Each batch is one UPDATE over a pk range, so large tables are never
+    locked in a single statement. Only rows whose discount actually changes
+    are written; they get a new ``updated_at`` so the facet counts and
+    conditional responses notice, and their cached pages are purged.
+    """
+    from .catalog import products_changed
+    from .models import Product
+
+    if queryset is None:
+        queryset = Product.objects.all()
+
+    queryset = queryset.order_by()
+    changed = []
+    last_pk = 0
+    while True:
+        batch = list(
+            queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            break
+        with transaction.atomic():
+            stale = list(
+                queryset.filter(pk__gte=batch[0], pk__lte=batch[-1])
+                .annotate(fresh_discount=discount_expression())
+                .exclude(discount=F('fresh_discount'))
+                .values_list('pk', flat=True)
+            )
+            if stale:
+                Product.objects.filter(pk__in=stale).update(
+                    discount=discount_expression(), updated_at=timezone.now(),
+                )
+        changed.extend(stale)
+        last_pk = batch[-1]
+    if changed:
+        products_changed(changed)
+    return len(changed)
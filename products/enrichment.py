@@ -0,0 +1,51 @@
+"""
+Out-of-band GeoIP enrichment of clicks.
+
+Walks Click rows past a stored high-water mark in id order (up to
+``RollupCursor.committed_click_id``) and fills in ``country`` and ``city``
+with batched ``bulk_update`` calls. Never called from the redirect path.
+"""
+from django.db import transaction
+
+from core.geoip import GeoLocator
+from .models import Click, RollupCursor
+
+CURSOR_NAME = 'geoip_enrichment'
+
+
+def enrich_clicks(batch_size=5000, locator=None, max_batches=None):
+    """
+    Resolve locations for clicks newer than the cursor.
+
+    Returns ``(clicks_processed, clicks_located, locator)``.
+    """
+    locator = locator or GeoLocator()
+    processed = located = batches = 0
+    cursor, _ = RollupCursor.objects.get_or_create(name=CURSOR_NAME)
+    limit = cursor.committed_click_id()
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            cursor = RollupCursor.objects.select_for_update().get(name=CURSOR_NAME)
+            rows = list(
+                Click.objects.filter(id__gt=cursor.last_click_id, id__lte=limit)
+                .order_by('id')
+                .values_list('id', 'ip_address')[:batch_size]
+            )
+            if not rows:
+                break
+
+            updates = []
+            for click_id, ip_address in rows:
+                if not ip_address:
+                    continue
+                country, city = locator.lookup(ip_address)
+                if country or city:
+                    updates.append(Click(id=click_id, country=country, city=city))
+            Click.objects.bulk_update(updates, ['country', 'city'], batch_size=1000)
+
+            cursor.last_click_id = rows[-1][0]
+            cursor.save(update_fields=['last_click_id', 'updated_at'])
+        processed += len(rows)
+        located += len(updates)
+        batches += 1
+    return processed, located, locator
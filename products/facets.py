@@ -0,0 +1,304 @@
+"""
+Faceted filtering for category pages.
+
+Each worker keeps, per category it has served, the price, rating and
+discount of every product in parallel arrays plus one bitmap (a Python int,
+bit ``i`` = slot ``i``) per facet value. Counts are popcounts of ANDed
+bitmaps: values within a facet group are ORed, groups are ANDed, and a
+value's count applies every *other* group's selection, i.e. it is what the
+page would list with that value picked alone in its group. Nothing here
+queries the
+database per facet value; the product list itself is paged with the
+equivalent range filters (``facet_filter``) and the keyset paginator.
+
+Product saves and deletes append the product id to a change journal in
+``FACET_CACHE``; every worker replays new entries into the categories it
+has loaded before answering, reloading just those products. If the journal
+has gaps (expired entries, cache flush) the loaded categories are dropped
+and rebuilt on their next request.
+
+The journal only saves work. Correctness comes from the database: each
+request compares the category's newest product ``updated_at`` (one seek on
+the ``(category, updated_at)`` index) and its denormalized
+``product_count`` with what its bitmaps hold, and rebuilds them on any
+difference. So changes that never reached this worker's journal cannot
+leave counts stale.
+That happens when ``FACET_CACHE`` is not shared between workers, or after
+bulk updates. Without a shared cache, though, every change costs each
+worker a rebuild.
+"""
+import threading
+from array import array
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Max, Q
+
+JOURNAL_PREFIX = 'facets'
+JOURNAL_SEQ_KEY = f'{JOURNAL_PREFIX}:seq'
+JOURNAL_TTL = 24 * 60 * 60
+
+# ``low <= value < high``; ``high`` of None means no upper bound
+FacetValue = namedtuple('FacetValue', ['key', 'label', 'low', 'high'])
+
+FACET_GROUPS = [
+    ('price', 'Price', [
+        FacetValue('0-25', 'Under $25', 0, 25),
+        FacetValue('25-50', '$25 - $50', 25, 50),
+        FacetValue('50-100', '$50 - $100', 50, 100),
+        FacetValue('100-250', '$100 - $250', 100, 250),
+        FacetValue('250-', '$250 & up', 250, None),
+    ]),
+    ('rating', 'Rating', [
+        FacetValue('4.5', '4.5 & up', 4.5, None),
+        FacetValue('4', '4 & up', 4, None),
+        FacetValue('3', '3 & up', 3, None),
+    ]),
+    ('discount', 'Discount', [
+        FacetValue('10', '10% off or more', 10, None),
+        FacetValue('25', '25% off or more', 25, None),
+        FacetValue('50', '50% off or more', 50, None),
+    ]),
+]
+FACET_VALUES = {group: {value.key: value for value in values} for group, _, values in FACET_GROUPS}
+
+
+def _matches(value, field_value):
+    return value.low <= field_value and (value.high is None or field_value < value.high)
+
+
+def _range_q(field, value):
+    q = Q(**{f'{field}__gte': value.low})
+    if value.high is not None:
+        q &= Q(**{f'{field}__lt': value.high})
+    return q
+
+
+def facet_filter(selected):
+    """Q matching the products a ``{group: [keys]}`` selection keeps."""
+    condition = Q()
+    for group, keys in selected.items():
+        group_q = Q()
+        for key in keys:
+            group_q |= _range_q(group, FACET_VALUES[group][key])
+        condition &= group_q
+    return condition
+
+
+def parse_selection(query_dict):
+    """``{group: [keys]}`` of the valid facet values in a request's GET params."""
+    selected = {}
+    for group, values in FACET_VALUES.items():
+        keys = [key for key in dict.fromkeys(query_dict.getlist(group)) if key in values]
+        if keys:
+            selected[group] = keys
+    return selected
+
+
+class CategoryFacets:
+    """Facet bitmaps over the products of one category."""
+
+    def __init__(self, rows=()):
+        """``rows`` are ``(product_id, price, rating, discount, updated_at)`` tuples."""
+        self.slots = {}
+        self.free = []
+        self.fields = {group: array('d') for group in FACET_VALUES}
+        self.updated = array('d')
+        for slot, (product_id, *values, updated_at) in enumerate(rows):
+            self.slots[product_id] = slot
+            for group, field_value in self._values(*values).items():
+                self.fields[group].append(field_value)
+            self.updated.append(updated_at.timestamp())
+        self._newest = None
+        self.count_drift = 0
+        # Built a byte at a time: OR-ing single bits into a large int copies
+        # the whole int every time.
+        size = len(self.slots)
+        self.alive = (1 << size) - 1
+        self.masks = {}
+        for group, facet_values in FACET_VALUES.items():
+            field = self.fields[group]
+            for key, value in facet_values.items():
+                bits = bytearray((size + 7) // 8)
+                for slot, field_value in enumerate(field):
+                    if _matches(value, field_value):
+                        bits[slot >> 3] |= 1 << (slot & 7)
+                self.masks[(group, key)] = int.from_bytes(bits, 'little')
+
+    @staticmethod
+    def _values(price, rating, discount):
+        return {'price': float(price), 'rating': float(rating), 'discount': float(discount)}
+
+    def __len__(self):
+        return len(self.slots)
+
+    def version(self):
+        """``(newest updated_at timestamp or None, product count)`` of the loaded rows."""
+        if self._newest is None and self.slots:
+            self._newest = max(self.updated[slot] for slot in self.slots.values())
+        # ``count_drift`` carries a stored count that was off at build time,
+        # so it does not force a rebuild on every request until recounted
+        return self._newest, len(self.slots) + self.count_drift
+
+    def add(self, product_id, price, rating, discount, updated_at):
+        self.remove(product_id)
+        values = self._values(price, rating, discount)
+        timestamp = updated_at.timestamp()
+        if self.free:
+            slot = self.free.pop()
+            for group, field in self.fields.items():
+                field[slot] = values[group]
+            self.updated[slot] = timestamp
+        else:
+            slot = len(self.fields['price'])
+            for group, field in self.fields.items():
+                field.append(values[group])
+            self.updated.append(timestamp)
+        self.slots[product_id] = slot
+        if self._newest is not None:
+            self._newest = max(self._newest, timestamp)
+        bit = 1 << slot
+        self.alive |= bit
+        for group, facet_values in FACET_VALUES.items():
+            for key, value in facet_values.items():
+                if _matches(value, values[group]):
+                    self.masks[(group, key)] |= bit
+
+    def remove(self, product_id):
+        slot = self.slots.pop(product_id, None)
+        if slot is None:
+            return
+        bit = 1 << slot
+        self.alive &= ~bit
+        for mask_key, mask in self.masks.items():
+            if mask & bit:
+                self.masks[mask_key] = mask & ~bit
+        self.free.append(slot)
+        if self.updated[slot] == self._newest:
+            self._newest = None
+
+    def _group_mask(self, group, keys):
+        mask = 0
+        for key in keys:
+            mask |= self.masks[(group, key)]
+        return mask
+
+    def counts(self, selected):
+        """
+        ``(groups, total)``: per-group value counts for the facet sidebar and
+        the number of products matching the whole selection.
+        """
+        group_masks = {group: self._group_mask(group, keys) for group, keys in selected.items()}
+        total_mask = self.alive
+        for mask in group_masks.values():
+            total_mask &= mask
+
+        groups = []
+        for group, label, values in FACET_GROUPS:
+            others = self.alive
+            for other, mask in group_masks.items():
+                if other != group:
+                    others &= mask
+            groups.append({
+                'name': group,
+                'label': label,
+                'values': [
+                    {
+                        'key': value.key,
+                        'label': value.label,
+                        'count': (self.masks[(group, value.key)] & others).bit_count(),
+                        'selected': value.key in selected.get(group, ()),
+                    }
+                    for value in values
+                ],
+            })
+        return groups, total_mask.bit_count()
+
+
+class FacetEngine:
+    """Per-process ``CategoryFacets`` for the categories served so far."""
+
+    def __init__(self, cache_alias=None):
+        self.cache = caches[cache_alias or getattr(settings, 'FACET_CACHE', 'default')]
+        self.categories = {}
+        self.sequence = self._journal_sequence()
+        self._lock = threading.RLock()
+
+    def _journal_sequence(self):
+        return self.cache.get(JOURNAL_SEQ_KEY, 0)
+
+    def _rows(self, queryset):
+        return queryset.values_list(
+            'pk', 'price', 'rating', 'discount', 'updated_at'
+        ).iterator(chunk_size=5000)
+
+    def _version(self, category):
+        """The database's ``(newest updated_at timestamp, product count)`` for ``category``."""
+        from .models import Product
+
+        newest = Product.objects.filter(category_id=category.pk).aggregate(newest=Max('updated_at'))['newest']
+        return (newest.timestamp() if newest else None), category.product_count
+
+    def _build(self, category_id, product_count):
+        from .models import Product
+
+        facets = CategoryFacets(self._rows(Product.objects.filter(category_id=category_id)))
+        facets.count_drift = product_count - len(facets)
+        return facets
+
+    def _apply(self, product_ids):
+        """Reload the given products into whichever loaded categories they belong to."""
+        from .models import Product
+
+        for facets in self.categories.values():
+            for product_id in product_ids:
+                facets.remove(product_id)
+        rows = Product.objects.filter(pk__in=product_ids, category_id__in=list(self.categories))
+        for product_id, category_id, *values in rows.values_list(
+            'pk', 'category_id', 'price', 'rating', 'discount', 'updated_at'
+        ):
+            self.categories[category_id].add(product_id, *values)
+
+    def _sync(self):
+        """Replay journal entries written by any worker since the last sync."""
+        latest = self._journal_sequence()
+        if latest == self.sequence:
+            return
+        keys = [f'{JOURNAL_PREFIX}:change:{n}' for n in range(self.sequence + 1, latest + 1)]
+        changes = self.cache.get_many(keys) if latest > self.sequence else {}
+        if latest < self.sequence or len(changes) < len(keys):
+            # Journal was reset or entries expired; rebuild lazily.
+            self.categories = {}
+        elif self.categories:
+            self._apply({pk for product_ids in changes.values() for pk in product_ids})
+        self.sequence = latest
+
+    def counts(self, category, selected):
+        version = self._version(category)
+        with self._lock:
+            self._sync()
+            facets = self.categories.get(category.pk)
+            if facets is None or facets.version() != version:
+                facets = self.categories[category.pk] = self._build(category.pk, category.product_count)
+            return facets.counts(selected)
+
+
+def record_change(product_ids):
+    """Journal changed products so every worker's facets pick them up."""
+    cache = caches[getattr(settings, 'FACET_CACHE', 'default')]
+    cache.add(JOURNAL_SEQ_KEY, 0, timeout=None)
+    sequence = cache.incr(JOURNAL_SEQ_KEY)
+    cache.set(f'{JOURNAL_PREFIX}:change:{sequence}', list(product_ids), timeout=JOURNAL_TTL)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = FacetEngine()
+        return _engine
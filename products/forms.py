@@ -2,6 +2,25 @@ from django import forms
 from .models import Product, Category
 
 
+class CommaSeparatedListField(forms.CharField):
+    """Edits a JSON list of strings as comma separated text."""
+
+    def __init__(self, *, encoder=None, decoder=None, **kwargs):
+        # Passed in by JSONField.formfield(); the value is always a plain list
+        super().__init__(**kwargs)
+
+    def prepare_value(self, value):
+        if isinstance(value, (list, tuple)):
+            return ', '.join(value)
+        return value
+
+    def to_python(self, value):
+        if isinstance(value, (list, tuple)):
+            return list(value)
+        value = super().to_python(value)
+        return [item.strip() for item in value.split(',') if item.strip()]
+
+
 class ProductForm(forms.ModelForm):
     """Custom form for Product model with improved widgets."""
     
@@ -20,6 +39,10 @@ class ProductForm(forms.ModelForm):
             'affiliate_url',
             'is_featured'
         ]
+        field_classes = {
+            'pros': CommaSeparatedListField,
+            'cons': CommaSeparatedListField,
+        }
         widgets = {
             'name': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from products.archive import archive_clicks, get_archive_dir
+
+
+class Command(BaseCommand):
+    help = 'Move clicks older than the retention window into gzip CSV archives'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=getattr(settings, 'CLICK_RETENTION_DAYS', 90),
+            help='Keep clicks newer than this many days in the database',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Clicks archived and deleted per batch',
+        )
+        parser.add_argument(
+            '--ignore-rollups',
+            action='store_true',
+            help='Archive clicks even if rollup_clicks has not processed them yet',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many clicks would be archived',
+        )
+
+    def handle(self, *args, **options):
+        archived, cutoff = archive_clicks(
+            retention_days=options['days'],
+            batch_size=options['batch_size'],
+            require_rollup=not options['ignore_rollups'],
+            dry_run=options['dry_run'],
+        )
+        if options['dry_run']:
+            self.stdout.write(f'{archived} clicks older than {cutoff:%Y-%m-%d %H:%M} would be archived')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Archived {archived} clicks older than {cutoff:%Y-%m-%d %H:%M} to {get_archive_dir()}'
+        ))
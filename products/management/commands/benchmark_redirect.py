@@ -0,0 +1,49 @@
+import statistics
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from products.models import Product
+from products.redirects import warm
+
+
+class Command(BaseCommand):
+    help = 'Measure /go/<product_id>/ latency with and without the redirect map'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per run')
+
+    def handle(self, *args, **options):
+        product_ids = list(Product.objects.values_list('id', flat=True)[:100])
+        if not product_ids:
+            raise CommandError('No products to benchmark; run seed_data first.')
+        warm(force=True)
+
+        # Benchmark requests must not write Click rows or click_count for
+        # live products, so click recording is stubbed out in both runs
+        for label, enabled in (('database', False), ('redirect map', True)):
+            with (
+                override_settings(REDIRECT_CACHE_ENABLED=enabled, ALLOWED_HOSTS=['*']),
+                mock.patch('products.views.record_click', return_value=True),
+            ):
+                timings = self._run(Client(), product_ids, options['requests'])
+            quantiles = statistics.quantiles(timings, n=100)
+            self.stdout.write(
+                f'{label:>14}: p50 {quantiles[49] * 1000:.3f} ms   '
+                f'p99 {quantiles[98] * 1000:.3f} ms'
+            )
+
+    def _run(self, client, product_ids, count):
+        urls = [reverse('products:affiliate_redirect', args=[pid]) for pid in product_ids]
+        for url in urls:
+            client.get(url)
+        timings = []
+        for i in range(count):
+            url = urls[i % len(urls)]
+            start = time.perf_counter()
+            client.get(url)
+            timings.append(time.perf_counter() - start)
+        return timings
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from products.related import compute_related_products
+
+
+class Command(BaseCommand):
+    help = 'Score product similarity and store each product\'s top related products'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count',
+            type=int,
+            default=None,
+            help='Neighbours stored per product (default: RELATED_PRODUCTS_COUNT)',
+        )
+        parser.add_argument(
+            '--click-days',
+            type=int,
+            default=None,
+            help='Days of clicks used for co-click sessions (default: RELATED_CLICK_DAYS)',
+        )
+
+    def handle(self, *args, **options):
+        stored = compute_related_products(k=options['count'], click_days=options['click_days'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Stored {stored} related product links'))
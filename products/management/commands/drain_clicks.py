@@ -0,0 +1,59 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.db import transaction
+
+from products.clicks import claim_spill_files, read_spill_file, write_clicks
+
+
+class Command(BaseCommand):
+    help = 'Replay click spill files left behind by crashed or failed flushes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=getattr(settings, 'CLICK_BATCH_SIZE', 500),
+            help='Number of clicks written per batch',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Count recoverable clicks without writing or removing anything',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        total_files = 0
+        total_clicks = 0
+
+        for path, fileobj in claim_spill_files():
+            # One transaction per file: a failure part way through rolls the
+            # whole file back, so a retry cannot count its clicks twice
+            with transaction.atomic():
+                written = self.drain(fileobj, batch_size, dry_run)
+            if not dry_run:
+                os.unlink(path)
+
+            total_files += 1
+            total_clicks += written
+            self.stdout.write(f'  {os.path.basename(path)}: {written} clicks')
+
+        verb = 'Found' if dry_run else 'Drained'
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {verb} {total_clicks} clicks from {total_files} spill files'
+        ))
+
+    def drain(self, fileobj, batch_size, dry_run):
+        written = 0
+        batch = []
+        for record in read_spill_file(fileobj):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                written += len(batch) if dry_run else write_clicks(batch, batch_size)
+                batch = []
+        if batch:
+            written += len(batch) if dry_run else write_clicks(batch, batch_size)
+        return written
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.core.exceptions import ImproperlyConfigured
+
+from core.geoip import GeoLocator
+from products.enrichment import enrich_clicks
+
+
+class Command(BaseCommand):
+    help = 'Backfill click country and city from the local GeoIP database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Clicks resolved and updated per transaction',
+        )
+        parser.add_argument(
+            '--database',
+            dest='geoip_database',
+            default=None,
+            help='Path to a GeoLite2/GeoIP2 City .mmdb file (default: GEOIP_PATH/GEOIP_CITY)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            locator = GeoLocator(options['geoip_database'])
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+
+        try:
+            processed, located, _ = enrich_clicks(
+                batch_size=options['batch_size'], locator=locator
+            )
+        finally:
+            locator.close()
+
+        info = locator.cache_info()
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Enriched {located} of {processed} clicks '
+            f'(cache hits: {info.hits}, misses: {info.misses})'
+        ))
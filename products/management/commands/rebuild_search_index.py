@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from products.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product full-text search index'
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Search index rebuilt with {type(backend).__name__}'
+        ))
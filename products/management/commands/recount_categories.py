@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from products.category_counts import recount_categories
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored product and featured counts of every category'
+
+    def handle(self, *args, **options):
+        updated = recount_categories()
+        self.stdout.write(self.style.SUCCESS(f'✓ Recounted {updated} categories'))
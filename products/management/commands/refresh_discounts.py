@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from products.deals import refresh_discounts
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored discount of every product (run after bulk price imports)'
+
+    def handle(self, *args, **options):
+        updated = refresh_discounts()
+        self.stdout.write(self.style.SUCCESS(f'✓ Refreshed {updated} product discounts'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from products.rollups import rollup_clicks
+
+
+class Command(BaseCommand):
+    help = 'Fold new clicks into hourly and daily ClickRollup rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=50000,
+            help='Clicks aggregated per transaction',
+        )
+        parser.add_argument(
+            '--max-chunks',
+            type=int,
+            default=None,
+            help='Stop after this many chunks (default: catch up fully)',
+        )
+
+    def handle(self, *args, **options):
+        processed, last_click_id = rollup_clicks(
+            chunk_size=options['chunk_size'],
+            max_chunks=options['max_chunks'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Rolled up {processed} clicks (high-water mark: click #{last_click_id})'
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from products.search import reset_search_cache_stats, search_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Show search result cache hit/miss counts (for tuning SEARCH_CACHE_TIMEOUT)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing')
+
+    def handle(self, *args, **options):
+        stats = search_cache_stats()
+        self.stdout.write(
+            f"Hits: {stats['hits']}  Misses: {stats['misses']}  "
+            f"Hit ratio: {stats['hit_ratio']:.1%}"
+        )
+        if options['reset']:
+            reset_search_cache_stats()
+            self.stdout.write(self.style.SUCCESS('✓ Counters reset'))
@@ -84,8 +84,8 @@ class Command(BaseCommand):
                 'original_price': Decimal('89.99'),
                 'rating': Decimal('4.8'),
                 'description': 'High-quality wireless earbuds with active noise cancellation, 30-hour battery life, and premium sound quality.',
-                'pros': 'Great sound quality, Long battery life, Comfortable fit, Affordable',
-                'cons': 'Plastic build, Limited color options',
+                'pros': ['Great sound quality', 'Long battery life', 'Comfortable fit', 'Affordable'],
+                'cons': ['Plastic build', 'Limited color options'],
                 'category': categories.get('Audio & Speakers'),
                 'is_featured': True,
             },
@@ -95,8 +95,8 @@ class Command(BaseCommand):
                 'original_price': Decimal('49.99'),
                 'rating': Decimal('4.6'),
                 'description': 'Lightning-fast data transfer speeds up to 120MB/s. Perfect for backing up files, transferring documents, or storing media.',
-                'pros': 'Fast transfer speeds, Large capacity, Durable, Compact',
-                'cons': 'May overheat during extended use, Some compatibility issues on older systems',
+                'pros': ['Fast transfer speeds', 'Large capacity', 'Durable', 'Compact'],
+                'cons': ['May overheat during extended use', 'Some compatibility issues on older systems'],
                 'category': categories.get('Laptops & Computers'),
                 'is_featured': True,
             },
@@ -106,8 +106,8 @@ class Command(BaseCommand):
                 'original_price': Decimal('149.99'),
                 'rating': Decimal('4.5'),
                 'description': 'Full-featured smartwatch with heart rate monitoring, sleep tracking, and fitness modes for all activities.',
-                'pros': 'Accurate tracking, Long battery, Beautiful display, Water resistant',
-                'cons': 'Limited app ecosystem, Occasional syncing issues',
+                'pros': ['Accurate tracking', 'Long battery', 'Beautiful display', 'Water resistant'],
+                'cons': ['Limited app ecosystem', 'Occasional syncing issues'],
                 'category': categories.get('Wearables'),
                 'is_featured': True,
             },
@@ -117,8 +117,8 @@ class Command(BaseCommand):
                 'original_price': Decimal('24.99'),
                 'rating': Decimal('4.3'),
                 'description': 'Universal portable phone stand for all smartphones. Adjustable angles, stable grip, perfect for streaming and video calls.',
-                'pros': 'Universal compatibility, Lightweight, Affordable, Adjustable',
-                'cons': 'Plastic material, Small base',
+                'pros': ['Universal compatibility', 'Lightweight', 'Affordable', 'Adjustable'],
+                'cons': ['Plastic material', 'Small base'],
                 'category': categories.get('Smartphones & Accessories'),
             },
             {
@@ -127,8 +127,8 @@ class Command(BaseCommand):
                 'original_price': Decimal('129.99'),
                 'rating': Decimal('4.7'),
                 'description': 'Professional mechanical gaming keyboard with customizable RGB lighting, programmable keys, and high-speed switches.',
-                'pros': 'Excellent build quality, Responsive switches, Great for gaming, Customizable',
-                'cons': 'Loud clicks, Bulky, Expensive',
+                'pros': ['Excellent build quality', 'Responsive switches', 'Great for gaming', 'Customizable'],
+                'cons': ['Loud clicks', 'Bulky', 'Expensive'],
                 'category': categories.get('Gaming'),
                 'is_featured': True,
             },
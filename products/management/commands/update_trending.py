@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from products.trending import update_trending
+
+
+class Command(BaseCommand):
+    help = 'Fold new clicks into the time-decayed trending score (run periodically)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Reset every score and recompute from recent clicks',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Days of clicks used by --rebuild (default: TRENDING_REBUILD_DAYS)',
+        )
+
+    def handle(self, *args, **options):
+        updated, last_click_id = update_trending(rebuild=options['rebuild'], days=options['days'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Updated {updated} trending scores (high-water mark: click #{last_click_id})'
+        ))
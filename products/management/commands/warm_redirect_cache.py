@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from products.redirects import get_cache_path, warm
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the shared affiliate redirect map from the database'
+
+    def handle(self, *args, **options):
+        warm(force=True)
+        self.stdout.write(self.style.SUCCESS(f'✓ Redirect map rebuilt at {get_cache_path()}'))
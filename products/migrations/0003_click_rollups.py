@@ -0,0 +1,45 @@
+# Generated by Django 4.2.9 on 2026-10-18 06:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_click_created_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_click_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ClickRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket', models.DateTimeField(help_text='Start of the hour or day (UTC)')),
+                ('clicks', models.PositiveIntegerField(default=0)),
+                ('unique_ips', models.PositiveIntegerField(default=0, help_text='HyperLogLog estimate')),
+                ('ip_sketch', models.BinaryField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='click_rollups', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Click Rollup',
+                'verbose_name_plural': 'Click Rollups',
+                'ordering': ['-bucket'],
+                'indexes': [models.Index(fields=['granularity', 'bucket'], name='products_cl_granula_5433eb_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='clickrollup',
+            constraint=models.UniqueConstraint(fields=('product', 'granularity', 'bucket'), name='unique_click_rollup_bucket'),
+        ),
+    ]
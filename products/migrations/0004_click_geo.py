@@ -0,0 +1,23 @@
+# Generated by Django 4.2.9 on 2026-10-18 06:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_click_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='click',
+            name='city',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='click',
+            name='country',
+            field=models.CharField(blank=True, max_length=2, null=True),
+        ),
+    ]
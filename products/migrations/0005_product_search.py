@@ -0,0 +1,61 @@
+# Generated by Django 4.2.9 on 2026-10-18 06:31
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Kept in sync with products.search.postgres / products.search.sqlite; the
+# SQL is inlined so the migration does not depend on application code.
+POSTGRES_FORWARD = [
+    """
+    UPDATE products_product AS p SET search_vector =
+        setweight(to_tsvector('english', coalesce(p.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(c.name, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(p.pros, '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(p.cons, '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(p.description, '')), 'D')
+    FROM products_category AS c
+    WHERE c.id = p.category_id
+    """,
+    'CREATE INDEX products_product_search_vector_gin ON products_product USING gin (search_vector)',
+]
+POSTGRES_BACKWARD = ['DROP INDEX IF EXISTS products_product_search_vector_gin']
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE products_product_fts USING fts5(
+        name, category, pros, cons, description, tokenize = 'porter unicode61'
+    )
+    """,
+    """
+    INSERT INTO products_product_fts (rowid, name, category, pros, cons, description)
+    SELECT p.id, p.name, c.name, coalesce(p.pros, ''), coalesce(p.cons, ''), p.description
+    FROM products_product AS p JOIN products_category AS c ON c.id = p.category_id
+    """,
+]
+SQLITE_BACKWARD = ['DROP TABLE IF EXISTS products_product_fts']
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_click_geo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(
+            _run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            _run({'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
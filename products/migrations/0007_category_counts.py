@@ -0,0 +1,43 @@
+# Generated by Django 4.2.9 on 2026-10-18 06:34
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+# Same recount as products.category_counts.recount_categories, inlined so
+# the migration does not depend on application code.
+def backfill_counts(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    Product = apps.get_model('products', 'Product')
+
+    def product_total(condition=Q()):
+        counts = Product.objects.filter(condition, category=OuterRef('pk')).order_by()
+        counts = counts.values('category').annotate(total=Count('pk')).values('total')
+        return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+    Category.objects.update(
+        product_count=product_total(),
+        featured_count=product_total(Q(is_featured=True)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='featured_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.9 on 2026-10-18 06:39
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, FloatField, Value, When
+from django.db.models.functions import Round
+
+BATCH_SIZE = 5000
+
+
+# Same computation as products.deals.refresh_discounts, inlined so the
+# migration does not depend on application code. The division runs in
+# floating point because SQLite stores whole-number prices as integers and
+# would otherwise truncate. The migration runs in one transaction: a failure
+# rolls back the new column with the partial backfill, so migrate can simply
+# be run again.
+def backfill_discounts(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    output_field = DecimalField(max_digits=5, decimal_places=2)
+    discount = Case(
+        When(
+            original_price__gt=F('price'),
+            then=Round(ExpressionWrapper(
+                (F('original_price') - F('price')) * Value(100.0) / F('original_price'),
+                output_field=FloatField(),
+            ), 2),
+        ),
+        default=Value(Decimal('0.00')),
+        output_field=output_field,
+    )
+    last_pk = 0
+    while True:
+        batch = list(
+            Product.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE]
+        )
+        if not batch:
+            return
+        Product.objects.filter(pk__gte=batch[0], pk__lte=batch[-1]).update(discount=discount)
+        last_pk = batch[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_related_products'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='discount',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=5),
+        ),
+        migrations.RunPython(backfill_discounts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['discount', 'id'], name='products_pr_discoun_72ef42_idx'),
+        ),
+    ]
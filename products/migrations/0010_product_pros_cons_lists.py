@@ -0,0 +1,83 @@
+# Generated by Django 4.2.9 on 2026-10-18 07:05
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def split_items(text):
+    return [item.strip() for item in text.split(',') if item.strip()] if text else []
+
+
+def convert_batches(apps, convert, source, target):
+    """Copy ``source`` fields into ``target`` fields a pk range at a time."""
+    Product = apps.get_model('products', 'Product')
+    last_pk = 0
+    while True:
+        products = list(
+            Product.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', *source)[:BATCH_SIZE]
+        )
+        if not products:
+            return
+        for product in products:
+            for source_field, target_field in zip(source, target):
+                setattr(product, target_field, convert(getattr(product, source_field)))
+        Product.objects.bulk_update(products, target)
+        last_pk = products[-1].pk
+
+
+def text_to_lists(apps, schema_editor):
+    convert_batches(apps, split_items, ['pros', 'cons'], ['pros_items', 'cons_items'])
+
+
+def lists_to_text(apps, schema_editor):
+    convert_batches(apps, lambda items: ', '.join(items or []), ['pros_items', 'cons_items'], ['pros', 'cons'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_discount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='pros_items',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='cons_items',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(text_to_lists, lists_to_text),
+        migrations.RemoveField(
+            model_name='product',
+            name='pros',
+        ),
+        migrations.RemoveField(
+            model_name='product',
+            name='cons',
+        ),
+        migrations.RenameField(
+            model_name='product',
+            old_name='pros_items',
+            new_name='pros',
+        ),
+        migrations.RenameField(
+            model_name='product',
+            old_name='cons_items',
+            new_name='cons',
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='pros',
+            field=models.JSONField(blank=True, default=list, help_text='Comma separated pros'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='cons',
+            field=models.JSONField(blank=True, default=list, help_text='Comma separated cons'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.9 on 2026-10-18 07:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_product_trending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rollupcursor',
+            name='horizon_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='rollupcursor',
+            name='horizon_click_id',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
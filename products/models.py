@@ -1,7 +1,12 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.utils import timezone
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+from .deals import compute_discount
+
 
 class Category(models.Model):
     """Category model for organizing products."""
@@ -9,6 +14,9 @@ class Category(models.Model):
     slug = models.SlugField(unique=True)
     description = models.TextField(blank=True, null=True)
     icon = models.CharField(max_length=100, blank=True, null=True, help_text="Font awesome icon class")
+    # Maintained by products.signals; repaired by the recount_categories command
+    product_count = models.PositiveIntegerField(default=0, editable=False)
+    featured_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -39,6 +47,8 @@ class Product(models.Model):
         null=True, 
         help_text="Original price before discount"
     )
+    # Percentage off original_price, kept in step by save() (see products.deals)
+    discount = models.DecimalField(max_digits=5, decimal_places=2, default=0, editable=False)
     rating = models.DecimalField(
         max_digits=3, 
         decimal_places=1, 
@@ -47,12 +57,17 @@ class Product(models.Model):
     )
     image = models.ImageField(upload_to='products/%Y/%m/')
     affiliate_url = models.URLField(max_length=500)
-    pros = models.TextField(blank=True, null=True, help_text="Comma separated pros")
-    cons = models.TextField(blank=True, null=True, help_text="Comma separated cons")
+    # Lists of strings; ProductForm edits them as comma separated text
+    pros = models.JSONField(default=list, blank=True, help_text="Comma separated pros")
+    cons = models.JSONField(default=list, blank=True, help_text="Comma separated cons")
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     is_featured = models.BooleanField(default=False, db_index=True)
     click_count = models.PositiveIntegerField(default=0, db_index=True)
     views_count = models.PositiveIntegerField(default=0)
+    # Log-scale decayed click rate, maintained by products.trending
+    trending_score = models.FloatField(null=True, blank=True, editable=False)
+    # Weighted full-text vector, maintained by products.search on PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -64,6 +79,13 @@ class Product(models.Model):
             models.Index(fields=['-created_at']),
             models.Index(fields=['is_featured', '-created_at']),
             models.Index(fields=['category', '-created_at']),
+            models.Index(fields=['category', 'updated_at']),
+            models.Index(fields=['category', 'price', 'id']),
+            models.Index(fields=['category', 'rating', 'id']),
+            models.Index(fields=['discount', 'id']),
+            models.Index(fields=['trending_score', 'id']),
+            models.Index(fields=['rating', 'id']),
+            models.Index(fields=['updated_at']),
         ]
 
     def __str__(self):
@@ -72,25 +94,16 @@ class Product(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        self.discount = compute_discount(self.price, self.original_price)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'price', 'original_price'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'discount'}
         super().save(*args, **kwargs)
 
     @property
     def discount_percentage(self):
         """Calculate discount percentage if original price is set."""
-        if self.original_price and self.price < self.original_price:
-            discount = ((self.original_price - self.price) / self.original_price) * 100
-            return round(discount, 0)
-        return 0
-
-    @property
-    def pros_list(self):
-        """Return pros as a list."""
-        return [pro.strip() for pro in self.pros.split(',') if pro.strip()] if self.pros else []
-
-    @property
-    def cons_list(self):
-        """Return cons as a list."""
-        return [con.strip() for con in self.cons.split(',') if con.strip()] if self.cons else []
+        return round(compute_discount(self.price, self.original_price), 0)
 
 
 class Click(models.Model):
@@ -99,7 +112,11 @@ class Click(models.Model):
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True, null=True)
     referrer = models.URLField(blank=True, null=True)
-    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Filled in out of band by the enrich_clicks command
+    country = models.CharField(max_length=2, blank=True, null=True)
+    city = models.CharField(max_length=100, blank=True, null=True)
+    # Not auto_now_add: buffered clicks keep the time they were recorded.
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
 
     class Meta:
         verbose_name = "Click"
@@ -112,3 +129,96 @@ class Click(models.Model):
 
     def __str__(self):
         return f"{self.product.name} - {self.created_at}"
+
+
+class ClickRollup(models.Model):
+    """Pre-aggregated click counts per product and hour or day."""
+    HOUR = 'hour'
+    DAY = 'day'
+    GRANULARITY_CHOICES = [
+        (HOUR, 'Hour'),
+        (DAY, 'Day'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='click_rollups')
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField(help_text="Start of the hour or day (UTC)")
+    clicks = models.PositiveIntegerField(default=0)
+    unique_ips = models.PositiveIntegerField(default=0, help_text="HyperLogLog estimate")
+    ip_sketch = models.BinaryField(editable=False)
+
+    class Meta:
+        verbose_name = "Click Rollup"
+        verbose_name_plural = "Click Rollups"
+        ordering = ['-bucket']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product', 'granularity', 'bucket'],
+                name='unique_click_rollup_bucket',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['granularity', 'bucket']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} - {self.granularity} {self.bucket:%Y-%m-%d %H:%M}"
+
+
+class RelatedProduct(models.Model):
+    """Top-K precomputed neighbours of a product (see products.related)."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_links')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        verbose_name = "Related Product"
+        verbose_name_plural = "Related Products"
+        ordering = ['product', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='unique_related_product_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} (#{self.rank})"
+
+
+class RollupCursor(models.Model):
+    """High-water mark (last processed Click id) for incremental click jobs."""
+    name = models.CharField(max_length=50, unique=True)
+    last_click_id = models.BigIntegerField(default=0)
+    # Highest Click id seen at horizon_at; see committed_click_id()
+    horizon_click_id = models.BigIntegerField(default=0)
+    horizon_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def committed_click_id(self, margin=None):
+        """
+        Highest Click id that is safe to process.
+
+        Ids are allocated when a row is inserted, not when its transaction
+        commits, so a slow flusher can commit id N after a job has already
+        moved its mark past N + 1. Every id that existed ``margin`` seconds
+        (``CLICK_COMMIT_MARGIN``) ago belongs to a finished transaction, so
+        the limit is the highest id observed at least that long ago. A new
+        observation is recorded whenever the previous one is used up, so
+        clicks are picked up one run (and at least ``margin``) late.
+        """
+        if margin is None:
+            margin = getattr(settings, 'CLICK_COMMIT_MARGIN', 60)
+        if margin <= 0:
+            return Click.objects.aggregate(last=models.Max('id'))['last'] or 0
+        now = timezone.now()
+        limit = self.last_click_id
+        stale = self.horizon_at is None or (now - self.horizon_at).total_seconds() >= margin
+        if stale:
+            if self.horizon_at is not None:
+                limit = max(limit, self.horizon_click_id)
+            self.horizon_click_id = Click.objects.aggregate(last=models.Max('id'))['last'] or 0
+            self.horizon_at = now
+            self.save(update_fields=['horizon_click_id', 'horizon_at', 'updated_at'])
+        return limit
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_click_id}"
@@ -0,0 +1,342 @@
+"""
+Shared redirect-target cache for ``/go/<product_id>/``.
+
+Maps product id -> affiliate_url in a memory-mapped file that every worker
+on the host maps read-only, so a redirect is served without touching the
+database. The file is kept current by ``post_save``/``post_delete``
+handlers on Product (see ``products.signals``); ``warm_redirect_cache``
+rebuilds it from scratch.
+
+File layout::
+
+    header (64 bytes) | slots (capacity x uint64) | string heap
+
+A slot holds ``(heap_offset << 24) | length`` for the product with that id,
+0 when unknown and ``TOMBSTONE`` when the product was deleted. The heap is
+append-only, so readers never need a lock: a slot is re-read after copying
+the URL and the lookup retried if it changed underneath. Saves that leave
+the URL unchanged write nothing, and ids the database does not have are
+tombstoned, so repeated 404s are answered from the map too.
+
+When the slot table or heap runs out of room, or the file is missing, the
+product's slot is cleared and a background thread in that worker rebuilds
+a larger file from the database, renames it over the old one and flags
+the old one as superseded so readers remap. Requests in the meantime fall
+back to a single-column query; nothing is rebuilt on the request path.
+``warm_redirect_cache`` forces the same rebuild by hand.
+"""
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'TDRM'
+VERSION = 1
+HEADER = struct.Struct('<4sIIIQQQ')  # magic, version, superseded, pad, capacity, heap_size, heap_used
+HEADER_SIZE = 64
+SUPERSEDED_OFFSET = 8
+HEAP_USED_OFFSET = 32
+SLOT = struct.Struct('<Q')
+LENGTH_BITS = 24
+LENGTH_MASK = (1 << LENGTH_BITS) - 1
+TOMBSTONE = (1 << 64) - 1
+
+MISS = object()
+
+
+def get_cache_path():
+    return str(getattr(settings, 'REDIRECT_CACHE_PATH', settings.BASE_DIR / 'var' / 'redirects.map'))
+
+
+class RedirectTargetMap:
+    """Read side of the redirect map; one instance per process."""
+
+    def __init__(self, path):
+        self.path = path
+        self._mm = None
+        self._capacity = 0
+        self._heap_start = 0
+        self._lock = threading.Lock()
+        self.generation = None
+
+    def _open(self):
+        with open(self.path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            generation = os.fstat(f.fileno()).st_ino
+        magic, version, _, _, capacity, _, _ = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION:
+            mm.close()
+            raise ValueError(f'{self.path} is not a redirect map')
+        self._capacity = capacity
+        self._heap_start = HEADER_SIZE + capacity * SLOT.size
+        self._mm = mm
+        self.generation = generation
+
+    def _map(self):
+        mm = self._mm
+        if mm is None or mm[SUPERSEDED_OFFSET]:
+            with self._lock:
+                if self._mm is None or self._mm[SUPERSEDED_OFFSET]:
+                    self._open()
+                mm = self._mm
+        return mm
+
+    def covers(self, product_id):
+        """Whether ``product_id`` has a slot in the current file."""
+        self._map()
+        return 0 <= product_id < self._capacity
+
+    def get(self, product_id):
+        """
+        Return the affiliate URL, ``None`` for a deleted product, or ``MISS``.
+        """
+        mm = self._map()
+        if not 0 <= product_id < self._capacity:
+            return MISS
+        slot_offset = HEADER_SIZE + product_id * SLOT.size
+        while True:
+            (value,) = SLOT.unpack_from(mm, slot_offset)
+            if value == 0:
+                return MISS
+            if value == TOMBSTONE:
+                return None
+            start = self._heap_start + (value >> LENGTH_BITS)
+            data = mm[start:start + (value & LENGTH_MASK)]
+            if SLOT.unpack_from(mm, slot_offset)[0] == value:
+                return data.decode('utf-8')
+
+
+class _Writer:
+    """Exclusive write access to the map, serialized with a lock file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock_file = None
+        self._file = None
+        self.mm = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._lock_file = open(self.path + '.lock', 'a')
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            self._file = open(self.path, 'r+b')
+        except FileNotFoundError:
+            return self
+        self.mm = mmap.mmap(self._file.fileno(), 0)
+        return self
+
+    @property
+    def generation(self):
+        """Inode of the current file (None if missing); a rebuild changes it."""
+        return None if self._file is None else os.fstat(self._file.fileno()).st_ino
+
+    def __exit__(self, *exc_info):
+        if self.mm is not None:
+            self.mm.close()
+        if self._file is not None:
+            self._file.close()
+        self._lock_file.close()
+
+    def rebuild(self, entries, tombstones=()):
+        """Write a fresh, right-sized map and swap it in atomically."""
+        entries = {pid: url.encode('utf-8') for pid, url in entries}
+        max_id = max([0, *entries, *tombstones])
+        capacity = int(max_id * 1.25) + 1024
+        heap_used = sum(len(url) for url in entries.values())
+        heap_size = heap_used * 2 + 64 * 1024
+
+        slots = bytearray(capacity * SLOT.size)
+        heap = bytearray(heap_size)
+        offset = 0
+        for pid, url in entries.items():
+            heap[offset:offset + len(url)] = url
+            SLOT.pack_into(slots, pid * SLOT.size, (offset << LENGTH_BITS) | len(url))
+            offset += len(url)
+        for pid in tombstones:
+            SLOT.pack_into(slots, pid * SLOT.size, TOMBSTONE)
+
+        header = bytearray(HEADER_SIZE)
+        HEADER.pack_into(header, 0, MAGIC, VERSION, 0, 0, capacity, heap_size, heap_used)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            f.write(slots)
+            f.write(heap)
+        os.replace(tmp_path, self.path)
+        if self.mm is not None:
+            self.mm[SUPERSEDED_OFFSET] = 1
+
+    def set(self, product_id, url):
+        """
+        Point ``product_id`` at ``url`` in place. Without room for it the
+        slot is cleared instead, leaving the growth to a rebuild; returns
+        whether the URL was stored.
+        """
+        if self.mm is None:
+            return False
+        data = url.encode('utf-8')
+        _, _, _, _, capacity, heap_size, heap_used = HEADER.unpack_from(self.mm, 0)
+        if product_id >= capacity:
+            return False
+        slot_offset = HEADER_SIZE + product_id * SLOT.size
+        if heap_used + len(data) > heap_size:
+            SLOT.pack_into(self.mm, slot_offset, 0)
+            return False
+        heap_start = HEADER_SIZE + capacity * SLOT.size
+        self.mm[heap_start + heap_used:heap_start + heap_used + len(data)] = data
+        struct.pack_into('<Q', self.mm, HEAP_USED_OFFSET, heap_used + len(data))
+        SLOT.pack_into(self.mm, slot_offset, (heap_used << LENGTH_BITS) | len(data))
+        return True
+
+    def has(self, product_id):
+        """Whether ``product_id`` has a URL or tombstone in the map."""
+        if self.mm is None:
+            return False
+        capacity = HEADER.unpack_from(self.mm, 0)[4]
+        return product_id < capacity and SLOT.unpack_from(self.mm, HEADER_SIZE + product_id * SLOT.size)[0] != 0
+
+    def delete(self, product_id):
+        if self.mm is None:
+            return
+        capacity = HEADER.unpack_from(self.mm, 0)[4]
+        if product_id < capacity:
+            SLOT.pack_into(self.mm, HEADER_SIZE + product_id * SLOT.size, TOMBSTONE)
+
+
+def _entries():
+    from .models import Product
+
+    return Product.objects.values_list('id', 'affiliate_url').iterator()
+
+
+def warm(path=None, force=False):
+    """Build the map from the database unless a current file already exists."""
+    path = path or get_cache_path()
+    with _Writer(path) as writer:
+        if writer.mm is not None and not force:
+            return
+        writer.rebuild(_entries())
+
+
+def grow(path, generation, product_id=None):
+    """
+    Rebuild the map unless it was replaced since ``generation`` was seen or
+    the missing ``product_id`` has been stored in the meantime.
+    """
+    with _Writer(path) as writer:
+        if writer.generation != generation:
+            return
+        if product_id is not None and writer.has(product_id):
+            return
+        writer.rebuild(_entries())
+
+
+_rebuilds = {}
+_rebuilds_lock = threading.Lock()
+
+
+def _grow_and_close(path, generation, product_id):
+    try:
+        grow(path, generation, product_id)
+    except Exception:
+        logger.exception('Could not rebuild the redirect map at %s', path)
+    finally:
+        connection.close()
+
+
+def grow_in_background(path=None, generation=None, product_id=None):
+    """Run ``grow`` on a daemon thread unless one is already running here."""
+    path = path or get_cache_path()
+    with _rebuilds_lock:
+        thread = _rebuilds.get(path)
+        if thread is not None and thread.is_alive():
+            return
+        thread = threading.Thread(
+            target=_grow_and_close, args=(path, generation, product_id), name='redirect-map-rebuild', daemon=True
+        )
+        _rebuilds[path] = thread
+        thread.start()
+
+
+def set_target(product_id, url, path=None):
+    """Point ``product_id`` at ``url``; returns whether the map now has it."""
+    path = path or get_cache_path()
+    reader = get_reader() if path == get_cache_path() else RedirectTargetMap(path)
+    try:
+        if reader.get(product_id) == url:
+            return True
+    except FileNotFoundError:
+        pass
+    with _Writer(path) as writer:
+        if writer.set(product_id, url):
+            return True
+        generation = writer.generation
+    grow_in_background(path, generation, product_id)
+    return False
+
+
+def delete_target(product_id, path=None):
+    with _Writer(path or get_cache_path()) as writer:
+        writer.delete(product_id)
+
+
+def tombstone_missing(product_id, path=None):
+    """
+    Tombstone ``product_id`` if the database does not have it. The check
+    runs under the write lock, so a product created meanwhile keeps the URL
+    its own ``set_target`` writes afterwards.
+    """
+    from .models import Product
+
+    with _Writer(path or get_cache_path()) as writer:
+        if not Product.objects.filter(pk=product_id).exists():
+            writer.delete(product_id)
+
+
+_reader = None
+
+
+def get_reader():
+    global _reader
+    if _reader is None:
+        _reader = RedirectTargetMap(get_cache_path())
+    return _reader
+
+
+def get_redirect_target(product_id):
+    """
+    Return the affiliate URL for ``product_id`` or ``None`` if it does not
+    exist. Falls back to a single-column query on a cache miss.
+    """
+    from .models import Product
+
+    enabled = getattr(settings, 'REDIRECT_CACHE_ENABLED', True)
+    reader = get_reader()
+    generation = MISS
+    if enabled:
+        try:
+            url = reader.get(product_id)
+        except FileNotFoundError:
+            grow_in_background()
+        else:
+            if url is not MISS:
+                return url
+            generation = reader.generation
+
+    url = Product.objects.filter(pk=product_id).values_list('affiliate_url', flat=True).first()
+    if generation is MISS:
+        return url
+    if url is not None:
+        # Stored products only miss when the map had no room for them
+        grow_in_background(generation=generation, product_id=product_id)
+    elif reader.covers(product_id):
+        tombstone_missing(product_id)
+    return url
@@ -0,0 +1,279 @@
+"""
+Precomputed related products.
+
+``compute_related_products`` scores every pair of products and stores the
+best ``RELATED_PRODUCTS_COUNT`` neighbours of each in ``RelatedProduct``,
+so ``product_detail`` reads them with one indexed query. A pair's score is
+a weighted sum of:
+
+* co-clicks - both products clicked from the same IP within
+  ``RELATED_SESSION_WINDOW`` seconds of each other, over the last
+  ``RELATED_CLICK_DAYS`` days, normalised by both products' click totals;
+* same category;
+* price proximity, on a log scale so $10 vs $20 counts like $100 vs $200;
+* overlap of pros/cons terms, as the cosine of hashed TF-IDF vectors.
+
+Scores are computed a block of rows at a time with NumPy, which is only
+needed by the batch job (imported lazily). Blocks hold at most
+``SCORE_BLOCK_CELLS`` scores. Text vectors are kept sparse (each product's
+few hashed columns and weights) and densified ``TEXT_CHUNK_ROWS`` rows at
+a time, so apart from one score block and one chunk, memory grows with
+the number of products and their terms, not with products x
+``TEXT_DIMENSIONS``. Products with nothing stored yet (before the first run, or
+created since the last one) fall back to other products in their
+category.
+"""
+import math
+import re
+import zlib
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from core.page_cache import list_tag, purge_tags
+
+CO_CLICK_WEIGHT = 0.5
+TEXT_WEIGHT = 0.2
+CATEGORY_WEIGHT = 0.2
+PRICE_WEIGHT = 0.1
+
+TEXT_DIMENSIONS = 512
+TEXT_CHUNK_ROWS = 8192
+ROW_BLOCK_SIZE = 256
+# float32 scores plus int64 partition indices: about 12 bytes per cell
+SCORE_BLOCK_CELLS = 1 << 21
+MAX_SESSION_PRODUCTS = 50
+TERM_RE = re.compile(r'[a-z0-9]{3,}')
+VERSION_KEY = 'related:version'
+
+
+def get_related_version():
+    """Bumped after every run; part of product_detail's ETag."""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def related_products_changed():
+    """Invalidate validators and cached pages that show related products."""
+    from .models import RelatedProduct
+
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 1, timeout=None)
+    purge_tags(list_tag(RelatedProduct))
+
+
+def product_terms(pros, cons):
+    """Lowercase terms from lists of pros and cons."""
+    return TERM_RE.findall(' '.join(pros + cons).lower())
+
+
+def load_products():
+    """Product ids, categories, prices and pros/cons terms, in id order."""
+    from .models import Product
+
+    products = []
+    rows = Product.objects.order_by('pk').values_list('pk', 'category_id', 'price', 'pros', 'cons')
+    for pk, category_id, price, pros, cons in rows.iterator(chunk_size=5000):
+        products.append({
+            'id': pk,
+            'category_id': category_id,
+            'price': float(price),
+            'terms': product_terms(pros, cons),
+        })
+    return products
+
+
+def co_click_weights(index_by_id, since, window):
+    """
+    ``{row: {row: weight}}`` from click sessions.
+
+    A session is a run of clicks from one IP with gaps of at most ``window``
+    seconds. Each pair of products in a session counts once; the total for a
+    pair is divided by the geometric mean of the two products' click counts.
+    """
+    from .models import Click
+
+    pair_counts = defaultdict(Counter)
+    clicked = Counter()
+
+    def close_session(session):
+        rows = sorted(session)[:MAX_SESSION_PRODUCTS]
+        for row in rows:
+            clicked[row] += 1
+        for i, a in enumerate(rows):
+            for b in rows[i + 1:]:
+                pair_counts[a][b] += 1
+                pair_counts[b][a] += 1
+
+    clicks = (
+        Click.objects.filter(created_at__gte=since, ip_address__isnull=False)
+        .order_by('ip_address', 'created_at')
+        .values_list('ip_address', 'product_id', 'created_at')
+    )
+    session, last_ip, last_time = set(), None, None
+    for ip_address, product_id, created_at in clicks.iterator(chunk_size=10000):
+        row = index_by_id.get(product_id)
+        if row is None:
+            continue
+        if ip_address != last_ip or (created_at - last_time).total_seconds() > window:
+            close_session(session)
+            session = set()
+        session.add(row)
+        last_ip, last_time = ip_address, created_at
+    close_session(session)
+
+    return {
+        a: {b: count / math.sqrt(clicked[a] * clicked[b]) for b, count in neighbours.items()}
+        for a, neighbours in pair_counts.items()
+    }
+
+
+def text_vectors(np, products):
+    """
+    L2-normalised hashed TF-IDF vectors of pros/cons terms, as the CSR
+    arrays ``(indptr, columns, weights)``.
+    """
+    indptr = np.zeros(len(products) + 1, dtype=np.int64)
+    columns = []
+    for row, product in enumerate(products):
+        hashed = {zlib.crc32(term.encode('utf-8')) % TEXT_DIMENSIONS for term in product['terms']}
+        columns.extend(sorted(hashed))
+        indptr[row + 1] = len(columns)
+    columns = np.array(columns, dtype=np.int32)
+    document_frequency = np.bincount(columns, minlength=TEXT_DIMENSIONS)
+    idf = np.log((len(products) + 1) / (document_frequency + 1)).astype(np.float32)
+    weights = idf[columns]
+    rows = np.repeat(np.arange(len(products)), np.diff(indptr))
+    norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=len(products)))
+    norms[norms == 0] = 1.0
+    weights /= norms[rows].astype(np.float32)
+    return indptr, columns, weights
+
+
+def dense_rows(np, text, start, stop):
+    """Rows ``start:stop`` of the sparse ``text`` vectors as a dense float32 matrix."""
+    indptr, columns, weights = text
+    dense = np.zeros((stop - start, TEXT_DIMENSIONS), dtype=np.float32)
+    first, last = indptr[start], indptr[stop]
+    rows = np.repeat(np.arange(stop - start), np.diff(indptr[start:stop + 1]))
+    dense[rows, columns[first:last]] = weights[first:last]
+    return dense
+
+
+def score_block(np, start, stop, text, categories, log_prices, co_clicks):
+    """Scores (float32) of rows ``start:stop`` against every product."""
+    count = len(categories)
+    block = dense_rows(np, text, start, stop)
+    scores = np.empty((stop - start, count), dtype=np.float32)
+    for chunk in range(0, count, TEXT_CHUNK_ROWS):
+        chunk_stop = min(chunk + TEXT_CHUNK_ROWS, count)
+        np.matmul(block, dense_rows(np, text, chunk, chunk_stop).T, out=scores[:, chunk:chunk_stop])
+    # In place where possible, so a block costs about two float32 matrices
+    scores *= TEXT_WEIGHT
+    np.add(scores, CATEGORY_WEIGHT, out=scores, where=categories[start:stop, None] == categories[None, :])
+    proximity = log_prices[start:stop, None] - log_prices[None, :]
+    np.abs(proximity, out=proximity)
+    proximity += 1.0
+    np.divide(PRICE_WEIGHT, proximity, out=proximity)
+    scores += proximity
+    del proximity
+    for row in range(start, stop):
+        for other, weight in co_clicks.get(row, {}).items():
+            scores[row - start, other] += CO_CLICK_WEIGHT * weight
+    scores[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+    return scores
+
+
+def top_k(np, scores, k):
+    """Column indices and scores of each row's ``k`` best entries, best first."""
+    k = min(k, scores.shape[1] - 1)
+    candidates = np.argpartition(scores, scores.shape[1] - k, axis=1)[:, -k:]
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1)
+    return (
+        np.take_along_axis(candidates, order, axis=1),
+        np.take_along_axis(candidate_scores, order, axis=1),
+    )
+
+
+def compute_related_products(k=None, click_days=None, session_window=None):
+    """Recompute and store every product's top-``k`` neighbours; return the row count."""
+    import numpy as np
+
+    from .models import RelatedProduct
+
+    k = k or getattr(settings, 'RELATED_PRODUCTS_COUNT', 8)
+    click_days = click_days or getattr(settings, 'RELATED_CLICK_DAYS', 30)
+    session_window = session_window or getattr(settings, 'RELATED_SESSION_WINDOW', 1800)
+
+    products = load_products()
+    if len(products) < 2:
+        RelatedProduct.objects.all().delete()
+        related_products_changed()
+        return 0
+    ids = np.array([product['id'] for product in products], dtype=np.int64)
+    categories = np.array([product['category_id'] for product in products], dtype=np.int64)
+    log_prices = np.log1p(np.array([max(product['price'], 0.0) for product in products], dtype=np.float32))
+    text = text_vectors(np, products)
+    co_clicks = co_click_weights(
+        {product['id']: row for row, product in enumerate(products)},
+        timezone.now() - timedelta(days=click_days),
+        session_window,
+    )
+
+    stored = 0
+    block_size = max(1, min(ROW_BLOCK_SIZE, SCORE_BLOCK_CELLS // len(products)))
+    for start in range(0, len(products), block_size):
+        stop = min(start + block_size, len(products))
+        scores = score_block(np, start, stop, text, categories, log_prices, co_clicks)
+        neighbours, neighbour_scores = top_k(np, scores, k)
+        links = [
+            RelatedProduct(
+                product_id=int(ids[row]),
+                related_id=int(ids[other]),
+                rank=rank,
+                score=float(score),
+            )
+            for row in range(start, stop)
+            for rank, (other, score) in enumerate(
+                zip(neighbours[row - start], neighbour_scores[row - start])
+            )
+        ]
+        with transaction.atomic():
+            RelatedProduct.objects.filter(product_id__in=ids[start:stop].tolist()).delete()
+            RelatedProduct.objects.bulk_create(links)
+        stored += len(links)
+
+    related_products_changed()
+    return stored
+
+
+def get_related_products(product, limit=4):
+    """
+    Stored neighbours of ``product``, best first, with their categories;
+    other products in its category until neighbours have been computed.
+    """
+    from .models import Product, RelatedProduct
+
+    links = (
+        RelatedProduct.objects.filter(product=product)
+        .select_related('related__category')
+        .order_by('rank')[:limit]
+    )
+    related = [link.related for link in links]
+    if related:
+        return related
+    return list(
+        Product.objects.filter(category_id=product.category_id)
+        .exclude(pk=product.pk)
+        .select_related('category')[:limit]
+    )
@@ -0,0 +1,194 @@
+"""
+Incremental click rollups.
+
+``rollup_clicks()`` folds every Click newer than the stored high-water mark
+into hourly and daily ``ClickRollup`` rows. Unique visitors are estimated
+with a small HyperLogLog sketch stored on each row, so buckets can keep
+absorbing new clicks across runs without rescanning old ones. Progress is
+tracked by Click id rather than ``created_at`` because buffered clicks can
+arrive with timestamps older than rows already processed; ids are only
+processed once every lower id has committed (see
+``RollupCursor.committed_click_id``).
+
+The read API (``clicks_per_day`` and friends) only touches rollup rows.
+"""
+import hashlib
+import math
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import Click, ClickRollup, RollupCursor
+
+CURSOR_NAME = 'click_rollup'
+SKETCH_PRECISION = 8
+SKETCH_REGISTERS = 1 << SKETCH_PRECISION
+_HASH_BITS = 64 - SKETCH_PRECISION
+
+
+def empty_sketch():
+    return bytes(SKETCH_REGISTERS)
+
+
+def sketch_add(registers, value):
+    """Add ``value`` to a mutable HyperLogLog register array."""
+    digest = int.from_bytes(
+        hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big'
+    )
+    index = digest >> _HASH_BITS
+    rank = _HASH_BITS - (digest & ((1 << _HASH_BITS) - 1)).bit_length() + 1
+    if rank > registers[index]:
+        registers[index] = rank
+
+
+def sketch_merge(a, b):
+    return bytes(map(max, a, b))
+
+
+def sketch_estimate(registers):
+    """Cardinality estimate with the standard small-range correction."""
+    m = SKETCH_REGISTERS
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / sum(2.0 ** -r for r in registers)
+    zeros = registers.count(0)
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * math.log(m / zeros)
+    return int(round(estimate))
+
+
+def _bucket_start(created_at, granularity):
+    created_at = created_at.astimezone(dt_timezone.utc)
+    if granularity == ClickRollup.HOUR:
+        return created_at.replace(minute=0, second=0, microsecond=0)
+    return created_at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _apply(groups):
+    """Merge ``{(product_id, granularity, bucket): [clicks, sketch]}`` into rollups."""
+    existing = {}
+    for granularity in (ClickRollup.HOUR, ClickRollup.DAY):
+        keys = [key for key in groups if key[1] == granularity]
+        if not keys:
+            continue
+        rows = ClickRollup.objects.filter(
+            granularity=granularity,
+            product_id__in={key[0] for key in keys},
+            bucket__in={key[2] for key in keys},
+        )
+        for row in rows:
+            existing[(row.product_id, row.granularity, row.bucket)] = row
+
+    to_create, to_update = [], []
+    for key, (clicks, registers) in groups.items():
+        row = existing.get(key)
+        if row is None:
+            product_id, granularity, bucket = key
+            row = ClickRollup(
+                product_id=product_id, granularity=granularity, bucket=bucket,
+                clicks=0, ip_sketch=empty_sketch(),
+            )
+            to_create.append(row)
+        else:
+            to_update.append(row)
+        row.clicks += clicks
+        row.ip_sketch = sketch_merge(bytes(row.ip_sketch), registers)
+        row.unique_ips = sketch_estimate(row.ip_sketch)
+
+    ClickRollup.objects.bulk_create(to_create, batch_size=1000)
+    ClickRollup.objects.bulk_update(
+        to_update, ['clicks', 'unique_ips', 'ip_sketch'], batch_size=1000
+    )
+    return len(to_create) + len(to_update)
+
+
+def rollup_clicks(chunk_size=50000, max_chunks=None):
+    """
+    Fold clicks newer than the high-water mark into rollups.
+
+    Each chunk is applied in its own transaction together with the cursor
+    move, so an interrupted run never double counts. Returns
+    ``(clicks_processed, last_click_id)``.
+    """
+    processed = 0
+    chunks = 0
+    cursor, _ = RollupCursor.objects.get_or_create(name=CURSOR_NAME)
+    limit = cursor.committed_click_id()
+    while max_chunks is None or chunks < max_chunks:
+        with transaction.atomic():
+            cursor = RollupCursor.objects.select_for_update().get(name=CURSOR_NAME)
+            rows = list(
+                Click.objects.filter(id__gt=cursor.last_click_id, id__lte=limit)
+                .order_by('id')
+                .values_list('id', 'product_id', 'created_at', 'ip_address')[:chunk_size]
+            )
+            if not rows:
+                break
+
+            groups = defaultdict(lambda: [0, bytearray(SKETCH_REGISTERS)])
+            for _, product_id, created_at, ip_address in rows:
+                for granularity in (ClickRollup.HOUR, ClickRollup.DAY):
+                    group = groups[(product_id, granularity, _bucket_start(created_at, granularity))]
+                    group[0] += 1
+                    if ip_address:
+                        sketch_add(group[1], ip_address)
+            _apply({key: (clicks, bytes(sketch)) for key, (clicks, sketch) in groups.items()})
+
+            cursor.last_click_id = rows[-1][0]
+            cursor.save(update_fields=['last_click_id', 'updated_at'])
+        processed += len(rows)
+        chunks += 1
+    last_click_id = RollupCursor.objects.get(name=CURSOR_NAME).last_click_id
+    return processed, last_click_id
+
+
+def _day_range(start, end):
+    """Inclusive ``date`` range -> half-open UTC datetime range."""
+    return (
+        datetime.combine(start, time.min, tzinfo=dt_timezone.utc),
+        datetime.combine(end + timedelta(days=1), time.min, tzinfo=dt_timezone.utc),
+    )
+
+
+def daily_rollups(start, end, products=None):
+    """Daily ClickRollup rows for dates ``start``..``end`` inclusive."""
+    lower, upper = _day_range(start, end)
+    rollups = ClickRollup.objects.filter(
+        granularity=ClickRollup.DAY, bucket__gte=lower, bucket__lt=upper
+    )
+    if products is not None:
+        rollups = rollups.filter(product__in=products)
+    return rollups
+
+
+def clicks_per_day(start, end, products=None):
+    """
+    Return ``{product_id: {date: (clicks, unique_ips)}}`` for the date range.
+    """
+    result = defaultdict(dict)
+    rows = daily_rollups(start, end, products).values_list(
+        'product_id', 'bucket', 'clicks', 'unique_ips'
+    )
+    for product_id, bucket, clicks, unique_ips in rows:
+        result[product_id][bucket.date()] = (clicks, unique_ips)
+    return dict(result)
+
+
+def click_totals(start, end, products=None):
+    """Return ``{product_id: clicks}`` summed over the date range."""
+    rows = (
+        daily_rollups(start, end, products)
+        .values('product_id')
+        .annotate(total=Sum('clicks'))
+        .values_list('product_id', 'total')
+    )
+    return dict(rows)
+
+
+def unique_visitors(start, end, products=None):
+    """Estimated distinct IPs over the range, merged across products and days."""
+    registers = empty_sketch()
+    for sketch in daily_rollups(start, end, products).values_list('ip_sketch', flat=True):
+        registers = sketch_merge(registers, bytes(sketch))
+    return sketch_estimate(registers)
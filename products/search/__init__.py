@@ -0,0 +1,110 @@
+"""
+Pluggable product search.
+
+``SEARCH_BACKEND`` is a dotted path to a backend class, or ``'auto'`` to
+pick the full-text backend for the configured database (PostgreSQL
+``tsvector``/GIN or SQLite FTS5) and fall back to ``icontains`` matching
+elsewhere. Backends return ranked product ids; callers paginate the ids
+and load only the page they need with ``fetch_products``.
+
+Ranked id lists are cached per normalized query (``SEARCH_CACHE_TIMEOUT``)
+under the catalog version, so any Product or Category change invalidates
+every entry at once. Hits and misses are counted in the cache; see
+``search_cache_stats``.
+"""
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from products.catalog import get_catalog_version
+
+VENDOR_BACKENDS = {
+    'postgresql': 'products.search.postgres.PostgresSearchBackend',
+    'sqlite': 'products.search.sqlite.SQLiteSearchBackend',
+}
+FALLBACK_BACKEND = 'products.search.base.DatabaseSearchBackend'
+
+CACHE_PREFIX = 'searchcache'
+PLAIN_QUERY_RE = re.compile(r'^[\w ]+$')
+
+_backend = None
+
+
+def get_backend():
+    """Return the configured search backend instance."""
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'SEARCH_BACKEND', 'auto')
+        if path == 'auto':
+            path = VENDOR_BACKENDS.get(connection.vendor, FALLBACK_BACKEND)
+        _backend = import_string(path)()
+    return _backend
+
+
+def normalize_query(query, order_insensitive=False):
+    """
+    Canonical cache form of a query: lowercased, single-spaced and, when
+    the backend ignores word order and the query has no operators
+    (quotes, ``-``, ``or``), with its words deduplicated and sorted.
+    """
+    query = ' '.join(query.lower().split())
+    if order_insensitive and PLAIN_QUERY_RE.match(query):
+        words = query.split(' ')
+        if 'or' not in words:
+            query = ' '.join(sorted(set(words)))
+    return query
+
+
+def _count(event):
+    key = f'{CACHE_PREFIX}:{event}'
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def search_cache_stats():
+    """Return ``{'hits', 'misses', 'hit_ratio'}`` since the counters were reset."""
+    counts = cache.get_many([f'{CACHE_PREFIX}:hits', f'{CACHE_PREFIX}:misses'])
+    hits = counts.get(f'{CACHE_PREFIX}:hits', 0)
+    misses = counts.get(f'{CACHE_PREFIX}:misses', 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': hits / total if total else 0.0}
+
+
+def reset_search_cache_stats():
+    cache.delete_many([f'{CACHE_PREFIX}:hits', f'{CACHE_PREFIX}:misses'])
+
+
+def search_products(query, limit=None):
+    """Return product ids matching ``query``, best match first."""
+    limit = limit or getattr(settings, 'SEARCH_MAX_RESULTS', 1000)
+    backend = get_backend()
+    normalized = normalize_query(query, backend.order_insensitive)
+    timeout = getattr(settings, 'SEARCH_CACHE_TIMEOUT', 300)
+    if not timeout:
+        return backend.search(normalized, limit)
+
+    digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+    key = f'{CACHE_PREFIX}:{get_catalog_version()}:{type(backend).__name__}:{limit}:{digest}'
+    product_ids = cache.get(key)
+    if product_ids is not None:
+        _count('hits')
+        return product_ids
+    _count('misses')
+    product_ids = backend.search(normalized, limit)
+    cache.set(key, product_ids, timeout)
+    return product_ids
+
+
+def fetch_products(product_ids):
+    """Load products for ``product_ids`` in one query, keeping their order."""
+    from products.models import Product
+
+    found = Product.objects.select_related('category').in_bulk(product_ids)
+    return [found[pk] for pk in product_ids if pk in found]
@@ -0,0 +1,56 @@
+from django.db.models import Q
+
+# Relative importance of each indexed field, shared by all backends.
+FIELD_WEIGHTS = {
+    'name': 10.0,
+    'category': 5.0,
+    'pros': 3.0,
+    'cons': 3.0,
+    'description': 1.0,
+}
+
+
+class BaseSearchBackend:
+    """Interface for product search backends."""
+
+    # True when results depend only on the set of query words, so cached
+    # results can be shared between "usb hub" and "hub usb".
+    order_insensitive = False
+
+    def search(self, query, limit):
+        """Return up to ``limit`` matching product ids, best match first."""
+        raise NotImplementedError
+
+    def index_products(self, product_ids):
+        """(Re)index the given products after they were saved."""
+
+    def index_category(self, category_id):
+        """Reindex every product in a category after it was renamed."""
+
+    def remove_products(self, product_ids):
+        """Drop deleted products from the index."""
+
+    def rebuild(self):
+        """Rebuild the whole index from the database."""
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """Unindexed ``icontains`` matching; works on any database."""
+
+    # Matches the query as one substring, so word order matters.
+    order_insensitive = False
+
+    def search(self, query, limit):
+        from products.models import Product
+
+        return list(
+            Product.objects.filter(
+                Q(name__icontains=query) |
+                Q(description__icontains=query) |
+                Q(pros__icontains=query) |
+                Q(cons__icontains=query) |
+                Q(category__name__icontains=query)
+            )
+            .order_by('-click_count', '-id')
+            .values_list('id', flat=True)[:limit]
+        )
@@ -0,0 +1,406 @@
+"""
+In-process inverted index for product search.
+
+For deployments that cannot use database full-text features. Each worker
+holds a tokenized, lightly stemmed index with array-backed posting lists
+and ranks matches with BM25 over field-weighted term frequencies (see
+``FIELD_WEIGHTS``).
+
+Workers boot from a snapshot file (``SEARCH_INDEX_PATH``) whose posting
+lists are memory-mapped rather than parsed, or build from the database if
+there is none. Saves and deletes in any worker append the touched product
+ids to a change journal in ``SEARCH_INDEX_CACHE``. Every worker replays
+the journal before searching, so that cache must be shared (Redis or
+Memcached) when running more than one worker. Journal entries expire
+after ``SEARCH_JOURNAL_TTL`` and writing a snapshot drops the ones it
+contains, so rebuild the snapshot more often than that.
+
+A sequence number is allocated before its entry is written, so an entry
+that is still missing is given ``JOURNAL_WRITE_GRACE`` seconds to appear;
+the entries around it are replayed meanwhile. Only a gap that outlasts
+that, or one the snapshot already trimmed, is treated as lost: the worker
+reloads the snapshot, and only rebuilds from the database if the journal
+does not reach back to the snapshot either.
+
+Updates never rewrite posting lists: a changed product gets a new doc
+ordinal and the old one is tombstoned until the next compaction.
+"""
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from array import array
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .base import BaseSearchBackend, FIELD_WEIGHTS
+
+K1 = 1.2
+B = 0.75
+COMPACT_RATIO = 0.25
+
+MAGIC = b'TDIX'
+VERSION = 1
+PREAMBLE = struct.Struct('<4sII')  # magic, version, header length
+
+JOURNAL_PREFIX = 'searchindex'
+JOURNAL_SEQ_KEY = f'{JOURNAL_PREFIX}:seq'
+JOURNAL_TRIMMED_KEY = f'{JOURNAL_PREFIX}:trimmed'
+JOURNAL_WRITE_GRACE = 5
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+STOPWORDS = frozenset(
+    'a an and are as at be by for from has in is it its of on or that the '
+    'this to was were will with'.split()
+)
+
+
+def stem(token):
+    """Light English suffix stripping; enough to match plurals and tenses."""
+    if len(token) <= 3 or token.isdigit():
+        return token
+    if token.endswith('ies') and len(token) > 4:
+        return token[:-3] + 'y'
+    if token.endswith('sses'):
+        return token[:-2]
+    for suffix in ('ing', 'ed', 'ly'):
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    if token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    return [
+        stem(token) for token in TOKEN_RE.findall((text or '').lower())
+        if token not in STOPWORDS
+    ]
+
+
+class InvertedIndex:
+    """Posting lists of ``(doc ordinal, weighted tf)`` per term."""
+
+    def __init__(self):
+        self.doc_ids = array('q')        # ordinal -> product id
+        self.doc_lengths = array('f')    # ordinal -> weighted length
+        self.ordinals = {}               # live product id -> ordinal
+        self.deleted = set()             # tombstoned ordinals
+        self.postings = {}               # term -> [ordinals, weighted tfs]
+        self.total_length = 0.0
+        self._mmap = None
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def add(self, product_id, fields):
+        """Index ``fields`` ({field name: text}) for a product, replacing any old entry."""
+        self.remove(product_id)
+        frequencies = defaultdict(float)
+        for field, text in fields.items():
+            weight = FIELD_WEIGHTS[field]
+            for term in tokenize(text):
+                frequencies[term] += weight
+
+        ordinal = len(self.doc_ids)
+        length = sum(frequencies.values())
+        self.doc_ids.append(product_id)
+        self.doc_lengths.append(length)
+        self.ordinals[product_id] = ordinal
+        self.total_length += length
+        for term, frequency in frequencies.items():
+            entry = self.postings.get(term)
+            if entry is None:
+                entry = self.postings[term] = [array('I'), array('f')]
+            elif isinstance(entry[0], memoryview):
+                entry[0], entry[1] = array('I', entry[0]), array('f', entry[1])
+            entry[0].append(ordinal)
+            entry[1].append(frequency)
+
+    def remove(self, product_id):
+        ordinal = self.ordinals.pop(product_id, None)
+        if ordinal is not None:
+            self.deleted.add(ordinal)
+            self.total_length -= self.doc_lengths[ordinal]
+
+    def needs_compaction(self):
+        return len(self.deleted) > COMPACT_RATIO * max(len(self.doc_ids), 1)
+
+    def compact(self):
+        """Drop tombstoned ordinals and renumber the remaining documents."""
+        if not self.deleted:
+            return
+        remap = array('i', [-1]) * len(self.doc_ids)
+        doc_ids, doc_lengths = array('q'), array('f')
+        for ordinal, product_id in enumerate(self.doc_ids):
+            if ordinal not in self.deleted:
+                remap[ordinal] = len(doc_ids)
+                doc_ids.append(product_id)
+                doc_lengths.append(self.doc_lengths[ordinal])
+        postings = {}
+        for term, (ordinals, frequencies) in self.postings.items():
+            new_ordinals, new_frequencies = array('I'), array('f')
+            for ordinal, frequency in zip(ordinals, frequencies):
+                if remap[ordinal] >= 0:
+                    new_ordinals.append(remap[ordinal])
+                    new_frequencies.append(frequency)
+            if new_ordinals:
+                postings[term] = [new_ordinals, new_frequencies]
+        self.doc_ids, self.doc_lengths, self.postings = doc_ids, doc_lengths, postings
+        self.ordinals = {product_id: ordinal for ordinal, product_id in enumerate(doc_ids)}
+        self.deleted = set()
+
+    def search(self, query, limit):
+        """Return up to ``limit`` product ids ranked by BM25."""
+        live = len(self.ordinals)
+        if not live:
+            return []
+        average_length = self.total_length / live or 1.0
+        deleted = self.deleted
+        doc_lengths = self.doc_lengths
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            ordinals, frequencies = entry
+            document_frequency = len(ordinals)
+            idf = math.log(1 + (live - document_frequency + 0.5) / (document_frequency + 0.5))
+            for ordinal, frequency in zip(ordinals, frequencies):
+                if ordinal in deleted:
+                    continue
+                norm = K1 * (1 - B + B * doc_lengths[ordinal] / average_length)
+                scores[ordinal] += idf * frequency * (K1 + 1) / (frequency + norm)
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+        return [self.doc_ids[ordinal] for ordinal, _ in best]
+
+    def save(self, path, sequence=0):
+        """Write a compacted snapshot that ``load`` can memory-map."""
+        self.compact()
+        terms = {}
+        all_ordinals, all_frequencies = array('I'), array('f')
+        for term, (ordinals, frequencies) in self.postings.items():
+            terms[term] = [len(all_ordinals), len(ordinals)]
+            all_ordinals.extend(ordinals)
+            all_frequencies.extend(frequencies)
+        header = json.dumps({
+            'sequence': sequence,
+            'documents': len(self.doc_ids),
+            'postings': len(all_ordinals),
+            'total_length': self.total_length,
+            'terms': terms,
+        }).encode('utf-8')
+        header += b' ' * (-(PREAMBLE.size + len(header)) % 8)
+
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            f.write(PREAMBLE.pack(MAGIC, VERSION, len(header)))
+            f.write(header)
+            f.write(self.doc_ids.tobytes())
+            f.write(self.doc_lengths.tobytes())
+            f.write(b'\0' * (-len(self.doc_lengths) * 4 % 8))
+            f.write(all_ordinals.tobytes())
+            f.write(all_frequencies.tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Open a snapshot. Posting lists stay views into the mapped file until
+        a term is updated.
+
+        Returns ``(index, journal sequence)``.
+        """
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_length = PREAMBLE.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION:
+            mm.close()
+            raise ValueError(f'{path} is not a search index snapshot')
+        offset = PREAMBLE.size
+        header = json.loads(mm[offset:offset + header_length])
+        offset += header_length
+
+        view = memoryview(mm)
+        documents = header['documents']
+        index = cls()
+        index._mmap = mm
+        index.doc_ids.frombytes(view[offset:offset + documents * 8])
+        offset += documents * 8
+        index.doc_lengths.frombytes(view[offset:offset + documents * 4])
+        offset += documents * 4 + (-documents * 4 % 8)
+        postings = header['postings']
+        ordinals = view[offset:offset + postings * 4].cast('I')
+        frequencies = view[offset + postings * 4:offset + postings * 8].cast('f')
+        for term, (start, count) in header['terms'].items():
+            index.postings[term] = [ordinals[start:start + count], frequencies[start:start + count]]
+        index.ordinals = {product_id: ordinal for ordinal, product_id in enumerate(index.doc_ids)}
+        index.total_length = header['total_length']
+        return index, header['sequence']
+
+
+def product_documents(queryset):
+    """Yield ``(product id, {field: text})`` for the products in ``queryset``."""
+    rows = queryset.values_list(
+        'id', 'name', 'category__name', 'pros', 'cons', 'description'
+    ).iterator(chunk_size=2000)
+    for product_id, name, category, pros, cons, description in rows:
+        yield product_id, {
+            'name': name,
+            'category': category,
+            # Stored as lists; items are separate phrases
+            'pros': '\n'.join(pros),
+            'cons': '\n'.join(cons),
+            'description': description,
+        }
+
+
+class InvertedIndexBackend(BaseSearchBackend):
+    """Search backend around a per-process ``InvertedIndex``."""
+
+    order_insensitive = True
+
+    def __init__(self, path=None, cache_alias=None):
+        self.path = path or str(getattr(
+            settings, 'SEARCH_INDEX_PATH', settings.BASE_DIR / 'var' / 'search.idx'
+        ))
+        self.cache = caches[cache_alias or getattr(settings, 'SEARCH_INDEX_CACHE', 'default')]
+        self.journal_ttl = getattr(settings, 'SEARCH_JOURNAL_TTL', 7 * 24 * 60 * 60)
+        self.index = None
+        self.sequence = 0
+        # (first missing sequence, when it was first seen missing)
+        self._pending = None
+        self._lock = threading.RLock()
+
+    def _journal_sequence(self):
+        return self.cache.get(JOURNAL_SEQ_KEY, 0)
+
+    def _journal_key(self, sequence):
+        return f'{JOURNAL_PREFIX}:change:{sequence}'
+
+    def _changes_since(self, sequence, latest):
+        """
+        ``(product ids, first missing sequence or None)`` for the entries
+        after ``sequence``; the ids are those of the entries that were found.
+        """
+        keys = [self._journal_key(n) for n in range(sequence + 1, latest + 1)]
+        changes = self.cache.get_many(keys)
+        missing = next((n for n, key in enumerate(keys, sequence + 1) if key not in changes), None)
+        return {pk for product_ids in changes.values() for pk in product_ids}, missing
+
+    def _is_lost(self, missing):
+        """Whether journal entry ``missing`` will never be written."""
+        if missing <= self.cache.get(JOURNAL_TRIMMED_KEY, 0):
+            return True
+        now = time.monotonic()
+        if self._pending is None or self._pending[0] != missing:
+            self._pending = (missing, now)
+        return now - self._pending[1] > JOURNAL_WRITE_GRACE
+
+    def _build(self):
+        from products.models import Product
+
+        sequence = self._journal_sequence()
+        index = InvertedIndex()
+        for product_id, fields in product_documents(Product.objects.all()):
+            index.add(product_id, fields)
+        return index, sequence
+
+    def _ensure_loaded(self):
+        if self.index is not None:
+            return
+        try:
+            self.index, self.sequence = InvertedIndex.load(self.path)
+        except (FileNotFoundError, ValueError):
+            self.index, self.sequence = self._build()
+
+    def _apply(self, product_ids):
+        """Reload the given products from the database into the index."""
+        from products.models import Product
+
+        product_ids = set(product_ids)
+        for product_id, fields in product_documents(Product.objects.filter(pk__in=product_ids)):
+            self.index.add(product_id, fields)
+            product_ids.discard(product_id)
+        for product_id in product_ids:
+            self.index.remove(product_id)
+        if self.index.needs_compaction():
+            self.index.compact()
+
+    def _sync(self):
+        """Replay journal entries written by other workers."""
+        latest = self._journal_sequence()
+        if latest == self.sequence:
+            return
+        changes, missing = self._changes_since(self.sequence, latest)
+        if latest < self.sequence or (missing is not None and self._is_lost(missing)):
+            # Entries were trimmed by a newer snapshot, evicted or reset
+            try:
+                index, sequence = InvertedIndex.load(self.path)
+            except (FileNotFoundError, ValueError):
+                index, sequence = None, 0
+            if index is not None and sequence <= latest:
+                changes, missing = self._changes_since(sequence, latest)
+            if index is None or sequence > latest or (missing is not None and self._is_lost(missing)):
+                self.index, self.sequence = self._build()
+                return
+            self.index = index
+        self._apply(changes)
+        # Entries after a pending one are replayed again once it arrives
+        self.sequence = latest if missing is None else missing - 1
+
+    def _record_change(self, product_ids):
+        self._ensure_loaded()
+        self._sync()
+        self._apply(product_ids)
+        self.cache.add(JOURNAL_SEQ_KEY, 0, timeout=None)
+        sequence = self.cache.incr(JOURNAL_SEQ_KEY)
+        self.cache.set(self._journal_key(sequence), list(product_ids), timeout=self.journal_ttl)
+        if sequence == self.sequence + 1:
+            # Nothing else was journaled in between; don't replay our own entry
+            self.sequence = sequence
+
+    def _trim_journal(self, sequence):
+        """Drop journal entries that the snapshot at ``sequence`` contains."""
+        trimmed = self.cache.get(JOURNAL_TRIMMED_KEY, 0)
+        for start in range(trimmed + 1, sequence + 1, 1000):
+            stop = min(start + 1000, sequence + 1)
+            self.cache.delete_many([self._journal_key(n) for n in range(start, stop)])
+        if sequence > trimmed:
+            self.cache.set(JOURNAL_TRIMMED_KEY, sequence, timeout=None)
+
+    def search(self, query, limit):
+        with self._lock:
+            self._ensure_loaded()
+            self._sync()
+            return self.index.search(query, limit)
+
+    def index_products(self, product_ids):
+        with self._lock:
+            self._record_change(product_ids)
+
+    def index_category(self, category_id):
+        from products.models import Product
+
+        product_ids = list(Product.objects.filter(category_id=category_id).values_list('id', flat=True))
+        if product_ids:
+            self.index_products(product_ids)
+
+    def remove_products(self, product_ids):
+        with self._lock:
+            self._record_change(product_ids)
+
+    def rebuild(self):
+        """Rebuild from the database and write a fresh snapshot."""
+        with self._lock:
+            self.index, self.sequence = self._build()
+            self.index.save(self.path, self.sequence)
+            self._trim_journal(self.sequence)
@@ -0,0 +1,58 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F
+
+from products.models import Category, Product
+from .base import BaseSearchBackend
+
+SEARCH_CONFIG = 'english'
+
+# Postgres only has four weight classes; pros and cons share 'C'. The jsonb
+# form of to_tsvector indexes each list item as its own string.
+UPDATE_VECTORS_SQL = """
+    UPDATE {product} AS p SET search_vector =
+        setweight(to_tsvector(%(config)s, coalesce(p.name, '')), 'A') ||
+        setweight(to_tsvector(%(config)s, coalesce(c.name, '')), 'B') ||
+        setweight(to_tsvector(%(config)s, coalesce(p.pros, '[]'::jsonb)), 'C') ||
+        setweight(to_tsvector(%(config)s, coalesce(p.cons, '[]'::jsonb)), 'C') ||
+        setweight(to_tsvector(%(config)s, coalesce(p.description, '')), 'D')
+    FROM {category} AS c
+    WHERE c.id = p.category_id {where}
+"""
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """Weighted ``tsvector`` column on Product with a GIN index."""
+
+    order_insensitive = True
+
+    def _update(self, where='', params=None):
+        sql = UPDATE_VECTORS_SQL.format(
+            product=connection.ops.quote_name(Product._meta.db_table),
+            category=connection.ops.quote_name(Category._meta.db_table),
+            where=where,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {'config': SEARCH_CONFIG, **(params or {})})
+
+    def search(self, query, limit):
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+        return list(
+            Product.objects.filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F('search_vector'), search_query))
+            .order_by('-rank', '-click_count', '-id')
+            .values_list('id', flat=True)[:limit]
+        )
+
+    def index_products(self, product_ids):
+        self._update('AND p.id = ANY(%(ids)s)', {'ids': list(product_ids)})
+
+    def index_category(self, category_id):
+        self._update('AND p.category_id = %(category_id)s', {'category_id': category_id})
+
+    def remove_products(self, product_ids):
+        # The vector lives on the product row and goes away with it.
+        pass
+
+    def rebuild(self):
+        self._update()
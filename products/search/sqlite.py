@@ -0,0 +1,85 @@
+import re
+
+from django.db import connection
+
+from products.models import Category, Product
+from .base import BaseSearchBackend, FIELD_WEIGHTS
+
+FTS_TABLE = 'products_product_fts'
+FTS_COLUMNS = ['name', 'category', 'pros', 'cons', 'description']
+
+INSERT_SQL = """
+    INSERT INTO {fts} (rowid, name, category, pros, cons, description)
+    SELECT p.id, p.name, c.name,
+        (SELECT coalesce(group_concat(value, char(10)), '') FROM json_each(p.pros)),
+        (SELECT coalesce(group_concat(value, char(10)), '') FROM json_each(p.cons)),
+        p.description
+    FROM {product} AS p JOIN {category} AS c ON c.id = p.category_id
+    {where}
+"""
+
+SEARCH_SQL = """
+    SELECT rowid FROM {fts}
+    WHERE {fts} MATCH %s
+    ORDER BY bm25({fts}, {weights}), rowid DESC
+    LIMIT %s
+"""
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def build_match_expression(query):
+    """Quote every word so user input cannot inject FTS5 query syntax."""
+    return ' '.join(f'"{token}"' for token in TOKEN_RE.findall(query))
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """FTS5 virtual table keyed by product id, ranked with weighted BM25."""
+
+    order_insensitive = True
+
+    def _reindex(self, delete_where='', insert_where='', params=()):
+        """Replace FTS rows selected by ``delete_where`` with fresh copies."""
+        sql = INSERT_SQL.format(
+            fts=FTS_TABLE,
+            product=Product._meta.db_table,
+            category=Category._meta.db_table,
+            where=insert_where,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} {delete_where}', params)
+            cursor.execute(sql, params)
+
+    def search(self, query, limit):
+        expression = build_match_expression(query)
+        if not expression:
+            return []
+        weights = ', '.join(str(FIELD_WEIGHTS[column]) for column in FTS_COLUMNS)
+        with connection.cursor() as cursor:
+            cursor.execute(SEARCH_SQL.format(fts=FTS_TABLE, weights=weights), [expression, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+    def index_products(self, product_ids):
+        product_ids = list(product_ids)
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        self._reindex(
+            f'WHERE rowid IN ({placeholders})',
+            f'WHERE p.id IN ({placeholders})',
+            product_ids,
+        )
+
+    def index_category(self, category_id):
+        self._reindex(
+            f'WHERE rowid IN (SELECT id FROM {Product._meta.db_table} WHERE category_id = %s)',
+            'WHERE p.category_id = %s',
+            [category_id],
+        )
+
+    def remove_products(self, product_ids):
+        product_ids = list(product_ids)
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', product_ids)
+
+    def rebuild(self):
+        self._reindex()
@@ -0,0 +1,144 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.fragments import bump_fragment_versions
+from core.page_cache import instance_tag, list_tag, purge_tags, tag_for
+
+from . import redirects
+from . import category_counts, facets
+from .catalog import CATEGORY_FRAGMENTS, PRODUCT_FRAGMENTS, bump_catalog_version
+from .models import Category, Product
+from .search import get_backend as get_search_backend
+
+
+@receiver(post_save, sender=Product)
+def update_redirect_target(sender, instance, raw=False, **kwargs):
+    """Point the shared redirect map at the saved affiliate URL."""
+    if raw or not getattr(settings, 'REDIRECT_CACHE_ENABLED', True):
+        return
+    product_id, url = instance.pk, instance.affiliate_url
+    transaction.on_commit(lambda: redirects.set_target(product_id, url))
+
+
+@receiver(post_delete, sender=Product)
+def remove_redirect_target(sender, instance, **kwargs):
+    """Tombstone a deleted product so its redirect 404s without a query."""
+    if not getattr(settings, 'REDIRECT_CACHE_ENABLED', True):
+        return
+    product_id = instance.pk
+    transaction.on_commit(lambda: redirects.delete_target(product_id))
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    """Refresh the saved product's full-text index entry."""
+    if raw:
+        return
+    product_id = instance.pk
+    transaction.on_commit(lambda: get_search_backend().index_products([product_id]))
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    product_id = instance.pk
+    transaction.on_commit(lambda: get_search_backend().remove_products([product_id]))
+
+
+@receiver(post_save, sender=Category)
+def index_category_products(sender, instance, created=False, raw=False, **kwargs):
+    """Category names are indexed with their products; reindex on rename."""
+    if raw or created:
+        return
+    category_id = instance.pk
+    transaction.on_commit(lambda: get_search_backend().index_category(category_id))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def catalog_changed(sender, raw=False, **kwargs):
+    """Invalidate every cache keyed on the catalog version."""
+    if raw:
+        return
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_fragments_changed(sender, raw=False, **kwargs):
+    """Re-render the home page sections that list products."""
+    if raw:
+        return
+    transaction.on_commit(lambda: bump_fragment_versions(*PRODUCT_FRAGMENTS))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_fragments_changed(sender, raw=False, **kwargs):
+    """Category names appear on product cards as well as the category grid."""
+    if raw:
+        return
+    transaction.on_commit(lambda: bump_fragment_versions(*CATEGORY_FRAGMENTS))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def purge_product_pages(sender, instance, raw=False, **kwargs):
+    """Purge cached pages showing the product, its category or any listing."""
+    if raw:
+        return
+    tags = [tag_for(instance), instance_tag(Category, instance.category_id), list_tag(Product)]
+    transaction.on_commit(lambda: purge_tags(*tags))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def purge_category_pages(sender, instance, raw=False, **kwargs):
+    """Category names also appear on every product card."""
+    if raw:
+        return
+    tags = [tag_for(instance), list_tag(Category), list_tag(Product)]
+    transaction.on_commit(lambda: purge_tags(*tags))
+
+
+@receiver(pre_save, sender=Product)
+def remember_category_count_state(sender, instance, raw=False, **kwargs):
+    """Note what the stored category counts include before the row changes."""
+    if raw:
+        return
+    previous = None
+    if not instance._state.adding:
+        previous = sender.objects.filter(pk=instance.pk).values_list('category_id', 'is_featured').first()
+    setattr(instance, category_counts.STATE_ATTR, previous and (previous[0], bool(previous[1])))
+
+
+@receiver(post_save, sender=Product)
+def update_category_counts(sender, instance, raw=False, **kwargs):
+    """Adjust category counts in the saving transaction (no on_commit)."""
+    if raw:
+        return
+    old_state = getattr(instance, category_counts.STATE_ATTR, None)
+    new_state = category_counts.count_state(instance)
+    if old_state != new_state:
+        category_counts.apply_count_deltas(category_counts.count_deltas(old_state, new_state))
+    setattr(instance, category_counts.STATE_ATTR, new_state)
+
+
+@receiver(post_delete, sender=Product)
+def decrement_category_counts(sender, instance, **kwargs):
+    category_counts.apply_count_deltas(
+        category_counts.count_deltas(category_counts.count_state(instance), None)
+    )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def journal_facet_change(sender, instance, raw=False, **kwargs):
+    """Let every worker's category facets reload the product."""
+    if raw:
+        return
+    product_id = instance.pk
+    transaction.on_commit(lambda: facets.record_change([product_id]))
@@ -0,0 +1,276 @@
+"""
+Search-as-you-type suggestions.
+
+Product names (and every word-suffix of them, so "pro" finds "Earbuds Pro")
+and category names are kept in one sorted array of lowercase keys; a prefix
+lookup is two ``bisect`` calls bounding the matching range, from which the
+best are picked with a heap. Top results are precomputed for every prefix
+of up to three characters and every longer one matching more than
+``MAX_SCAN`` keys, so no keystroke ranks more than ``MAX_SCAN`` entries.
+Results rank by click_count.
+
+When the catalog version changes the index is refreshed from the products
+updated since the last build (a full rebuild if any were deleted), and
+only the precomputed prefixes of changed keys are re-ranked. It is rebuilt
+from scratch once it is older than ``SUGGEST_MAX_AGE`` seconds, which also
+picks up new click counts. Only the very first build in a process blocks
+requests, and concurrent first requests wait for that one build; later
+ones run in a background thread while the old index keeps serving.
+Rendered JSON bodies are cached per prefix until the next swap.
+"""
+import heapq
+import json
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Sum
+from django.urls import reverse
+from django.utils import timezone
+
+from .catalog import get_catalog_version
+
+MAX_PREFIX_LENGTH = 50
+PRECOMPUTED_PREFIX_LENGTH = 3
+MAX_SCAN = 2000
+# Re-read products saved this long before the last build, in case their
+# transactions committed after it
+REFRESH_OVERLAP = timedelta(seconds=60)
+# Past this many changed prefixes, re-rank them all
+MAX_TOUCHED_PREFIXES = 500
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_prefix(text):
+    return WHITESPACE_RE.sub(' ', text.lower()).strip()[:MAX_PREFIX_LENGTH]
+
+
+class SuggestIndex:
+    """Immutable prefix index; a new one is built and swapped in on refresh."""
+
+    def __init__(self, entries, limit, previous=None, touched=()):
+        """
+        ``entries`` is an iterable of ``(key, score, kind, item_id, item)``.
+        With ``previous``, only the prefixes of the ``touched`` keys are
+        ranked again; the rest are carried over.
+        """
+        self.limit = limit
+        entries = sorted(entries, key=lambda entry: entry[0])
+        self.keys = [entry[0] for entry in entries]
+        self.entries = entries
+        self.since = None
+        self.product_ids = frozenset()
+        self.category_scores = {}
+        prefixes = {key[:length] for key in touched for length in range(1, len(key) + 1)}
+        if previous is None or len(prefixes) > MAX_TOUCHED_PREFIXES:
+            self.precomputed = {}
+            self._precompute('', 0, len(entries))
+            return
+        self.precomputed = dict(previous.precomputed)
+        for prefix in prefixes:
+            self.precomputed.pop(prefix, None)
+            start, end = self._range(prefix)
+            if start < end and self._is_precomputed(prefix, end - start):
+                self.precomputed[prefix] = self._top(entries[start:end])
+
+    @staticmethod
+    def _is_precomputed(prefix, size):
+        return len(prefix) <= PRECOMPUTED_PREFIX_LENGTH or size > MAX_SCAN
+
+    def _range(self, prefix):
+        start = bisect_left(self.keys, prefix)
+        return start, bisect_left(self.keys, prefix + '\U0010ffff', start)
+
+    def _precompute(self, prefix, start, end):
+        """Rank the extensions of ``prefix`` (keys[start:end]) one character longer."""
+        length = len(prefix) + 1
+        position = start
+        while position < end:
+            if len(self.keys[position]) < length:
+                position += 1
+                continue
+            extended = self.keys[position][:length]
+            stop = bisect_left(self.keys, extended + '\U0010ffff', position, end)
+            if self._is_precomputed(extended, stop - position):
+                self.precomputed[extended] = self._top(self.entries[position:stop])
+                self._precompute(extended, position, stop)
+            position = stop
+
+    def _top(self, entries):
+        """Best ``limit`` products and categories, one result per item."""
+        results = {'product': {}, 'category': {}}
+        wanted = {
+            kind: min(self.limit, len({entry[3] for entry in entries if entry[2] == kind}))
+            for kind in results
+        }
+        # Pop from a heap until both kinds are full instead of sorting
+        # every match; ties keep key order
+        heap = [(-entry[1], position) for position, entry in enumerate(entries)]
+        heapq.heapify(heap)
+        while any(len(results[kind]) < count for kind, count in wanted.items()):
+            _, kind, item_id, item = entries[heapq.heappop(heap)[1]][1:]
+            bucket = results[kind]
+            if item_id not in bucket and len(bucket) < self.limit:
+                bucket[item_id] = item
+        return {
+            'products': list(results['product'].values()),
+            'categories': list(results['category'].values()),
+        }
+
+    def lookup(self, prefix):
+        if prefix in self.precomputed:
+            return self.precomputed[prefix]
+        # Ranges wider than MAX_SCAN are always precomputed
+        start, end = self._range(prefix)
+        return self._top(self.entries[start:end])
+
+
+def _product_entries(rows, product_url):
+    for product_id, name, slug, click_count in rows:
+        item = {'name': name, 'url': product_url.replace('__slug__', slug)}
+        words = normalize_prefix(name).split(' ')
+        for i in range(len(words)):
+            yield ' '.join(words[i:]), click_count, 'product', product_id, item
+
+
+def _category_entries(rows, category_url):
+    for category_id, name, slug, clicks in rows:
+        item = {'name': name, 'url': category_url.replace('__slug__', slug)}
+        yield normalize_prefix(name), clicks or 0, 'category', category_id, item
+
+
+def build_index(limit, previous=None):
+    """
+    Build the index from the database. With ``previous``, only products
+    saved since it was built are read, unless some were deleted.
+    """
+    from .models import Category, Product
+
+    since = timezone.now() - REFRESH_OVERLAP
+    product_url = reverse('products:product_detail', args=['__slug__'])
+    category_url = reverse('products:category_detail', args=['__slug__'])
+    fields = ('id', 'name', 'slug', 'click_count')
+    if previous is not None:
+        changed = list(Product.objects.filter(updated_at__gte=previous.since).values_list(*fields))
+        changed_ids = {row[0] for row in changed}
+        if Product.objects.count() != len(previous.product_ids | changed_ids):
+            previous = None
+
+    if previous is None:
+        rows = Product.objects.values_list(*fields).iterator(chunk_size=5000)
+        categories = Category.objects.annotate(clicks=Sum('products__click_count')).values_list(
+            'id', 'name', 'slug', 'clicks'
+        )
+        entries = list(_product_entries(rows, product_url))
+        entries.extend(_category_entries(categories, category_url))
+        index = SuggestIndex(entries, limit)
+    else:
+        # Category names are re-read; their scores wait for the next full build
+        categories = [
+            (category_id, name, slug, previous.category_scores.get(category_id, 0))
+            for category_id, name, slug in Category.objects.values_list('id', 'name', 'slug')
+        ]
+        kept = [
+            entry for entry in previous.entries
+            if entry[2] == 'product' and entry[3] not in changed_ids
+        ]
+        added = list(_product_entries(changed, product_url))
+        added.extend(_category_entries(categories, category_url))
+        removed = [entry for entry in previous.entries if entry[2] == 'category' or entry[3] in changed_ids]
+
+        def summary(entries):
+            return {(entry[0], entry[1], entry[2], entry[3], entry[4]['url']) for entry in entries}
+
+        touched = {entry[0] for entry in summary(removed) ^ summary(added)}
+        index = SuggestIndex(kept + added, limit, previous, touched)
+
+    index.since = since
+    index.product_ids = frozenset(entry[3] for entry in index.entries if entry[2] == 'product')
+    index.category_scores = {entry[3]: entry[1] for entry in index.entries if entry[2] == 'category'}
+    return index
+
+
+class Suggester:
+    """Holds the current index and the per-prefix response cache."""
+
+    def __init__(self):
+        self.limit = getattr(settings, 'SUGGEST_LIMIT', 8)
+        self.max_age = getattr(settings, 'SUGGEST_MAX_AGE', 900)
+        self.cache_size = getattr(settings, 'SUGGEST_CACHE_SIZE', 10000)
+        self.index = None
+        self.version = None
+        self.built_at = 0
+        self.responses = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._responses_lock = threading.Lock()
+        self._rebuilding = False
+
+    def _swap(self, index, version, full=True):
+        with self._lock:
+            self.index, self.version = index, version
+            if full:
+                # Refreshes don't reset the age; click counts only change here
+                self.built_at = time.monotonic()
+            self.responses = OrderedDict()
+            self._rebuilding = False
+
+    def _rebuild_in_background(self, version):
+        def rebuild():
+            from django.db import close_old_connections
+
+            full = time.monotonic() - self.built_at > self.max_age
+            try:
+                self._swap(build_index(self.limit, None if full else self.index), version, full)
+            finally:
+                self._rebuilding = False
+                close_old_connections()
+
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=rebuild, name='suggest-rebuild', daemon=True).start()
+
+    def _current_index(self):
+        version = get_catalog_version()
+        if self.index is None:
+            with self._build_lock:
+                if self.index is None:
+                    self._swap(build_index(self.limit), version)
+        elif version != self.version or time.monotonic() - self.built_at > self.max_age:
+            self._rebuild_in_background(version)
+        return self.index
+
+    def response_body(self, text):
+        """Return the JSON body (bytes) for the typed text."""
+        prefix = normalize_prefix(text)
+        index = self._current_index()
+        responses = self.responses
+        # Threaded workers share the LRU; OrderedDict moves are not atomic
+        with self._responses_lock:
+            body = responses.get(prefix)
+            if body is not None:
+                responses.move_to_end(prefix)
+                return body
+        results = index.lookup(prefix) if prefix else {'products': [], 'categories': []}
+        body = json.dumps({'query': prefix, **results}).encode('utf-8')
+        with self._responses_lock:
+            responses[prefix] = body
+            if len(responses) > self.cache_size:
+                responses.popitem(last=False)
+        return body
+
+
+_suggester = None
+
+
+def get_suggester():
+    global _suggester
+    if _suggester is None:
+        _suggester = Suggester()
+    return _suggester
@@ -0,0 +1,17 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from products.cards import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def product_cards(products):
+    """
+    Cached card HTML for ``products`` as ``(product, html)`` pairs::
+
+        {% product_cards products as cards %}
+        {% for product, card in cards %}{{ card }}{% endfor %}
+    """
+    return [(product, mark_safe(html)) for product, html in render_cards(products)]
@@ -0,0 +1,160 @@
+"""
+Trending products: a time-decayed click rate, materialized on a schedule.
+
+A product's trending score is the sum over its clicks of
+``exp(-decay * age)`` with ``decay = ln 2 / TRENDING_HALF_LIFE_HOURS``, so
+a click counts half as much after one half-life. Every product decays at
+the same rate, so the ranking only changes when clicks arrive. We store
+the score relative to a fixed epoch instead of "now", in log form:
+
+    trending_score = log(sum(exp(decay * (clicked_at - EPOCH))))
+
+This way a run only touches products with new clicks: their stored value
+is merged with the new clicks via ``logaddexp``, and every other row stays
+correctly ordered without being rewritten. The log form grows linearly
+with time, so it never overflows. The decayed score at time ``t`` is
+``exp(trending_score - decay * (t - EPOCH))``. Filtering it against a
+threshold is therefore a range condition on the indexed column (see
+``trending_floor``).
+
+``update_trending`` reads clicks beyond its own high-water mark (up to
+``RollupCursor.committed_click_id``), aggregated per product and hour in
+SQL, and folds them in with NumPy. Changing the half-life needs a
+``rebuild``.
+"""
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from core.fragments import bump_fragment_versions
+from core.page_cache import purge_tags
+
+CURSOR_NAME = 'trending'
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+TRENDING_TAG = 'product:trending'
+UPDATE_BATCH_SIZE = 1000
+
+
+def decay_rate():
+    """Decay per second for ``TRENDING_HALF_LIFE_HOURS``."""
+    return math.log(2) / (getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 24) * 3600)
+
+
+def trending_floor(now=None):
+    """
+    Smallest stored score whose decayed value is still at least
+    ``TRENDING_MIN_SCORE`` (roughly "clicks in the last half-life") at ``now``.
+    """
+    now = now or timezone.now()
+    minimum = getattr(settings, 'TRENDING_MIN_SCORE', 0.5)
+    return decay_rate() * (now - EPOCH).total_seconds() + math.log(minimum)
+
+
+def trending_products(limit=None):
+    """Products with a current decayed score above the floor, hottest first."""
+    from .models import Product
+
+    products = (
+        Product.objects.filter(trending_score__gte=trending_floor())
+        .select_related('category')
+        .order_by('-trending_score', '-id')
+    )
+    return products if limit is None else products[:limit]
+
+
+def trending_changed():
+    """Invalidate the home section and cached pages listing trending products."""
+    bump_fragment_versions('home_trending')
+    purge_tags(TRENDING_TAG)
+
+
+def hourly_clicks(clicks):
+    """
+    ``(product_ids, log_weights)`` arrays for ``clicks``, aggregated per
+    product and hour in the database and reduced to one log-sum per product.
+    """
+    import numpy as np
+
+    rows = (
+        clicks.order_by()
+        .annotate(hour=TruncHour('created_at'))
+        .values_list('product_id', 'hour')
+        .annotate(clicks=Count('id'))
+    )
+    product_ids, hours, counts = [], [], []
+    for product_id, hour, count in rows.iterator(chunk_size=10000):
+        product_ids.append(product_id)
+        hours.append((hour - EPOCH).total_seconds())
+        counts.append(count)
+    if not product_ids:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    # Clicks count from the middle of their hour
+    exponents = decay_rate() * (np.array(hours) + 1800.0) + np.log(np.array(counts, dtype=float))
+    ids, groups = np.unique(np.array(product_ids, dtype=np.int64), return_inverse=True)
+    # log-sum-exp per product, shifted by each product's max to stay finite
+    peaks = np.full(len(ids), -np.inf)
+    np.maximum.at(peaks, groups, exponents)
+    sums = np.bincount(groups, weights=np.exp(exponents - peaks[groups]), minlength=len(ids))
+    return ids, peaks + np.log(sums)
+
+
+def _merge_scores(ids, log_weights):
+    """Fold ``log_weights`` into the stored scores of ``ids``; returns rows updated."""
+    import numpy as np
+
+    from .models import Product
+
+    updated = 0
+    for start in range(0, len(ids), UPDATE_BATCH_SIZE):
+        batch_ids = ids[start:start + UPDATE_BATCH_SIZE].tolist()
+        batch_weights = dict(zip(batch_ids, log_weights[start:start + UPDATE_BATCH_SIZE].tolist()))
+        products = list(Product.objects.filter(pk__in=batch_ids).only('pk', 'trending_score'))
+        for product in products:
+            weight = batch_weights[product.pk]
+            if product.trending_score is None:
+                product.trending_score = weight
+            else:
+                product.trending_score = float(np.logaddexp(product.trending_score, weight))
+        # bulk_update skips save() and signals, so updated_at and the
+        # page validators stay put.
+        updated += Product.objects.bulk_update(products, ['trending_score'])
+    return updated
+
+
+def update_trending(rebuild=False, days=None):
+    """
+    Fold clicks past the high-water mark into ``Product.trending_score``.
+
+    With ``rebuild`` every score is reset and recomputed from the last
+    ``days`` (default ``TRENDING_REBUILD_DAYS``) of clicks. Returns
+    ``(products_updated, last_click_id)``.
+    """
+    from .models import Click, Product, RollupCursor
+
+    RollupCursor.objects.get_or_create(name=CURSOR_NAME)
+    with transaction.atomic():
+        cursor = RollupCursor.objects.select_for_update().get(name=CURSOR_NAME)
+        last_click_id = cursor.committed_click_id()
+        clicks = Click.objects.filter(id__lte=last_click_id)
+        if rebuild:
+            days = days or getattr(settings, 'TRENDING_REBUILD_DAYS', 14)
+            Product.objects.exclude(trending_score=None).update(trending_score=None)
+            clicks = clicks.filter(created_at__gte=timezone.now() - timedelta(days=days))
+        else:
+            clicks = clicks.filter(id__gt=cursor.last_click_id)
+
+        updated = 0
+        if rebuild or last_click_id > cursor.last_click_id:
+            updated = _merge_scores(*hourly_clicks(clicks))
+            cursor.last_click_id = last_click_id
+            cursor.save(update_fields=['last_click_id', 'updated_at'])
+
+    if rebuild or updated:
+        trending_changed()
+    return updated, last_click_id
@@ -6,8 +6,11 @@ app_name = 'products'
 urlpatterns = [
     path('', views.home, name='home'),
     path('categories/', views.category_list, name='category_list'),
+    path('deals/', views.deals, name='deals'),
+    path('trending/', views.trending, name='trending'),
     path('category/<slug:slug>/', views.category_detail, name='category_detail'),
     path('product/<slug:slug>/', views.product_detail, name='product_detail'),
     path('search/', views.product_search, name='search'),
+    path('search/suggest/', views.search_suggest, name='search_suggest'),
     path('go/<int:product_id>/', views.affiliate_redirect, name='affiliate_redirect'),
 ]
@@ -1,129 +1,275 @@
+import math
+
+from django.conf import settings
+from django.core.cache import cache
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import ListView, DetailView
-from django.db.models import Q, Count
-from django.http import JsonResponse
+from django.db.models import Count, Exists, Max, Q
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.cache import patch_cache_control
 from django.views.decorators.http import require_http_methods
-from django.core.paginator import Paginator
-from .models import Product, Category, Click
+from .models import Product, Category, RelatedProduct
+from .catalog import CATEGORY_FRAGMENTS
+from .clicks import record_click
+from .facets import FACET_VALUES, facet_filter, get_engine as get_facet_engine, parse_selection
+from .redirects import get_redirect_target
+from .related import get_related_products, get_related_version
+from .search import fetch_products, search_products
+from .trending import TRENDING_TAG, trending_products
+from .suggest import get_suggester
 from blog.models import BlogPost
+from blog.signals import BLOG_FRAGMENTS
+from core.conditional import conditional_page
+from core.counters import count_view
+from core.fragments import get_fragment_versions
+from core.page_cache import list_tag, tag_for, tag_page
+from core.pagination import CursorPaginator, SequencePaginator, page_query_string
 from core.utilities import get_client_ip, get_user_agent, get_referrer
 
 
 def home(request):
     """Homepage view."""
+    versions = get_fragment_versions(*CATEGORY_FRAGMENTS, *BLOG_FRAGMENTS)
+    # Querysets are lazy: each is only evaluated when its {% cache %} block
+    # in the template misses, so a warm home page runs no queries
     featured_products = Product.objects.filter(is_featured=True).select_related('category')[:6]
-    top_rated_products = Product.objects.all().order_by('-rating')[:6]
+    top_rated_products = Product.objects.select_related('category').order_by('-rating', '-id')[:6]
+    trending = trending_products(limit=6)
     latest_blogs = BlogPost.objects.filter(is_published=True).order_by('-published_at')[:3]
-    categories = Category.objects.all()
+    # Categories are listed twice (grid and footer), so cache the list itself
+    categories = cache.get_or_set(
+        f"home:categories:{versions['home_categories']}",
+        lambda: list(Category.objects.all()),
+        settings.HOME_CACHE_TIMEOUT,
+    )
 
     context = {
         'featured_products': featured_products,
         'top_rated_products': top_rated_products,
+        'trending_products': trending,
         'latest_blogs': latest_blogs,
         'categories': categories,
+        'fragment_versions': versions,
+        'fragment_timeout': settings.HOME_CACHE_TIMEOUT,
     }
+    tag_page(request, list_tag(Product), list_tag(Category), list_tag(BlogPost), TRENDING_TAG)
     return render(request, 'products/home.html', context)
 
 
 def category_list(request):
     """List all categories."""
-    categories = Category.objects.annotate(product_count=Count('products'))
+    categories = Category.objects.all()
     context = {'categories': categories}
+    tag_page(request, list_tag(Category), list_tag(Product))
     return render(request, 'products/category_list.html', context)
 
 
+def _category_page_state(request, slug):
+    """Newest change to the category or any of its products, as two index seeks."""
+    category = Category.objects.filter(slug=slug).values('pk', 'updated_at', 'product_count').first()
+    if category is None:
+        return None
+    products_updated = Product.objects.filter(category_id=category['pk']).aggregate(
+        newest=Max('updated_at'),
+    )['newest']
+    last_modified = max(filter(None, [category['updated_at'], products_updated]))
+    return last_modified, category['product_count']
+
+
+def _legacy_min_rating(value):
+    """The ``min_rating`` param as a finite float, or None when it is not one."""
+    try:
+        value = float(value)
+    except ValueError:
+        return None
+    return value if math.isfinite(value) else None
+
+
+@conditional_page(_category_page_state)
 def category_detail(request, slug):
     """Category detail page with products."""
     category = get_object_or_404(Category, slug=slug)
     
     products = Product.objects.filter(category=category).select_related('category')
     
-    # Filter by rating if specified
-    min_rating = request.GET.get('min_rating')
-    if min_rating:
-        products = products.filter(rating__gte=float(min_rating))
+    # Facet filters; the legacy min_rating param maps onto the rating facet
+    # when it names one, and stays a plain range filter otherwise
+    params = request.GET.copy()
+    min_rating = None
+    if params.get('min_rating') and 'rating' not in params:
+        if params['min_rating'] in FACET_VALUES['rating']:
+            params.setlist('rating', [params['min_rating']])
+        else:
+            min_rating = _legacy_min_rating(params['min_rating'])
+    selected = parse_selection(params)
+    facet_groups, product_total = get_facet_engine().counts(category, selected)
+    if selected:
+        products = products.filter(facet_filter(selected))
+    if min_rating is not None:
+        # The bitmaps only know the facet ranges, so count this one in SQL
+        products = products.filter(rating__gte=min_rating)
+        product_total = products.count()
     
     # Sort options
     sort = request.GET.get('sort', '-created_at')
-    if sort in ['price', '-price', 'rating', '-rating', '-created_at']:
-        products = products.order_by(sort)
+    if sort not in ['price', '-price', 'rating', '-rating', '-created_at']:
+        sort = '-created_at'
     
-    # Pagination
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    products = paginator.get_page(page_number)
+    # Keyset pagination; cost does not grow with the page depth
+    paginator = CursorPaginator(products, sort, 12)
+    products = paginator.get_page(request.GET.get('cursor'))
 
     context = {
         'category': category,
         'products': products,
+        'product_total': product_total,
+        'facet_groups': facet_groups,
         'sort': sort,
+        'query_string': page_query_string(request),
     }
+    tag_page(request, tag_for(category), list_tag(Product))
     return render(request, 'products/category_detail.html', context)
 
 
+def deals(request):
+    """Discounted products, biggest discount first."""
+    products = Product.objects.filter(discount__gt=0).select_related('category')
+    # Keyset pagination over the (discount, id) index
+    paginator = CursorPaginator(products, '-discount', 12)
+    products = paginator.get_page(request.GET.get('cursor'))
+
+    context = {
+        'products': products,
+        'query_string': page_query_string(request),
+    }
+    tag_page(request, list_tag(Product))
+    return render(request, 'products/deals.html', context)
+
+
+def trending(request):
+    """Products ranked by their recent click rate."""
+    # Keyset pagination over the (trending_score, id) index
+    paginator = CursorPaginator(trending_products(), '-trending_score', 12)
+    products = paginator.get_page(request.GET.get('cursor'))
+
+    context = {
+        'products': products,
+        'query_string': page_query_string(request),
+    }
+    tag_page(request, list_tag(Product), TRENDING_TAG)
+    return render(request, 'products/trending.html', context)
+
+
+def _product_page_state(request, slug):
+    """
+    Newest change to the product or its stored related products (and their
+    categories), in one query; the related-products run version covers
+    neighbours being recomputed. Without stored neighbours the page falls
+    back to products of the same category, so those count instead.
+    """
+    links = RelatedProduct.objects.filter(product__slug=slug)
+    category_ids = Product.objects.filter(slug=slug).values('category_id')
+    state = Product.objects.filter(
+        Q(slug=slug)
+        | Q(pk__in=links.values('related_id'))
+        | (Q(category_id__in=category_ids) & ~Exists(links))
+    ).aggregate(
+        products_updated=Max('updated_at'),
+        categories_updated=Max('category__updated_at'),
+        product_count=Count('id'),
+    )
+    if state['products_updated'] is None:
+        return None
+    last_modified = max(state['products_updated'], state['categories_updated'])
+    return last_modified, f"{state['product_count']}:{get_related_version()}"
+
+
+def _product_views(request, slug):
+    """The view a 304 answer still has to count."""
+    product_ids = Product.objects.filter(slug=slug).values_list('pk', flat=True)
+    return [(Product._meta.label_lower, product_id) for product_id in product_ids]
+
+
+@conditional_page(_product_page_state, views=_product_views)
 def product_detail(request, slug):
     """Product detail page."""
-    product = get_object_or_404(Product, slug=slug)
+    product = get_object_or_404(Product.objects.select_related('category'), slug=slug)
     
-    # Increment view count
-    product.views_count += 1
-    product.save(update_fields=['views_count'])
+    # Increment view count (coalesced and flushed in the background)
+    count_view(product)
     
-    # Get related products
-    related_products = Product.objects.filter(
-        category=product.category
-    ).exclude(id=product.id)[:4]
+    # Precomputed by the compute_related_products command
+    related_products = get_related_products(product, limit=4)
     
     context = {
         'product': product,
         'related_products': related_products,
     }
+    tag_page(
+        request,
+        tag_for(product),
+        tag_for(product.category),
+        list_tag(RelatedProduct),
+        *(tag_for(related) for related in related_products),
+        *(tag_for(related.category) for related in related_products),
+    )
     return render(request, 'products/product_detail.html', context)
 
 
 def product_search(request):
     """Search products."""
     query = request.GET.get('q', '').strip()
-    products = Product.objects.select_related('category')
+    cursor = request.GET.get('cursor')
     
     if query:
-        products = products.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(pro__icontains=query)
-        ).distinct()
-    
-    # Pagination
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    products = paginator.get_page(page_number)
+        # Ranked ids from the search backend; only the current page is loaded
+        products = SequencePaginator(search_products(query), 12, count=True).get_page(cursor)
+        products.object_list = fetch_products(products.object_list)
+    else:
+        paginator = CursorPaginator(Product.objects.select_related('category'), '-created_at', 12, count=True)
+        products = paginator.get_page(cursor)
 
     context = {
         'products': products,
         'query': query,
+        'query_string': page_query_string(request),
     }
+    tag_page(request, list_tag(Product))
     return render(request, 'products/search_results.html', context)
 
 
+@require_http_methods(["GET"])
+def search_suggest(request):
+    """Autocomplete suggestions for the search box, served from memory."""
+    body = get_suggester().response_body(request.GET.get('q', ''))
+    response = HttpResponse(body, content_type='application/json')
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=settings.SUGGEST_CACHE_SECONDS,
+        stale_while_revalidate=settings.SUGGEST_CACHE_SECONDS,
+    )
+    return response
+
+
 @require_http_methods(["GET"])
 def affiliate_redirect(request, product_id):
     """Redirect to affiliate URL and log the click."""
-    product = get_object_or_404(Product, id=product_id)
+    # Served from the shared redirect map; no DB read on a cache hit
+    affiliate_url = get_redirect_target(product_id)
+    if affiliate_url is None:
+        raise Http404("No Product matches the given query.")
     
-    # Log the click
-    Click.objects.create(
-        product=product,
-        ip_address=get_client_ip(request),
-        user_agent=get_user_agent(request),
-        referrer=get_referrer(request),
+    # Queue the click; Click rows and click_count are written in batches
+    record_click(
+        product_id,
+        get_client_ip(request),
+        get_user_agent(request),
+        get_referrer(request),
     )
     
-    # Increment click count
-    product.click_count += 1
-    product.save(update_fields=['click_count'])
-    
     # Redirect to affiliate URL
-    return redirect(product.affiliate_url)
+    return redirect(affiliate_url)
 
 
 def page_not_found(request, exception=None):